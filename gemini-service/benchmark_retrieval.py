@@ -0,0 +1,165 @@
+"""
+BENCHMARK DE RECUPERACIÓN - AGROVERSE
+Mide la latencia por consulta (p50/p95/p99) de BM25, del índice vectorial
+(exacto e IVF) y de la recuperación híbrida sobre un corpus sintético de
+--chunks chunks (vocabulario con distribución de Zipf, como el texto real),
+o sobre un índice persistido por ingest.py.
+
+En el corpus sintético los embeddings son vectores aleatorios (la latencia
+de la búsqueda vectorial no depende del contenido); --embed los calcula con
+HashingEmbedder, que es mucho más lento de armar.
+
+Uso:
+    python benchmark_retrieval.py --chunks 100000 --queries 500
+    python benchmark_retrieval.py --index knowledge_base/index --queries 500
+"""
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from bm25 import BM25Index, HybridRetriever
+from gemini_client import percentile
+from vector_index import STOPWORDS, HashingEmbedder, IVFIndex, VectorIndex, build_index, load_index, index_paths
+
+AGRO_WORDS = (
+    "papa maíz quinua habas cebada tomate helada heladas riego goteo aspersión sequía "
+    "plaga plagas pulgones polilla gusano hongo roya tizón suelo nitrógeno fósforo "
+    "potasio fertilización abono compost ndvi ndwi evi savi vegetación temperatura lluvia "
+    "humedad cosecha siembra semilla raíz raíces hoja hojas tallo estrés calor frío "
+    "satelital landsat sentinel parcela cultivo cultivos rendimiento agua eficiencia"
+).split()
+
+
+def synthetic_vocabulary(size):
+    """
+    Palabras vacías en los rangos más frecuentes (como en el texto real, y
+    BM25 las descarta), luego palabras agrícolas reales y luego sintéticas
+    """
+    words = sorted(STOPWORDS) + AGRO_WORDS
+    return words + [f"termino{i}" for i in range(max(0, size - len(words)))]
+
+
+def synthetic_corpus(n_chunks, vocabulary, words_per_chunk, seed):
+    """Chunks con palabras muestreadas con distribución de Zipf sobre el vocabulario"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    documents = []
+    for position in range(n_chunks):
+        words = rng.choice(len(vocabulary), size=words_per_chunk, p=weights)
+        documents.append({
+            "id": f"synthetic#{position}",
+            "title": f"Documento {position}",
+            "source": "Sintético",
+            "content": " ".join(vocabulary[word] for word in words),
+        })
+    return documents
+
+
+def synthetic_queries(count, vocabulary, seed):
+    """Consultas de 2 a 4 palabras (mitad agrícolas, mitad del vocabulario medio)"""
+    rng = random.Random(seed)
+    middle = vocabulary[len(STOPWORDS):2000]
+    return [
+        " ".join(rng.choice(AGRO_WORDS if i % 2 else middle) for _ in range(rng.randint(2, 4)))
+        for i in range(count)
+    ]
+
+
+def measure(search, queries):
+    """Latencias en ms de search(query) para cada consulta"""
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "mean": round(sum(latencies) / len(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de BM25, búsqueda vectorial e híbrida")
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--words-per-chunk', type=int, default=120)
+    parser.add_argument('--index', default=None, help="Prefijo de un índice de ingest.py (en vez del sintético)")
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--candidates', type=int, default=20)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--embed', action='store_true', help="Embeber el corpus sintético")
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    vocabulary = synthetic_vocabulary(args.vocabulary)
+    queries = synthetic_queries(args.queries, vocabulary, args.seed)
+    build = {}
+
+    if args.index:
+        started = time.perf_counter()
+        ivf_index = load_index(args.index, nprobe=args.nprobe)
+        build["load_index_s"] = round(time.perf_counter() - started, 3)
+        documents = ivf_index.documents
+        exact_index = VectorIndex.from_arrays(ivf_index.embedder, documents, ivf_index.matrix)
+        started = time.perf_counter()
+        try:
+            bm25_index = BM25Index.load(index_paths(args.index)["bm25"], documents)
+        except FileNotFoundError:
+            bm25_index = BM25Index.build(documents)
+        build["bm25_s"] = round(time.perf_counter() - started, 3)
+    else:
+        documents = synthetic_corpus(args.chunks, vocabulary, args.words_per_chunk, args.seed)
+        embedder = HashingEmbedder(dim=args.dim)
+
+        started = time.perf_counter()
+        bm25_index = BM25Index.build(documents)
+        build["bm25_s"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        if args.embed:
+            matrix = None
+        else:
+            rng = np.random.default_rng(args.seed)
+            matrix = rng.standard_normal((len(documents), embedder.dim), dtype=np.float32)
+        exact_index = build_index(embedder, documents, matrix, ivf_min_documents=len(documents) + 1)
+        build["embed_s" if args.embed else "vectors_s"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        ivf_index = IVFIndex.from_arrays(embedder, documents, exact_index.matrix, nprobe=args.nprobe)
+        ivf_index.build()
+        build["ivf_s"] = round(time.perf_counter() - started, 3)
+
+    embedder = exact_index.embedder
+    hybrid_exact = HybridRetriever(exact_index, bm25_index, candidates=args.candidates)
+    hybrid_ivf = HybridRetriever(ivf_index, bm25_index, candidates=args.candidates)
+    top_k = args.top_k
+
+    report = {
+        "documents": len(documents),
+        "queries": len(queries),
+        "top_k": top_k,
+        "build": build,
+        "bm25": bm25_index.stats(),
+        "latency_ms": {
+            "bm25": measure(lambda query: bm25_index.search_ids(query, top_k), queries),
+            "embed_query": measure(lambda query: embedder.embed([query]), queries),
+            "vector_exact": measure(lambda query: exact_index.search(query, top_k), queries),
+            "vector_ivf": measure(lambda query: ivf_index.search(query, top_k), queries),
+            "hybrid_exact": measure(lambda query: hybrid_exact.search(query, top_k), queries),
+            "hybrid_ivf": measure(lambda query: hybrid_ivf.search(query, top_k), queries),
+        },
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+BÚSQUEDA LÉXICA BM25 - AGROVERSE
+Índice invertido sobre los mismos documentos del índice vectorial, para las
+consultas donde importan los términos exactos (nombres de plagas, cultivos,
+índices como NDVI) y fusión de ambos rankings con Reciprocal Rank Fusion.
+
+- Tokenización en español: minúsculas, sin tildes, sin palabras vacías y
+  con un stemmer liviano de plurales y género ('heladas' -> 'helad',
+  'raíces' -> 'raiz', 'vegetación' -> 'vegetacion').
+- Listas de postings en formato CSR (términos ordenados, indptr, doc_ids
+  ordenados, pesos) con el peso BM25 de cada posting precalculado: una
+  consulta solo suma los pesos de los postings de sus términos en un
+  acumulador (denso si los postings son muchos, disperso si son pocos) y
+  toma el top-k con argpartition. Sin poda: con 100k chunks recorrer todos
+  los postings de la consulta ya es sub-milisegundo (benchmark_retrieval.py).
+- El índice se guarda en .npz (ingest.py) y se carga sin re-tokenizar.
+"""
+
+import logging
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from vector_index import STOPWORDS, WORD_PATTERN, document_text, fold_accents, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+
+def stem(word):
+    """Stemmer liviano: plurales ('-ces' -> '-z', '-s') y vocal final de género"""
+    if len(word) <= 3:
+        return word
+    if word.endswith('ces'):
+        return word[:-3] + 'z'
+    if word.endswith('s'):
+        word = word[:-1]
+    if len(word) > 3 and word[-1] in 'aoe':
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Términos de un texto: sin tildes, sin palabras vacías y con stem"""
+    return [
+        stem(word) for word in WORD_PATTERN.findall(fold_accents(text))
+        if word not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Índice invertido BM25 de solo lectura (se arma con build o load)"""
+
+    kind = 'bm25'
+
+    def __init__(self, documents, terms, indptr, doc_ids, weights, k1=1.2, b=0.75):
+        self.documents = documents
+        self.vocabulary = {term: position for position, term in enumerate(terms)}
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.k1 = k1
+        self.b = b
+
+    def __len__(self):
+        return len(self.documents)
+
+    @classmethod
+    def build(cls, documents, k1=1.2, b=0.75):
+        """Tokenizar los documentos y precalcular los pesos BM25 de cada posting"""
+        vocabulary = {}
+        # Postings en arrays compactos (término, documento, frecuencia)
+        term_ids, doc_ids, frequencies = array('i'), array('i'), array('f')
+        lengths = array('f')
+        for doc_id, doc in enumerate(documents):
+            counts = Counter(tokenize(document_text(doc)))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                frequencies.append(tf)
+
+        n_documents = len(lengths)
+        lengths = np.frombuffer(lengths, dtype=np.float32)
+        average_length = float(lengths.mean()) if n_documents and lengths.mean() > 0 else 1.0
+
+        # Renumerar los términos en orden alfabético y agrupar los postings por término
+        terms = sorted(vocabulary)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+        term_ids = rank[np.frombuffer(term_ids, dtype=np.int32)]
+        order = np.argsort(term_ids, kind='stable')
+        doc_ids = np.frombuffer(doc_ids, dtype=np.int32)[order]
+        tf = np.frombuffer(frequencies, dtype=np.float32)[order]
+        df = np.bincount(term_ids, minlength=len(terms))
+        indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        idf = np.log(1 + (n_documents - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Normalización por largo del documento: k1 * (1 - b + b * dl / avgdl)
+        length_norm = k1 * (1 - b + b * lengths[doc_ids] / average_length)
+        weights = np.repeat(idf, df) * tf * (k1 + 1) / (tf + length_norm)
+
+        return cls(documents, terms, indptr, doc_ids, weights.astype(np.float32), k1, b)
+
+    def save(self, path):
+        np.savez(
+            path, terms=np.asarray(self.terms, dtype=str), indptr=self.indptr,
+            doc_ids=self.doc_ids, weights=self.weights,
+            params=np.asarray([self.k1, self.b], dtype=np.float64),
+            n_documents=np.asarray(len(self.documents), dtype=np.int64)
+        )
+
+    @classmethod
+    def load(cls, path, documents):
+        """Abrir un índice guardado con save; ValueError si no es de estos documentos"""
+        with np.load(path) as data:
+            # n_documents falta en los índices guardados antes de agregarlo
+            count_mismatch = "n_documents" in data.files and int(data["n_documents"]) != len(documents)
+            if count_mismatch or (data["indptr"][-1] and int(data["doc_ids"].max()) >= len(documents)):
+                raise ValueError("El índice BM25 no corresponde a los documentos")
+            k1, b = data["params"].tolist()
+            return cls(
+                documents, data["terms"].tolist(), data["indptr"],
+                data["doc_ids"], data["weights"], k1, b
+            )
+
+    def _accumulate(self, term_ids, total_postings):
+        """
+        Sumar los postings de los términos: acumulador denso si son muchos (candidatos
+        = todos los documentos), disperso si no
+        """
+        if total_postings * 8 > len(self.documents):
+            scores = np.zeros(len(self.documents), dtype=np.float32)
+            for t in term_ids:
+                start, end = self.indptr[t], self.indptr[t + 1]
+                # Un documento aparece una sola vez por término: += indexado es correcto
+                scores[self.doc_ids[start:end]] += self.weights[start:end]
+            return np.arange(len(self.documents)), scores
+        docs = np.concatenate([self.doc_ids[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.weights[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        return candidates, np.bincount(inverse, weights=weights).astype(np.float32)
+
+    def search_ids(self, query, top_k=10):
+        """Índices de documento y scores BM25 de los top_k, de mayor a menor"""
+        term_ids = sorted({
+            self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary
+        })
+        if not term_ids or top_k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        total_postings = int(sum(self.indptr[t + 1] - self.indptr[t] for t in term_ids))
+        candidates, scores = self._accumulate(term_ids, total_postings)
+        best, best_scores = top_k_rows(scores[None, :], top_k)
+        matched = best_scores[0] > 0
+        return candidates[best[0][matched]].astype(np.int64), best_scores[0][matched]
+
+    def search(self, query, top_k=10):
+        indices, scores = self.search_ids(query, top_k)
+        return [
+            {'document': self.documents[index], 'score': float(score)}
+            for index, score in zip(indices, scores)
+        ]
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "documents": len(self.documents),
+            "terms": len(self.terms),
+            "postings": int(self.indptr[-1]),
+            "k1": self.k1,
+            "b": self.b,
+        }
+
+
+def reciprocal_rank_fusion(rankings, top_k=3, k=60):
+    """
+    Fusionar rankings de índices de documento con RRF: sum(1 / (k + rango))
+    El score se normaliza a [0, 1] (1 = primero en todos los rankings)
+    Retorna [(índice de documento, score)] de mayor a menor
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, index in enumerate(ranking, start=1):
+            fused[index] = fused.get(index, 0.0) + 1.0 / (k + rank)
+    best = len(rankings) / (k + 1)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [(index, score / best) for index, score in ordered]
+
+
+class HybridRetriever:
+    """
+    Recuperación híbrida: top `candidates` del índice vectorial (con score
+    >= min_vector_score) y de BM25 (cualquier coincidencia léxica), fusionados
+    con RRF. mode: 'hybrid', 'vector' o 'bm25'
+    """
+
+    MODES = ('hybrid', 'vector', 'bm25')
+
+    def __init__(self, vector_index, bm25_index, mode='hybrid', candidates=20, rrf_k=60):
+        if mode not in self.MODES:
+            raise ValueError(f"Modo de recuperación desconocido: {mode} ({', '.join(self.MODES)})")
+        if len(bm25_index) != len(vector_index):
+            raise ValueError("Los índices vectorial y BM25 deben tener los mismos documentos")
+        self.vector_index = vector_index
+        self.bm25_index = bm25_index
+        self.mode = mode
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def _vector_ranking(self, query, top_k, min_vector_score):
+        vectors = self.vector_index.embedder.embed([query])
+        indices, scores = self.vector_index.search_vectors(vectors, top_k)
+        keep = np.isfinite(scores[0])
+        if min_vector_score is not None:
+            keep &= scores[0] >= min_vector_score
+        return indices[0][keep], scores[0][keep]
+
+    def search(self, query, top_k=3, min_vector_score=None):
+        """
+        Lista de {'document', 'score', 'vector_score', 'bm25_score'}
+        score es el RRF normalizado (o el score del único retriever del modo)
+        """
+        depth = max(self.candidates, top_k)
+        vector_scores, bm25_scores = {}, {}
+        rankings = []
+        if self.mode in ('hybrid', 'vector'):
+            indices, scores = self._vector_ranking(query, depth, min_vector_score)
+            vector_scores = dict(zip(indices.tolist(), scores.tolist()))
+            rankings.append(indices.tolist())
+        if self.mode in ('hybrid', 'bm25'):
+            indices, scores = self.bm25_index.search_ids(query, depth)
+            bm25_scores = dict(zip(indices.tolist(), scores.tolist()))
+            rankings.append(indices.tolist())
+
+        if self.mode == 'hybrid':
+            ranked = reciprocal_rank_fusion(rankings, top_k, self.rrf_k)
+        else:
+            scores = vector_scores if self.mode == 'vector' else bm25_scores
+            ranked = [(index, scores[index]) for index in rankings[0][:top_k]]
+
+        return [
+            {
+                'document': self.vector_index.documents[index],
+                'score': float(score),
+                'vector_score': vector_scores.get(index),
+                'bm25_score': bm25_scores.get(index),
+            }
+            for index, score in ranked
+        ]
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "candidates": self.candidates,
+            "rrf_k": self.rrf_k,
+            "bm25": self.bm25_index.stats(),
+        }
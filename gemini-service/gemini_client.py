@@ -0,0 +1,279 @@
+"""
+CLIENTE HTTP DE GEMINI - AGROVERSE
+Sesión de requests compartida con pool de conexiones keep-alive hacia la API
+de Gemini: las llamadas de /chat, /analyze-image y /extract-sensor-values
+reutilizan las conexiones TCP+TLS en lugar de abrir una por llamada.
+
+- Timeouts de conexión y de lectura por separado.
+- Reintentos con backoff exponencial y jitter completo ante 429/5xx y
+  errores de conexión (respeta Retry-After). Los timeouts de lectura no se
+  reintentan: la generación ya pudo haberse cobrado.
+- Métricas por llamada: DNS, conexión TCP, handshake TLS (solo en
+  conexiones nuevas), TTFB y total, medidas con conexiones urllib3 propias.
+  Con reintentos, las fases de conexión son las del intento que la abrió.
+  /health expone percentiles de las últimas llamadas.
+"""
+
+import logging
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Última medición de conexión del hilo (la llamada HTTP es síncrona en el hilo)
+_local = threading.local()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class TimedConnectionMixin:
+    """
+    Mide DNS y conexión TCP en _new_conn, TLS en connect y el TTFB entre el
+    fin del envío del request y la recepción de los headers de la respuesta
+    """
+
+    _setup = None
+    _request_sent = None
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            # urllib3 arma el error de resolución
+            return super()._new_conn()
+        resolved = time.perf_counter()
+
+        # Conectar a las IPs ya resueltas, en orden, sin volver a resolver
+        host = self._dns_host
+        try:
+            for position, address in enumerate(addresses):
+                self._dns_host = address[4][0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except ConnectTimeoutError:
+                    if position == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+
+        self._setup = {
+            "dns_ms": _ms(resolved - started),
+            "connect_ms": _ms(time.perf_counter() - resolved),
+            "tls_ms": None,
+        }
+        return sock
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        if self._setup is not None and isinstance(self, HTTPSConnection):
+            elapsed = _ms(time.perf_counter() - started)
+            self._setup["tls_ms"] = round(elapsed - self._setup["dns_ms"] - self._setup["connect_ms"], 2)
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        self._request_sent = time.perf_counter()
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        setup, self._setup = self._setup, None
+        timing = {"reused": setup is None, "dns_ms": None, "connect_ms": None, "tls_ms": None}
+        timing.update(setup or {})
+        if self._request_sent is not None:
+            timing["ttfb_ms"] = _ms(time.perf_counter() - self._request_sent)
+        _local.timing = timing
+        return response
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter cuyos pools usan las conexiones con mediciones"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # Dict nuevo: el de urllib3 es compartido a nivel de módulo
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def percentile(values, q):
+    """Percentil q (0-100) por interpolación lineal"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class GeminiHTTPClient:
+    """Cliente con pool keep-alive, reintentos con jitter y métricas por llamada"""
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    PHASES = ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms")
+
+    def __init__(self, base_url, api_key, pool_size=10, connect_timeout_s=5, read_timeout_s=30,
+                 max_retries=3, backoff_base_s=0.5, backoff_max_s=8, metrics_window=500):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._random = random.Random()
+
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=metrics_window)
+        self._stats = {"calls": 0, "attempts": 0, "retries": 0, "errors": 0}
+
+    def _backoff(self, attempt, response):
+        """Jitter completo: uniforme en [0, base * 2^intento], con Retry-After como mínimo"""
+        delay = self._random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max_s))
+            except ValueError:
+                pass
+        return delay
+
+    def _attempt(self, url, payload):
+        """Un intento: (respuesta o None, error o None, medición)"""
+        _local.timing = None
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = self.session.post(
+                url, json=payload, headers={'x-goog-api-key': self.api_key}, timeout=self.timeout
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout) as e:
+            # Incluye timeouts de conexión/lectura y conexiones keep-alive cerradas por el servidor
+            error = e
+        timing = dict(_local.timing or {"reused": None})
+        timing["total_ms"] = _ms(time.perf_counter() - started)
+        timing["status"] = response.status_code if response is not None else None
+        return response, error, timing
+
+    def post_json(self, path, payload):
+        """
+        POST JSON a base_url + path con reintentos; retorna el JSON de la respuesta
+        Lanza requests.HTTPError (o el error de conexión / timeout) si todos los intentos fallan
+        """
+        url = self.base_url + path
+        attempts = []
+        for attempt in range(self.max_retries + 1):
+            response, error, timing = self._attempt(url, payload)
+            attempts.append(timing)
+            if error is not None:
+                # Un certificado inválido no se arregla reintentando y la generación
+                # que superó el timeout de lectura ya pudo haberse cobrado
+                retryable = not isinstance(
+                    error, (requests.exceptions.SSLError, requests.exceptions.ReadTimeout)
+                )
+            else:
+                retryable = response.status_code in self.RETRY_STATUSES
+            if not retryable or attempt == self.max_retries:
+                break
+            delay = self._backoff(attempt, response)
+            logger.warning(
+                f"Gemini {timing['status'] or type(error).__name__}, reintento "
+                f"{attempt + 1}/{self.max_retries} en {delay:.2f}s"
+            )
+            time.sleep(delay)
+
+        failed = error is not None or response.status_code >= 400
+        call = self._summarize(attempts)
+        self._record(call, failed)
+        logger.info(
+            f"Gemini {call['status']} en {call['total_ms']:.0f} ms "
+            f"(dns={call.get('dns_ms')} connect={call.get('connect_ms')} tls={call.get('tls_ms')} "
+            f"ttfb={call.get('ttfb_ms')} reutilizada={call['reused']} intentos={call['attempts']})"
+        )
+
+        if error is not None:
+            raise error
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _summarize(attempts):
+        """
+        Medición de una llamada a partir de sus intentos: estado y TTFB del
+        último; DNS/conexión/TLS del primer intento que abrió una conexión
+        (reused solo si ningún intento la abrió) y total sumado
+        """
+        call = dict(attempts[-1])
+        opened = [timing for timing in attempts if timing.get("reused") is False]
+        if opened:
+            call.update({phase: opened[0].get(phase) for phase in ("dns_ms", "connect_ms", "tls_ms")})
+            call["reused"] = False
+        call["new_connections"] = len(opened)
+        call["attempts"] = len(attempts)
+        call["total_ms"] = round(sum(timing["total_ms"] for timing in attempts), 2)
+        return call
+
+    def _record(self, call, failed):
+        with self._lock:
+            self._recent.append(call)
+            self._stats["calls"] += 1
+            self._stats["attempts"] += call["attempts"]
+            self._stats["retries"] += call["attempts"] - 1
+            self._stats["errors"] += int(failed)
+
+    def stats(self):
+        """Contadores y percentiles de las últimas llamadas para /health"""
+        with self._lock:
+            stats = dict(self._stats)
+            recent = list(self._recent)
+        reused = [call["reused"] for call in recent if call["reused"] is not None]
+        stats.update({
+            "pool_size": self.pool_size,
+            "timeout_s": {"connect": self.timeout[0], "read": self.timeout[1]},
+            "reused_ratio": round(sum(reused) / len(reused), 4) if reused else None,
+            "latency_ms": {phase: self._phase_percentiles(recent, phase) for phase in self.PHASES},
+        })
+        return stats
+
+    @staticmethod
+    def _phase_percentiles(recent, phase):
+        values = [call[phase] for call in recent if call.get(phase) is not None]
+        if not values:
+            return {"p50": None, "p95": None}
+        return {"p50": round(percentile(values, 50), 2), "p95": round(percentile(values, 95), 2)}
@@ -0,0 +1,263 @@
+"""
+INGESTA DE LA BASE DE CONOCIMIENTOS - AGROVERSE
+Lee un directorio de documentos (Markdown, TXT con texto extraído de PDFs o
+PDFs si hay pypdf), los parte en chunks con solapamiento, embebe los chunks
+por lotes directo sobre un .npy memory-mapped y escribe el índice que el
+servicio abre con KNOWLEDGE_INDEX_PATH (ver vector_index.save_index), junto
+con el índice invertido BM25 de los mismos chunks (bm25.py).
+
+Los Markdown pueden traer front matter con la metadata del documento:
+
+    ---
+    title: Manejo Integrado de Plagas en Papa
+    source: FAO - Guía de Buenas Prácticas Agrícolas
+    keywords: papa, plagas, mip
+    ---
+
+Sin front matter, el título es el primer encabezado '# ' (o el nombre del
+archivo) y la fuente es --source (o la ruta relativa).
+
+Uso:
+    python ingest.py documentos/ --out knowledge_base/index \\
+        --chunk-chars 1200 --overlap-chars 200 --embedder hashing --batch-size 256
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from bm25 import BM25Index
+from vector_index import (
+    IVFIndex, VectorIndex, create_embedder, document_text, index_paths,
+    publish_index, save_index
+)
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = ('.md', '.markdown', '.txt')
+PDF_EXTENSIONS = ('.pdf',)
+
+FRONT_MATTER_PATTERN = re.compile(r"\A---\s*\n(.*?)\n---\s*\n", re.DOTALL)
+HEADING_PATTERN = re.compile(r"^#\s+(.+)$", re.MULTILINE)
+PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+
+
+def read_document(path):
+    """Texto de un archivo de la base de conocimientos"""
+    if path.lower().endswith(PDF_EXTENSIONS):
+        reader = PdfReader(path)
+        return "\n\n".join(page.extract_text() or '' for page in reader.pages)
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def parse_front_matter(text):
+    """Separar el front matter 'clave: valor' del cuerpo. Retorna (metadata, cuerpo)"""
+    match = FRONT_MATTER_PATTERN.match(text)
+    if not match:
+        return {}, text
+    metadata = {}
+    for line in match.group(1).splitlines():
+        key, separator, value = line.partition(':')
+        if separator:
+            metadata[key.strip().lower()] = value.strip()
+    return metadata, text[match.end():]
+
+
+def split_units(text, chunk_chars):
+    """Párrafos del texto; los que superan chunk_chars se cortan por palabras"""
+    for paragraph in PARAGRAPH_SPLIT.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= chunk_chars:
+            yield paragraph
+            continue
+        words, size = [], 0
+        for word in paragraph.split():
+            if words and size + len(word) + 1 > chunk_chars:
+                yield ' '.join(words)
+                words, size = [], 0
+            words.append(word)
+            size += len(word) + 1
+        if words:
+            yield ' '.join(words)
+
+
+def overlap_tail(chunk, overlap_chars):
+    """Últimos ~overlap_chars caracteres del chunk, empezando en una palabra entera"""
+    if overlap_chars <= 0:
+        return ''
+    if len(chunk) <= overlap_chars:
+        return chunk
+    tail = chunk[-overlap_chars:]
+    space = tail.find(' ')
+    return tail[space + 1:] if space >= 0 else tail
+
+
+def chunk_text(text, chunk_chars=1200, overlap_chars=200):
+    """
+    Partir el texto en chunks de ~chunk_chars caracteres que respetan
+    párrafos; cada chunk repite el final del anterior (overlap_chars) para no
+    cortar el contexto de una idea entre dos chunks
+    """
+    if overlap_chars >= chunk_chars:
+        raise ValueError("overlap_chars debe ser menor que chunk_chars")
+    chunks, current, size = [], [], 0
+    # Las unidades dejan lugar para el solapamiento que arrastra el chunk siguiente
+    for unit in split_units(text, chunk_chars - overlap_chars):
+        if current and size + len(unit) + 2 > chunk_chars:
+            chunk = "\n\n".join(current)
+            chunks.append(chunk)
+            tail = overlap_tail(chunk, overlap_chars)
+            current, size = ([tail], len(tail) + 2) if tail else ([], 0)
+        current.append(unit)
+        size += len(unit) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def find_documents(root):
+    """Archivos soportados bajo root, en orden estable"""
+    extensions = TEXT_EXTENSIONS + (PDF_EXTENSIONS if PYPDF_AVAILABLE else ())
+    paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.lower().endswith(extensions):
+                paths.append(path)
+            elif name.lower().endswith(PDF_EXTENSIONS):
+                logger.warning(f"pypdf no disponible, se omite {path}")
+    return sorted(paths)
+
+
+def load_chunks(root, chunk_chars=1200, overlap_chars=200, default_source=None):
+    """Documentos del directorio partidos en chunks con su metadata"""
+    chunks = []
+    for path in find_documents(root):
+        relative = os.path.relpath(path, root)
+        metadata, body = parse_front_matter(read_document(path))
+        heading = HEADING_PATTERN.search(body)
+        doc_id = os.path.splitext(relative)[0].replace(os.sep, '/')
+        title = metadata.get('title') or (heading.group(1).strip() if heading else doc_id)
+        source = metadata.get('source') or default_source or relative
+        keywords = [
+            keyword.strip() for keyword in metadata.get('keywords', '').split(',') if keyword.strip()
+        ]
+        for position, content in enumerate(chunk_text(body, chunk_chars, overlap_chars)):
+            chunks.append({
+                "id": f"{doc_id}#{position}",
+                "doc_id": doc_id,
+                "chunk": position,
+                "title": title,
+                "source": source,
+                "path": relative,
+                "keywords": keywords,
+                "content": content,
+            })
+    return chunks
+
+
+def ingest(root, prefix, embedder, chunk_chars=1200, overlap_chars=200, batch_size=256,
+           ivf_min_documents=5000, default_source=None):
+    """
+    Chunking + embeddings por lotes + índice persistido en prefix
+    Retorna el manifiesto del índice
+    """
+    started = time.perf_counter()
+    chunks = load_chunks(root, chunk_chars, overlap_chars, default_source)
+    if not chunks:
+        raise ValueError(f"No hay documentos para ingerir en {root}")
+
+    # Se escribe con un prefijo temporal y se publica al final
+    partial_prefix = prefix + '.partial'
+    directory = os.path.dirname(partial_prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    matrix = np.lib.format.open_memmap(
+        index_paths(partial_prefix)["matrix"], mode='w+',
+        dtype=np.float32, shape=(len(chunks), embedder.dim)
+    )
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        matrix[start:start + len(batch)] = embedder.embed([document_text(doc) for doc in batch])
+    matrix.flush()
+    embedded_at = time.perf_counter()
+
+    if len(chunks) >= ivf_min_documents:
+        index = IVFIndex.from_arrays(embedder, chunks, matrix)
+        index.build()
+    else:
+        index = VectorIndex.from_arrays(embedder, chunks, matrix)
+
+    manifest = save_index(partial_prefix, index, manifest={
+        "source_dir": os.path.abspath(root),
+        "source_documents": len({chunk["doc_id"] for chunk in chunks}),
+        "chunk_chars": chunk_chars,
+        "overlap_chars": overlap_chars,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    })
+    del index, matrix
+    bm25_started = time.perf_counter()
+    BM25Index.build(chunks).save(index_paths(partial_prefix)["bm25"])
+    bm25_finished = time.perf_counter()
+    publish_index(partial_prefix, prefix)
+
+    manifest["timings_s"] = {
+        "embed": round(embedded_at - started, 3),
+        "bm25": round(bm25_finished - bm25_started, 3),
+        "total": round(time.perf_counter() - started, 3),
+    }
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ingesta de documentos a un índice vectorial persistido"
+    )
+    parser.add_argument('root', help="Directorio con .md / .txt (y .pdf si hay pypdf)")
+    parser.add_argument('--out', required=True, help="Prefijo del índice, p. ej. knowledge_base/index")
+    parser.add_argument('--chunk-chars', type=int, default=1200)
+    parser.add_argument('--overlap-chars', type=int, default=200)
+    parser.add_argument('--embedder', default=os.getenv('EMBEDDER', 'hashing'))
+    parser.add_argument('--dim', type=int, default=int(os.getenv('EMBEDDING_DIM', 512)))
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--ivf-min-docs', type=int, default=int(os.getenv('VECTOR_IVF_MIN_DOCS', 5000)),
+                        help="Chunks a partir de los cuales se entrena y guarda el índice IVF")
+    parser.add_argument('--source', default=None, help="Fuente por defecto de los documentos")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        manifest = ingest(
+            args.root, args.out,
+            create_embedder(args.embedder, args.dim),
+            chunk_chars=args.chunk_chars,
+            overlap_chars=args.overlap_chars,
+            batch_size=args.batch_size,
+            ivf_min_documents=args.ivf_min_docs,
+            default_source=args.source
+        )
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    json.dump(manifest, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+CACHÉ SEMÁNTICA DE RESPUESTAS - AGROVERSE
+Los agricultores repiten las mismas preguntas ("¿cuándo riego mi papa?") y
+cada una cuesta un round trip de varios segundos a Gemini. La caché guarda
+la respuesta generada bajo:
+
+- la consulta normalizada (minúsculas, sin tildes ni puntuación),
+- el contexto: IDs de los documentos recuperados (en orden) y los campos de
+  user_data que entran al prompt (crops, location, experience).
+
+Búsqueda en dos pasos:
+1. Exacta: hash de consulta normalizada + contexto en un LRU.
+2. Semántica: entre las entradas con el mismo contexto, la de mayor
+   similitud coseno entre embeddings de la consulta, si supera el umbral.
+   Además deben coincidir los números y las negaciones de la consulta
+   ('NDVI de 0.45' no reutiliza la respuesta de 'NDVI de 0.85', ni
+   'no riego' la de 'riego'), que el embedding casi no distingue.
+
+Entradas con TTL y cantidad máxima acotada (se desaloja la usada hace más
+tiempo). Todo en memoria del proceso.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from vector_index import WORD_PATTERN, fold_accents
+
+# Palabras que invierten el sentido de una pregunta
+NEGATIONS = frozenset("no ni nunca jamas sin tampoco".split())
+
+# Campos de user_data que cambian el prompt (ver build_rag_prompt)
+USER_CONTEXT_FIELDS = ('crops', 'location', 'experience')
+
+
+def normalize_query(query):
+    """Minúsculas, sin tildes, sin puntuación y con espacios simples"""
+    return ' '.join(WORD_PATTERN.findall(fold_accents(query)))
+
+
+def query_signature(normalized_query):
+    """Números y negaciones de la consulta: deben coincidir en un hit semántico"""
+    return tuple(sorted(
+        token for token in normalized_query.split()
+        if token in NEGATIONS or token.isdigit()
+    ))
+
+
+def _canonical(value):
+    """Valor de user_data comparable: texto normalizado; listas sin orden"""
+    if isinstance(value, (list, tuple)):
+        return sorted(_canonical(item) for item in value)
+    if value is None:
+        return None
+    return normalize_query(str(value))
+
+
+def context_key(doc_ids, user_data=None, fields=USER_CONTEXT_FIELDS):
+    """Hash de los documentos recuperados y los campos relevantes de user_data"""
+    user_data = user_data or {}
+    payload = {
+        "docs": list(doc_ids),
+        "user": {field: _canonical(user_data.get(field)) for field in fields},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU en memoria con TTL y búsqueda semántica por contexto
+    embedder: objeto con embed(textos) -> matriz de filas normalizadas
+    similarity_threshold >= 1 desactiva la búsqueda semántica
+    """
+
+    def __init__(self, embedder, max_entries=1000, ttl_s=24 * 3600, similarity_threshold=0.92):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # clave -> entrada, del uso más antiguo al más reciente
+        self._entries = OrderedDict()
+        # (contexto, firma) -> claves de las entradas de ese grupo
+        self._groups = {}
+        self._stats = {
+            "exact_hits": 0, "semantic_hits": 0, "misses": 0,
+            "evictions": 0, "expired": 0, "writes": 0
+        }
+
+    @staticmethod
+    def _key(normalized_query, context):
+        return hashlib.sha256(f"{context}\n{normalized_query}".encode('utf-8')).hexdigest()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        group = self._groups[entry["group"]]
+        group.discard(key)
+        if not group:
+            del self._groups[entry["group"]]
+
+    def _alive(self, key, now):
+        """True si la entrada existe y no expiró (las expiradas se borran)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry["expires_at"] <= now:
+            self._remove(key)
+            self._stats["expired"] += 1
+            return False
+        return True
+
+    def _hit(self, key, match, now, similarity=1.0):
+        self._entries.move_to_end(key)
+        entry = self._entries[key]
+        self._stats[f"{match}_hits"] += 1
+        info = {
+            "hit": True,
+            "match": match,
+            "similarity": round(float(similarity), 4),
+            "age_s": round(now - entry["created_at"], 1),
+        }
+        return entry["value"], info
+
+    def get(self, query, context):
+        """
+        Respuesta cacheada para la consulta en ese contexto
+        Retorna (valor, info del hit) o (None, info del miss)
+        """
+        normalized = normalize_query(query)
+        key = self._key(normalized, context)
+        now = time.time()
+        with self._lock:
+            if self._alive(key, now):
+                return self._hit(key, "exact", now)
+            group = list(self._groups.get((context, query_signature(normalized)), ()))
+
+        if group and self.similarity_threshold < 1:
+            vector = self.embedder.embed([normalized])[0]
+            with self._lock:
+                candidates = [candidate for candidate in group if self._alive(candidate, now)]
+                if candidates:
+                    matrix = np.stack([self._entries[candidate]["vector"] for candidate in candidates])
+                    similarities = matrix @ vector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        return self._hit(candidates[best], "semantic", now, similarities[best])
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, {"hit": False}
+
+    def set(self, query, context, value):
+        """Guardar la respuesta de la consulta en ese contexto"""
+        normalized = normalize_query(query)
+        key = self._key(normalized, context)
+        group = (context, query_signature(normalized))
+        vector = self.embedder.embed([normalized])[0]
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "value": value,
+                "vector": vector,
+                "group": group,
+                "created_at": now,
+                "expires_at": now + self.ttl_s,
+            }
+            self._groups.setdefault(group, set()).add(key)
+            self._stats["writes"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        """Contadores y ocupación para /health"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats.update({
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "similarity_threshold": self.similarity_threshold,
+            "hit_rate": round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else None,
+        })
+        return stats
@@ -10,9 +10,14 @@ from flask_cors import CORS
 import logging
 import os
 from datetime import datetime
+import time
 import json
 import base64
-import requests
+
+from bm25 import BM25Index, HybridRetriever
+from gemini_client import GeminiHTTPClient
+from response_cache import ResponseCache, context_key
+from vector_index import build_index, create_embedder, index_paths, load_index
 
 # Google Cloud AI
 try:
@@ -36,6 +41,27 @@ GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID', '')
 GCP_REGION = os.getenv('GCP_REGION', 'us-central1')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 
+# Cliente HTTP de Gemini (pool keep-alive compartido)
+GEMINI_API_BASE_URL = os.getenv('GEMINI_API_BASE_URL', 'https://generativelanguage.googleapis.com')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+GEMINI_POOL_SIZE = int(os.getenv('GEMINI_POOL_SIZE', 10))
+GEMINI_CONNECT_TIMEOUT_S = float(os.getenv('GEMINI_CONNECT_TIMEOUT_S', 5))
+GEMINI_READ_TIMEOUT_S = float(os.getenv('GEMINI_READ_TIMEOUT_S', 30))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', 3))
+GEMINI_BACKOFF_BASE_S = float(os.getenv('GEMINI_BACKOFF_BASE_S', 0.5))
+GEMINI_BACKOFF_MAX_S = float(os.getenv('GEMINI_BACKOFF_MAX_S', 8))
+
+gemini_client = GeminiHTTPClient(
+    GEMINI_API_BASE_URL,
+    GEMINI_API_KEY,
+    pool_size=GEMINI_POOL_SIZE,
+    connect_timeout_s=GEMINI_CONNECT_TIMEOUT_S,
+    read_timeout_s=GEMINI_READ_TIMEOUT_S,
+    max_retries=GEMINI_MAX_RETRIES,
+    backoff_base_s=GEMINI_BACKOFF_BASE_S,
+    backoff_max_s=GEMINI_BACKOFF_MAX_S
+)
+
 # Inicializar Vertex AI
 if VERTEXAI_AVAILABLE and GCP_PROJECT_ID:
     try:
@@ -44,7 +70,34 @@ if VERTEXAI_AVAILABLE and GCP_PROJECT_ID:
     except Exception as e:
         logger.error(f"❌ Error inicializando Vertex AI: {e}")
 
-# Simular base de conocimientos agrícola
+# Índice vectorial del RAG
+EMBEDDER = os.getenv('EMBEDDER', 'hashing')  # hashing (local) o vertex
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', 512))
+# Desde este tamaño de corpus se usa el índice aproximado IVF
+VECTOR_IVF_MIN_DOCS = int(os.getenv('VECTOR_IVF_MIN_DOCS', 5000))
+VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', 16))
+# Similitud coseno mínima para usar un documento como contexto
+RAG_MIN_SCORE = float(os.getenv('RAG_MIN_SCORE', 0.2))
+# Recuperación: hybrid (vectorial + BM25 con RRF), vector o bm25
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+# Candidatos de cada retriever antes de la fusión
+RETRIEVAL_CANDIDATES = int(os.getenv('RETRIEVAL_CANDIDATES', 20))
+RRF_K = int(os.getenv('RRF_K', 60))
+# Prefijo de un índice generado por ingest.py (vacío = base de conocimientos integrada)
+KNOWLEDGE_INDEX_PATH = os.getenv('KNOWLEDGE_INDEX_PATH', '')
+
+# Caché de respuestas de /chat (exacta + semántica, en memoria)
+CHAT_CACHE_ENABLED = os.getenv('CHAT_CACHE_ENABLED', 'true').lower() == 'true'
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', 1000))
+CHAT_CACHE_TTL_S = float(os.getenv('CHAT_CACHE_TTL_S', 24 * 3600))
+# Similitud coseno mínima para reutilizar la respuesta de una consulta parecida (>= 1 desactiva)
+CHAT_CACHE_SIMILARITY = float(os.getenv('CHAT_CACHE_SIMILARITY', 0.92))
+
+# Paginación de /knowledge-base
+KNOWLEDGE_BASE_PAGE_SIZE = int(os.getenv('KNOWLEDGE_BASE_PAGE_SIZE', 50))
+KNOWLEDGE_BASE_MAX_PAGE_SIZE = int(os.getenv('KNOWLEDGE_BASE_MAX_PAGE_SIZE', 500))
+
+# Base de conocimientos agrícola
 AGRICULTURAL_KNOWLEDGE_BASE = [
     {
         "id": "fao_001",
@@ -61,8 +114,7 @@ AGRICULTURAL_KNOWLEDGE_BASE = [
         Plagas principales: Polilla de la papa, Gusano blanco, Pulgones
         Umbrales de acción: >5% de plantas afectadas
         """,
-        "keywords": ["papa", "plagas", "mip", "control", "pulgones", "polilla"],
-        "embedding": [0.23, 0.45, 0.67, 0.12, 0.89]  # Simulado
+        "keywords": ["papa", "plagas", "mip", "control", "pulgones", "polilla"]
     },
     {
         "id": "nasa_002",
@@ -81,8 +133,7 @@ AGRICULTURAL_KNOWLEDGE_BASE = [
         
         Un NDVI decreciente indica estrés por sequía, plagas o enfermedades.
         """,
-        "keywords": ["ndvi", "salud", "vegetación", "satelital", "índice", "estrés"],
-        "embedding": [0.78, 0.34, 0.56, 0.91, 0.23]  # Simulado
+        "keywords": ["ndvi", "salud", "vegetación", "satelital", "índice", "estrés"]
     },
     {
         "id": "inia_003",
@@ -105,8 +156,7 @@ AGRICULTURAL_KNOWLEDGE_BASE = [
         Cultivos más sensibles: papa, maíz, tomate (daño a -2°C)
         Cultivos resistentes: quinua, habas, cebada (resisten hasta -8°C)
         """,
-        "keywords": ["heladas", "frío", "protección", "temperatura", "prevención"],
-        "embedding": [0.45, 0.67, 0.23, 0.89, 0.12]  # Simulado
+        "keywords": ["heladas", "frío", "protección", "temperatura", "prevención"]
     },
     {
         "id": "fao_004",
@@ -130,8 +180,7 @@ AGRICULTURAL_KNOWLEDGE_BASE = [
         
         Momento óptimo de riego: temprano en la mañana o tarde
         """,
-        "keywords": ["riego", "agua", "eficiencia", "sequía", "ndwi", "goteo"],
-        "embedding": [0.34, 0.56, 0.78, 0.12, 0.45]  # Simulado
+        "keywords": ["riego", "agua", "eficiencia", "sequía", "ndwi", "goteo"]
     },
     {
         "id": "nasa_005",
@@ -155,40 +204,77 @@ AGRICULTURAL_KNOWLEDGE_BASE = [
         - Riego por aspersión para enfriamiento evaporativo
         - Mallas de sombreado en cultivos sensibles
         """,
-        "keywords": ["temperatura", "lst", "estrés", "térmico", "calor", "landsat"],
-        "embedding": [0.67, 0.23, 0.45, 0.78, 0.34]  # Simulado
+        "keywords": ["temperatura", "lst", "estrés", "térmico", "calor", "landsat"]
     }
 ]
 
 
-def simulate_vector_search(query, top_k=3):
+def load_vector_index():
     """
-    Simular búsqueda vectorial en base de conocimientos
-    En producción, esto usaría Vertex AI Vector Search
+    Índice persistido en KNOWLEDGE_INDEX_PATH (memory map, sin re-embeber)
+    o, si no hay o no se puede abrir, el de la base de conocimientos integrada
     """
-    # Simular scoring basado en keywords
-    results = []
-    query_lower = query.lower()
-    
-    for doc in AGRICULTURAL_KNOWLEDGE_BASE:
-        score = 0.0
-        # Calcular score simple basado en keywords
-        for keyword in doc['keywords']:
-            if keyword in query_lower:
-                score += 1.0
-        
-        # Normalizar
-        score = score / max(len(doc['keywords']), 1)
-        
-        if score > 0:
-            results.append({
-                'document': doc,
-                'score': score
-            })
-    
-    # Ordenar por score y retornar top_k
-    results.sort(key=lambda x: x['score'], reverse=True)
-    return results[:top_k]
+    if KNOWLEDGE_INDEX_PATH:
+        try:
+            started = time.perf_counter()
+            index = load_index(KNOWLEDGE_INDEX_PATH, nprobe=VECTOR_IVF_NPROBE)
+            logger.info(
+                f"📚 Índice {KNOWLEDGE_INDEX_PATH} abierto en "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            return index
+        except Exception as e:
+            logger.error(f"❌ No se pudo abrir el índice {KNOWLEDGE_INDEX_PATH}: {e}")
+
+    return build_index(
+        create_embedder(EMBEDDER, EMBEDDING_DIM), AGRICULTURAL_KNOWLEDGE_BASE,
+        ivf_min_documents=VECTOR_IVF_MIN_DOCS,
+        nprobe=VECTOR_IVF_NPROBE
+    )
+
+
+def load_bm25_index(index):
+    """
+    Índice BM25 guardado por ingest.py junto al índice vectorial, o armado al
+    arrancar si no existe o no se puede abrir (p. ej. no coincide con los documentos)
+    """
+    if index.manifest is not None:
+        path = index_paths(KNOWLEDGE_INDEX_PATH)["bm25"]
+        try:
+            return BM25Index.load(path, index.documents)
+        except FileNotFoundError:
+            logger.warning("⚠️ El índice no trae BM25 (ingest.py anterior), se arma al arrancar")
+        except Exception as e:
+            logger.error(f"❌ No se pudo abrir el índice BM25 {path}: {e}; se arma al arrancar")
+    return BM25Index.build(index.documents)
+
+
+vector_index = load_vector_index()
+bm25_index = load_bm25_index(vector_index)
+retriever = HybridRetriever(
+    vector_index, bm25_index, mode=RETRIEVAL_MODE,
+    candidates=RETRIEVAL_CANDIDATES, rrf_k=RRF_K
+)
+logger.info(f"📚 Índice vectorial: {vector_index.stats()}")
+logger.info(f"🔎 Recuperación: {retriever.stats()}")
+
+response_cache = None
+if CHAT_CACHE_ENABLED:
+    response_cache = ResponseCache(
+        vector_index.embedder,
+        max_entries=CHAT_CACHE_MAX_ENTRIES,
+        ttl_s=CHAT_CACHE_TTL_S,
+        similarity_threshold=CHAT_CACHE_SIMILARITY
+    )
+
+
+def retrieve(query, top_k=3):
+    """
+    Documentos de contexto para la consulta según RETRIEVAL_MODE
+    Retorna [{'document', 'score', 'vector_score', 'bm25_score'}]; en modo
+    hybrid score es el RRF normalizado a [0, 1]
+    """
+    return retriever.search(query, top_k=top_k, min_vector_score=RAG_MIN_SCORE)
 
 
 def build_rag_prompt(query, context_docs, user_data=None):
@@ -251,13 +337,12 @@ def call_gemini_api(prompt, image_data=None):
                        "En producción, aquí vendría la respuesta generada por Gemini 2.0 Flash "
                        "basada en el contexto RAG y la pregunta del usuario.",
             "model": "gemini-2.0-flash-simulated",
-            "sources": ["FAO", "NASA", "INIA"]
+            "sources": ["FAO", "NASA", "INIA"],
+            "simulated": True
         }
     
-    # Llamada real a Gemini API
+    # Llamada real a Gemini API (la API key va en el header x-goog-api-key)
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-        
         payload = {
             "contents": [{
                 "parts": [{
@@ -286,15 +371,12 @@ def call_gemini_api(prompt, image_data=None):
                 }
             })
         
-        response = requests.post(url, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = gemini_client.post_json(f"/v1beta/models/{GEMINI_MODEL}:generateContent", payload)
         text = result['candidates'][0]['content']['parts'][0]['text']
         
         return {
             "response": text,
-            "model": "gemini-2.0-flash",
+            "model": GEMINI_MODEL,
             "sources": []  # Extraer de la respuesta si es necesario
         }
         
@@ -310,7 +392,11 @@ def health():
         "status": "healthy",
         "service": "gemini-rag",
         "vertexai": VERTEXAI_AVAILABLE,
-        "knowledge_base_size": len(AGRICULTURAL_KNOWLEDGE_BASE),
+        "knowledge_base_size": len(vector_index),
+        "vector_index": vector_index.stats(),
+        "retrieval": retriever.stats(),
+        "chat_cache": response_cache.stats() if response_cache else None,
+        "gemini_http": gemini_client.stats(),
         "timestamp": datetime.utcnow().isoformat()
     })
 
@@ -346,16 +432,30 @@ def chat():
         logger.info(f"Query recibida: {query}")
         
         # 1. Búsqueda vectorial en knowledge base
-        relevant_docs = simulate_vector_search(query, top_k=3)
+        relevant_docs = retrieve(query, top_k=3)
         logger.info(f"Documentos relevantes encontrados: {len(relevant_docs)}")
         
-        # 2. Construir prompt RAG
-        rag_prompt = build_rag_prompt(query, relevant_docs, user_data)
-        
-        # 3. Llamar a Gemini
-        gemini_response = call_gemini_api(rag_prompt)
-        
-        # 4. Extraer fuentes citadas
+        # 2. Respuesta cacheada para la misma consulta (o una casi igual) con
+        # los mismos documentos y datos del usuario
+        cache_context = context_key([doc['document']['id'] for doc in relevant_docs], user_data)
+        gemini_response, cache_info = None, {"hit": False, "enabled": response_cache is not None}
+        if response_cache is not None:
+            gemini_response, cache_info = response_cache.get(query, cache_context)
+            cache_info["enabled"] = True
+        
+        if gemini_response is None:
+            # 3. Construir prompt RAG
+            rag_prompt = build_rag_prompt(query, relevant_docs, user_data)
+            
+            # 4. Llamar a Gemini
+            gemini_response = call_gemini_api(rag_prompt)
+            # La respuesta simulada (sin API key) no se cachea
+            if response_cache is not None and not gemini_response.get('simulated'):
+                response_cache.set(query, cache_context, gemini_response)
+        else:
+            logger.info(f"Respuesta desde caché ({cache_info['match']})")
+        
+        # 5. Extraer fuentes citadas
         sources = [doc['document']['source'] for doc in relevant_docs]
         
         return jsonify({
@@ -366,13 +466,16 @@ def chat():
                 {
                     "title": doc['document']['title'],
                     "source": doc['document']['source'],
-                    "relevance_score": doc['score']
+                    "relevance_score": doc['score'],
+                    "vector_score": doc['vector_score'],
+                    "bm25_score": doc['bm25_score']
                 }
                 for doc in relevant_docs
             ],
             "metadata": {
                 "model": gemini_response.get('model', 'simulated'),
                 "query": query,
+                "cache": cache_info,
                 "timestamp": datetime.utcnow().isoformat()
             }
         })
@@ -533,20 +636,41 @@ FORMATO DE RESPUESTA (JSON):
 
 @app.route('/knowledge-base', methods=['GET'])
 def get_knowledge_base():
-    """Listar documentos en la base de conocimientos"""
+    """
+    Listar documentos de la base de conocimientos, paginados
+    Query params: offset (default 0), limit (default KNOWLEDGE_BASE_PAGE_SIZE)
+    """
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', KNOWLEDGE_BASE_PAGE_SIZE))
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "offset y limit deben ser enteros"
+        }), 400
+    if offset < 0 or not 1 <= limit <= KNOWLEDGE_BASE_MAX_PAGE_SIZE:
+        return jsonify({
+            "success": False,
+            "error": f"offset debe ser >= 0 y limit entre 1 y {KNOWLEDGE_BASE_MAX_PAGE_SIZE}"
+        }), 400
+
+    total = len(vector_index)
     documents = [
         {
             "id": doc['id'],
             "title": doc['title'],
             "source": doc['source'],
-            "keywords": doc['keywords']
+            "keywords": doc.get('keywords', [])
         }
-        for doc in AGRICULTURAL_KNOWLEDGE_BASE
+        for doc in vector_index.documents[offset:offset + limit]
     ]
     
     return jsonify({
         "success": True,
-        "total_documents": len(documents),
+        "total_documents": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < total else None,
         "documents": documents
     })
 
@@ -557,7 +681,7 @@ if __name__ == '__main__':
     
     logger.info(f"🤖 Servicio Gemini + RAG - Asistente Agronómico")
     logger.info(f"☁️  Plataforma: Google Cloud Run + Vertex AI")
-    logger.info(f"📚 Base de conocimientos: {len(AGRICULTURAL_KNOWLEDGE_BASE)} documentos")
+    logger.info(f"📚 Base de conocimientos: {len(vector_index)} documentos")
     logger.info(f"📍 Host: {host}:{port}")
     logger.info(f"🚀 Starting...")
     
@@ -0,0 +1,79 @@
+import pytest
+
+from bm25 import BM25Index, HybridRetriever, reciprocal_rank_fusion, stem, tokenize
+from vector_index import HashingEmbedder, VectorIndex
+
+DOCUMENTS = [
+    {"id": "heladas", "title": "Heladas en papa", "content": "Las heladas dañan las hojas de la papa."},
+    {"id": "riego", "title": "Riego por goteo", "content": "El riego por goteo ahorra agua en sequía."},
+    {"id": "plagas", "title": "Plagas", "content": "Los pulgones y la polilla atacan el cultivo."},
+    {"id": "raices", "title": "Raíces", "content": "Las raíces profundas resisten la sequía."},
+]
+
+
+def test_tokenize_folds_accents_stopwords_and_plurals():
+    assert tokenize("Las HELADAS y la helada") == ["helad", "helad"]
+    assert tokenize("raíces") == ["raiz"]
+    assert tokenize("vegetación") == ["vegetacion"]
+    assert tokenize("de la con por") == []
+
+
+def test_stem_keeps_short_words():
+    assert stem("sol") == "sol"
+    assert stem("ndvi") == "ndvi"
+
+
+def test_exact_term_ranks_first():
+    index = BM25Index.build(DOCUMENTS)
+    results = index.search("pulgones en el cultivo", top_k=2)
+    assert results[0]["document"]["id"] == "plagas"
+    assert results[0]["score"] > 0
+
+
+def test_plural_query_matches_singular_document():
+    index = BM25Index.build(DOCUMENTS)
+    assert index.search("helada", top_k=1)[0]["document"]["id"] == "heladas"
+    assert index.search("raiz", top_k=1)[0]["document"]["id"] == "raices"
+
+
+def test_unknown_terms_return_nothing():
+    index = BM25Index.build(DOCUMENTS)
+    indices, scores = index.search_ids("xyzzy", top_k=3)
+    assert len(indices) == 0 and len(scores) == 0
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    path = str(tmp_path / 'index.bm25.npz')
+    index = BM25Index.build(DOCUMENTS)
+    index.save(path)
+    loaded = BM25Index.load(path, DOCUMENTS)
+
+    for query in ("sequía", "goteo agua", "papa"):
+        original_ids, original_scores = index.search_ids(query, 3)
+        loaded_ids, loaded_scores = loaded.search_ids(query, 3)
+        assert list(loaded_ids) == list(original_ids)
+        assert list(loaded_scores) == pytest.approx(list(original_scores))
+
+
+def test_load_rejects_other_documents(tmp_path):
+    path = str(tmp_path / 'index.bm25.npz')
+    BM25Index.build(DOCUMENTS[:2]).save(path)
+    with pytest.raises(ValueError):
+        BM25Index.load(path, DOCUMENTS)
+
+
+def test_rrf_rewards_documents_in_both_rankings():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], top_k=4)
+    assert [index for index, _ in fused][:2] == [1, 3]
+    assert fused[0][1] <= 1.0
+
+
+def test_hybrid_retriever_requires_same_documents():
+    vector_index = VectorIndex(HashingEmbedder(dim=64), DOCUMENTS)
+    with pytest.raises(ValueError):
+        HybridRetriever(vector_index, BM25Index.build(DOCUMENTS[:2]))
+
+    retriever = HybridRetriever(vector_index, BM25Index.build(DOCUMENTS))
+    results = retriever.search("polilla", top_k=2)
+    assert results[0]["document"]["id"] == "plagas"
+    assert results[0]["bm25_score"] is not None
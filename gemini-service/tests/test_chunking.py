@@ -0,0 +1,58 @@
+import pytest
+
+from ingest import chunk_text, overlap_tail, parse_front_matter
+
+
+def paragraphs(count, words=30):
+    return [
+        " ".join(f"p{i}w{j}" for j in range(words))
+        for i in range(count)
+    ]
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("Primer párrafo.\n\nSegundo párrafo.") == ["Primer párrafo.\n\nSegundo párrafo."]
+
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text("\n\n  \n") == []
+
+
+def test_chunks_respect_size_and_keep_every_paragraph():
+    text = "\n\n".join(paragraphs(40))
+    chunks = chunk_text(text, chunk_chars=600, overlap_chars=100)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 600 for chunk in chunks)
+    for paragraph in paragraphs(40):
+        assert any(paragraph in chunk for chunk in chunks)
+
+
+def test_each_chunk_repeats_the_tail_of_the_previous_one():
+    chunks = chunk_text("\n\n".join(paragraphs(40)), chunk_chars=600, overlap_chars=100)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        tail = overlap_tail(previous, 100)
+        assert tail and chunk.startswith(tail)
+        assert len(tail) <= 100
+
+
+def test_long_paragraph_is_split_between_words():
+    paragraph = " ".join(f"palabra{i}" for i in range(500))
+    chunks = chunk_text(paragraph, chunk_chars=300, overlap_chars=50)
+
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    words = set()
+    for chunk in chunks:
+        words.update(chunk.split())
+    assert words == set(paragraph.split())
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        chunk_text("texto", chunk_chars=100, overlap_chars=100)
+
+
+def test_front_matter_is_parsed_and_removed():
+    metadata, body = parse_front_matter("---\ntitle: Heladas\nSource: INIA\n---\n# Heladas\n\nTexto")
+    assert metadata == {"title": "Heladas", "source": "INIA"}
+    assert body.strip().startswith("# Heladas")
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from gemini_client import GeminiHTTPClient, percentile
+
+
+class MockGemini(BaseHTTPRequestHandler):
+    """Responde en orden los (status, headers, delay_s) de server.script"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append({"path": self.path, "api_key": self.headers.get('x-goog-api-key')})
+        status, headers, delay_s = self.server.script.pop(0) if self.server.script else (200, {}, 0)
+        time.sleep(delay_s)
+        body = json.dumps({"status": status}).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mock_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockGemini)
+    server.script, server.requests = [], []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs):
+    options = {"backoff_base_s": 0.01, "backoff_max_s": 0.05, "max_retries": 3}
+    options.update(kwargs)
+    return GeminiHTTPClient(f"http://127.0.0.1:{server.server_port}", "clave", **options)
+
+
+def test_retries_5xx_then_succeeds(mock_server):
+    mock_server.script = [(503, {}, 0), (200, {}, 0)]
+    client = make_client(mock_server)
+
+    assert client.post_json('/v1beta/models/m:generateContent', {}) == {"status": 200}
+    assert [r["api_key"] for r in mock_server.requests] == ["clave", "clave"]
+    call = client._recent[-1]
+    assert (call["attempts"], call["status"]) == (2, 200)
+    # El primer intento abrió la conexión: no cuenta como reutilizada
+    assert call["reused"] is False
+    assert call["connect_ms"] is not None
+    stats = client.stats()
+    assert (stats["calls"], stats["attempts"], stats["retries"], stats["errors"]) == (1, 2, 1, 0)
+
+
+def test_keep_alive_connection_is_reused(mock_server):
+    client = make_client(mock_server)
+    client.post_json('/a', {})
+    client.post_json('/b', {})
+
+    first, second = list(client._recent)
+    assert first["reused"] is False
+    assert second["reused"] is True and second["connect_ms"] is None
+    assert client.stats()["reused_ratio"] == 0.5
+
+
+def test_client_errors_are_not_retried(mock_server):
+    mock_server.script = [(400, {}, 0)]
+    client = make_client(mock_server)
+
+    with pytest.raises(requests.HTTPError):
+        client.post_json('/a', {})
+    assert len(mock_server.requests) == 1
+    assert client.stats()["errors"] == 1
+
+
+def test_gives_up_after_max_retries(mock_server):
+    mock_server.script = [(503, {}, 0)] * 10
+    client = make_client(mock_server, max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        client.post_json('/a', {})
+    assert len(mock_server.requests) == 3
+    assert client._recent[-1]["attempts"] == 3
+
+
+def test_retry_after_is_a_minimum_delay(mock_server):
+    mock_server.script = [(429, {"Retry-After": "0.2"}, 0), (200, {}, 0)]
+    client = make_client(mock_server, backoff_max_s=1)
+
+    started = time.perf_counter()
+    client.post_json('/a', {})
+    assert time.perf_counter() - started >= 0.2
+
+
+def test_read_timeout_is_not_retried(mock_server):
+    mock_server.script = [(200, {}, 0.5)]
+    client = make_client(mock_server, read_timeout_s=0.1)
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.post_json('/a', {})
+    assert len(mock_server.requests) == 1
+
+
+def test_connection_errors_are_retried():
+    # Puerto sin servidor: conexión rechazada en cada intento
+    client = GeminiHTTPClient("http://127.0.0.1:9", "clave", max_retries=1, backoff_base_s=0.01)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post_json('/a', {})
+    assert client._recent[-1]["attempts"] == 2
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) is None
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([5], 95) == 5
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, context_key, normalize_query, query_signature
+
+
+class StubEmbedder:
+    """Vectores fijos por consulta normalizada (el resto, ortogonales)"""
+
+    def __init__(self, vectors):
+        self.vectors = {text: np.asarray(vector, dtype=np.float32) for text, vector in vectors.items()}
+
+    def embed(self, texts):
+        rows = []
+        for text in texts:
+            vector = self.vectors.get(text)
+            if vector is None:
+                vector = np.zeros(4, dtype=np.float32)
+                vector[3] = 1.0
+            rows.append(vector / np.linalg.norm(vector))
+        return np.stack(rows)
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    return clock
+
+
+CONTEXT = context_key(["heladas#0", "riego#1"])
+EMBEDDER = StubEmbedder({
+    "cuando riego mi papa": [1, 0, 0, 0],
+    "cuando debo regar mi papa": [0.99, 0.14, 0, 0],
+    "cuando no riego mi papa": [1, 0, 0, 0],
+    "ndvi de 0 45": [0, 1, 0, 0],
+    "ndvi de 0 85": [0, 1, 0, 0],
+})
+
+
+def test_normalize_query():
+    assert normalize_query("¿Cuándo   RIEGO mi papa?") == "cuando riego mi papa"
+    assert query_signature("ndvi de 0 45 no") == ("0", "45", "no")
+
+
+def test_context_key_ignores_list_order_but_not_document_order():
+    assert context_key(["a", "b"], {"crops": ["papa", "maíz"]}) == context_key(["a", "b"], {"crops": ["Maiz", "papa"]})
+    assert context_key(["a", "b"]) != context_key(["b", "a"])
+    assert context_key(["a"], {"location": "Ayacucho"}) != context_key(["a"], {"location": "Cusco"})
+
+
+def test_exact_hit_after_normalization():
+    cache = ResponseCache(EMBEDDER)
+    cache.set("¿Cuándo riego mi papa?", CONTEXT, {"response": "r1"})
+    value, info = cache.get("cuando riego mi PAPA", CONTEXT)
+    assert value == {"response": "r1"}
+    assert info["match"] == "exact"
+
+
+def test_other_context_is_a_miss():
+    cache = ResponseCache(EMBEDDER)
+    cache.set("cuando riego mi papa", CONTEXT, {"response": "r1"})
+    assert cache.get("cuando riego mi papa", context_key(["otro#0"]))[0] is None
+
+
+def test_semantic_hit_above_threshold():
+    cache = ResponseCache(EMBEDDER, similarity_threshold=0.95)
+    cache.set("cuando riego mi papa", CONTEXT, {"response": "r1"})
+    value, info = cache.get("cuando debo regar mi papa", CONTEXT)
+    assert value == {"response": "r1"}
+    assert info["match"] == "semantic" and info["similarity"] >= 0.95
+
+    strict = ResponseCache(EMBEDDER, similarity_threshold=0.999)
+    strict.set("cuando riego mi papa", CONTEXT, {"response": "r1"})
+    assert strict.get("cuando debo regar mi papa", CONTEXT)[0] is None
+
+
+def test_numbers_and_negations_must_match():
+    cache = ResponseCache(EMBEDDER, similarity_threshold=0.5)
+    cache.set("NDVI de 0.45", CONTEXT, {"response": "bajo"})
+    cache.set("cuando riego mi papa", CONTEXT, {"response": "r1"})
+    # Embeddings idénticos, pero otro número u otra negación
+    assert cache.get("NDVI de 0.85", CONTEXT)[0] is None
+    assert cache.get("cuando no riego mi papa", CONTEXT)[0] is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(EMBEDDER, ttl_s=60)
+    cache.set("cuando riego mi papa", CONTEXT, {"response": "r1"})
+    clock.now += 61
+    assert cache.get("cuando riego mi papa", CONTEXT)[0] is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(EMBEDDER, max_entries=2, similarity_threshold=1)
+    cache.set("uno", CONTEXT, 1)
+    cache.set("dos", CONTEXT, 2)
+    assert cache.get("uno", CONTEXT)[0] == 1
+    cache.set("tres", CONTEXT, 3)
+
+    assert cache.get("dos", CONTEXT)[0] is None
+    assert cache.get("uno", CONTEXT)[0] == 1
+    assert cache.get("tres", CONTEXT)[0] == 3
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"]) == (2, 1)
@@ -0,0 +1,466 @@
+"""
+ÍNDICE VECTORIAL EN PROCESO - AGROVERSE
+Búsqueda semántica para el RAG: los embeddings normalizados de todos los
+documentos viven en una matriz float32 contigua y la similitud coseno de un
+lote de consultas es un solo producto de matrices con NumPy.
+
+- Embedders intercambiables: HashingEmbedder (local, determinista, sin red,
+  para desarrollo y pruebas) o VertexEmbedder (text-embedding-004).
+- Búsqueda exacta (VectorIndex) o aproximada (IVFIndex: k-means esférico +
+  listas invertidas, se recorren solo las nprobe listas más cercanas) para
+  corpus grandes.
+- Índices persistidos (save_index / load_index, generados por ingest.py):
+  la matriz se abre con memory map y la metadata JSONL se lee bajo demanda,
+  así el servicio arranca en milisegundos sin re-embeber el corpus.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+try:
+    from vertexai.language_models import TextEmbeddingModel
+    VERTEX_EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    VERTEX_EMBEDDINGS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Palabras vacías del español (sin tildes) que el embedder local ignora
+STOPWORDS = frozenset("""
+a al algo como con cual cuando de del donde el ella en entre es esta este
+esto hay la las le lo los mas me mi mis muy no o para pero por que se si sin
+sobre su sus te tu un una uno y ya
+""".split())
+
+
+def fold_accents(text):
+    """Minúsculas y sin tildes ('Helada' -> 'helada', 'térmico' -> 'termico')"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize_rows(matrix):
+    """Normalizar cada fila a norma 1 (las filas nulas quedan en cero)"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def document_text(doc):
+    """Texto que se embebe de un documento: título, contenido y keywords"""
+    parts = [doc.get('title', ''), doc.get('content', '')]
+    parts.extend(doc.get('keywords', []))
+    return "\n".join(part for part in parts if part)
+
+
+class HashingEmbedder:
+    """
+    Embeddings locales por feature hashing (determinista entre procesos)
+    Palabras, bigramas de palabras y trigramas de caracteres (tolera plurales
+    y variaciones: 'helada' / 'heladas') se proyectan con signo en `dim`
+    dimensiones. Sin red ni modelo: sirve para desarrollo y pruebas.
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _bucket(self, feature):
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def _features(self, text):
+        words = [word for word in WORD_PATTERN.findall(fold_accents(text)) if word not in STOPWORDS]
+        for word in words:
+            yield 'w:' + word, 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield 'c:' + padded[i:i + 3], 0.5
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 0.5
+
+    def embed(self, texts):
+        """Matriz (len(texts), dim) float32 con filas normalizadas"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                index, sign = self._bucket(feature)
+                matrix[row, index] += sign * weight
+        return normalize_rows(matrix)
+
+
+class VertexEmbedder:
+    """Embeddings de Vertex AI (text-embedding-004) por lotes"""
+
+    name = 'vertex'
+
+    def __init__(self, model_name='text-embedding-004', batch_size=64, dim=768):
+        if not VERTEX_EMBEDDINGS_AVAILABLE:
+            raise RuntimeError("Vertex AI no disponible para embeddings")
+        self.model = TextEmbeddingModel.from_pretrained(model_name)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.dim = dim
+
+    def embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            vectors.extend(embedding.values for embedding in self.model.get_embeddings(batch))
+        if not vectors:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+def create_embedder(name, dim=512):
+    """Embedder por nombre; 'vertex' cae a 'hashing' si Vertex AI no está disponible"""
+    if name == 'vertex':
+        try:
+            return VertexEmbedder()
+        except Exception as e:
+            logger.warning(f"Embedder Vertex AI no disponible ({e}), usando hashing local")
+    elif name != 'hashing':
+        raise ValueError(f"Embedder desconocido: {name} (hashing o vertex)")
+    return HashingEmbedder(dim=dim)
+
+
+def top_k_rows(scores, top_k):
+    """
+    Índices y scores de los top_k mayores por fila, ordenados de mayor a menor
+    argpartition es O(n) por fila; solo se ordenan los k elegidos
+    """
+    top_k = min(top_k, scores.shape[1])
+    if top_k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_scores, order, axis=1)
+    )
+
+
+class VectorIndex:
+    """Búsqueda coseno exacta sobre una matriz float32 de embeddings normalizados"""
+
+    kind = 'exact'
+    manifest = None
+
+    def __init__(self, embedder, documents=None, matrix=None):
+        self.embedder = embedder
+        self.documents = []
+        self.matrix = np.zeros((0, embedder.dim), dtype=np.float32)
+        if documents:
+            self.add(documents, matrix)
+
+    @classmethod
+    def from_arrays(cls, embedder, documents, matrix, **kwargs):
+        """
+        Índice de solo lectura sobre una matriz ya normalizada (p. ej. un
+        memmap) y una secuencia de documentos, sin copiarlas
+        """
+        index = cls(embedder, **kwargs)
+        if len(matrix) != len(documents):
+            raise ValueError("La matriz debe tener una fila por documento")
+        index.documents = documents
+        index.matrix = matrix
+        return index
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, documents, matrix=None):
+        """Agregar documentos (embebidos aquí si no se pasa su matriz)"""
+        documents = list(documents)
+        if matrix is None:
+            matrix = self.embedder.embed([document_text(doc) for doc in documents])
+        matrix = normalize_rows(matrix)
+        if len(matrix) != len(documents):
+            raise ValueError("La matriz debe tener una fila por documento")
+        self.documents.extend(documents)
+        self.matrix = np.ascontiguousarray(np.vstack([self.matrix, matrix]))
+
+    def search_vectors(self, queries, top_k=3):
+        """Top-k por consulta para una matriz de consultas normalizadas"""
+        return top_k_rows(queries @ self.matrix.T, top_k)
+
+    def search_batch(self, queries, top_k=3, min_score=None):
+        """
+        Top-k de varias consultas con un solo producto de matrices
+        Retorna una lista por consulta de {'document', 'score'}
+        """
+        vectors = self.embedder.embed(list(queries))
+        indices, scores = self.search_vectors(vectors, top_k)
+        results = []
+        for row_indices, row_scores in zip(indices, scores):
+            results.append([
+                {'document': self.documents[index], 'score': float(score)}
+                for index, score in zip(row_indices, row_scores)
+                if np.isfinite(score) and (min_score is None or score >= min_score)
+            ])
+        return results
+
+    def search(self, query, top_k=3, min_score=None):
+        return self.search_batch([query], top_k, min_score)[0]
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "documents": len(self.documents),
+            "dim": int(self.matrix.shape[1]),
+            "embedder": self.embedder.name,
+            "matrix_bytes": int(self.matrix.nbytes),
+            "memory_mapped": isinstance(self.matrix, np.memmap),
+        }
+
+
+def spherical_kmeans(matrix, n_clusters, iterations=10, seed=0):
+    """Centroides normalizados por k-means sobre similitud coseno"""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, matrix)
+        empty = np.bincount(assignment, minlength=n_clusters) == 0
+        # Los centroides vacíos se re-siembran con filas al azar
+        sums[empty] = matrix[rng.choice(len(matrix), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+    """
+    Índice aproximado IVF: los documentos se agrupan en n_lists listas por
+    k-means y cada consulta solo puntúa los de sus nprobe listas más cercanas
+    Hay que llamar a build() después de agregar documentos
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, embedder, documents=None, matrix=None, n_lists=None, nprobe=8, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self.order = None
+        self.bounds = None
+        self.packed = None
+        super().__init__(embedder, documents, matrix)
+        if documents:
+            self.build()
+
+    def build(self):
+        """Entrenar el cuantizador y armar las listas invertidas"""
+        n = len(self.matrix)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        centroids = spherical_kmeans(self.matrix, n_lists, seed=self.seed)
+        assignment = np.argmax(self.matrix @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self.set_quantizer(centroids, order, bounds)
+
+    def set_quantizer(self, centroids, order, bounds, packed=None):
+        """
+        Centroides y listas invertidas: la lista i son las filas
+        order[bounds[i]:bounds[i + 1]], que se copian contiguas en packed
+        (matrix[order]) para que recorrer una lista sea un slice y no un gather
+        """
+        self.centroids = centroids
+        self.order = order
+        self.bounds = bounds
+        self.packed = packed if packed is not None else np.ascontiguousarray(self.matrix[order])
+
+    def search_vectors(self, queries, top_k=3):
+        if self.centroids is None:
+            return super().search_vectors(queries, top_k)
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes, _ = top_k_rows(queries @ self.centroids.T, nprobe)
+        all_indices = np.zeros((len(queries), min(top_k, len(self.matrix))), dtype=np.int64)
+        all_scores = np.full(all_indices.shape, -np.inf, dtype=np.float32)
+
+        for row, query in enumerate(queries):
+            blocks = [(self.bounds[probe], self.bounds[probe + 1]) for probe in probes[row]]
+            blocks = [(start, end) for start, end in blocks if end > start]
+            if not blocks:
+                continue
+            scores = np.concatenate([self.packed[start:end] @ query for start, end in blocks])
+            candidates = np.concatenate([self.order[start:end] for start, end in blocks])
+            best, best_scores = top_k_rows(scores[None, :], top_k)
+            k = best.shape[1]
+            all_indices[row, :k] = candidates[best[0]]
+            all_scores[row, :k] = best_scores[0]
+
+        # Las consultas con menos de top_k candidatos quedan con score -inf
+        return all_indices, all_scores
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "n_lists": len(self.centroids) if self.centroids is not None else 0,
+            "nprobe": self.nprobe,
+            "packed_bytes": int(self.packed.nbytes) if self.packed is not None else 0,
+        })
+        return stats
+
+
+def build_index(embedder, documents, matrix=None, ivf_min_documents=5000, nprobe=8):
+    """Índice exacto, o IVF si el corpus tiene al menos ivf_min_documents"""
+    if len(documents) >= ivf_min_documents:
+        return IVFIndex(embedder, documents, matrix, nprobe=nprobe)
+    return VectorIndex(embedder, documents, matrix)
+
+
+class JsonlMetadata:
+    """
+    Secuencia de solo lectura sobre la metadata JSONL de un índice persistido
+    Cada acceso decodifica una línea (ubicada por su offset de byte) del
+    archivo abierto con mmap: no se carga el corpus completo en memoria
+    """
+
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = offsets
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._size = size
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        start = int(self.offsets[position])
+        end = int(self.offsets[position + 1]) if position + 1 < len(self) else self._size
+        return json.loads(self._data[start:end])
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+
+def index_paths(prefix):
+    """Archivos de un índice persistido con el prefijo dado"""
+    return {
+        "matrix": prefix + '.npy',
+        "metadata": prefix + '.jsonl',
+        "offsets": prefix + '.offsets.npy',
+        "ivf": prefix + '.ivf.npz',
+        "ivf_matrix": prefix + '.ivf.npy',
+        "bm25": prefix + '.bm25.npz',
+        "manifest": prefix + '.json',
+    }
+
+
+def write_metadata(documents, metadata_path, offsets_path):
+    """Escribir los documentos como JSONL y el offset de byte de cada línea"""
+    offsets = np.zeros(len(documents), dtype=np.int64)
+    with open(metadata_path, 'wb') as f:
+        for position, doc in enumerate(documents):
+            offsets[position] = f.tell()
+            f.write(json.dumps(doc, ensure_ascii=False).encode('utf-8') + b'\n')
+    np.save(offsets_path, offsets)
+
+
+def save_index(prefix, index, manifest=None):
+    """
+    Persistir un índice: matriz .npy, metadata .jsonl + offsets, listas IVF
+    y matriz en orden de lista (si corresponde) y un manifiesto .json que se
+    escribe al final, así un índice a medio escribir nunca se abre
+    """
+    paths = index_paths(prefix)
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if not (isinstance(index.matrix, np.memmap) and index.matrix.filename == os.path.abspath(paths["matrix"])):
+        np.save(paths["matrix"], np.ascontiguousarray(index.matrix, dtype=np.float32))
+    write_metadata(index.documents, paths["metadata"], paths["offsets"])
+    if isinstance(index, IVFIndex) and index.centroids is not None:
+        np.savez(paths["ivf"], centroids=index.centroids, order=index.order, bounds=index.bounds)
+        if not (isinstance(index.packed, np.memmap) and index.packed.filename == os.path.abspath(paths["ivf_matrix"])):
+            np.save(paths["ivf_matrix"], np.ascontiguousarray(index.packed, dtype=np.float32))
+    else:
+        for name in ("ivf", "ivf_matrix"):
+            if os.path.exists(paths[name]):
+                os.remove(paths[name])
+
+    manifest = dict(manifest or {})
+    manifest.update({
+        "kind": index.kind,
+        "documents": len(index.documents),
+        "embedder": index.embedder.name,
+        "dim": int(index.matrix.shape[1]),
+    })
+    with open(paths["manifest"], 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def publish_index(source_prefix, prefix):
+    """
+    Mover un índice recién escrito a su prefijo definitivo (os.replace por
+    archivo, el manifiesto al final): un servicio que tenga abierto el índice
+    anterior con mmap sigue leyendo los archivos viejos hasta reiniciar
+    """
+    source, target = index_paths(source_prefix), index_paths(prefix)
+    for name in ("matrix", "metadata", "offsets", "ivf", "ivf_matrix", "bm25"):
+        if os.path.exists(source[name]):
+            os.replace(source[name], target[name])
+        elif os.path.exists(target[name]):
+            os.remove(target[name])
+    os.replace(source["manifest"], target["manifest"])
+
+
+def load_index(prefix, embedder=None, nprobe=8):
+    """
+    Abrir un índice persistido con memory map (sin re-embeber ni copiar)
+    Sin embedder se crea el que indica el manifiesto; ValueError si el
+    embedder no coincide con el que generó el índice
+    """
+    paths = index_paths(prefix)
+    with open(paths["manifest"]) as f:
+        manifest = json.load(f)
+    if embedder is None:
+        embedder = create_embedder(manifest["embedder"], manifest["dim"])
+    if embedder.name != manifest["embedder"] or embedder.dim != manifest["dim"]:
+        raise ValueError(
+            f"El índice se generó con {manifest['embedder']} ({manifest['dim']} dims), "
+            f"no con {embedder.name} ({embedder.dim} dims)"
+        )
+
+    matrix = np.load(paths["matrix"], mmap_mode='r')
+    documents = JsonlMetadata(paths["metadata"], np.load(paths["offsets"], mmap_mode='r'))
+
+    if manifest.get("kind") == IVFIndex.kind:
+        index = IVFIndex.from_arrays(embedder, documents, matrix, nprobe=nprobe)
+        # Los índices sin .ivf.npy (anteriores) arman la copia en orden de lista en memoria
+        packed = np.load(paths["ivf_matrix"], mmap_mode='r') if os.path.exists(paths["ivf_matrix"]) else None
+        with np.load(paths["ivf"]) as ivf:
+            index.set_quantizer(ivf["centroids"], ivf["order"], ivf["bounds"], packed)
+    else:
+        index = VectorIndex.from_arrays(embedder, documents, matrix)
+    index.manifest = manifest
+    return index
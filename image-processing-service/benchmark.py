@@ -0,0 +1,144 @@
+"""
+BENCHMARK DEL SERVICIO DE IMÁGENES - AGROVERSE
+Dispara requests concurrentes contra el servicio y reporta latencias
+(p50/p95/p99), throughput y las estadísticas del backend de Earth Engine y
+de la caché. Por defecto corre en proceso con EE_BACKEND=fake, así se mide
+el overhead propio del servicio sin credenciales ni cuota.
+
+Uso:
+    python benchmark.py --requests 200 --concurrency 16 --locations 20
+    FAKE_EE_LATENCY_MS=300 RESULT_CACHE_ENABLED=false python benchmark.py
+    python benchmark.py --url http://localhost:8080 --endpoint /process/full-analysis
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, q):
+    """Percentil q (0-100) por interpolación lineal"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def build_bodies(count, locations, seed):
+    """Bodies de request sobre `locations` ubicaciones distintas (repetidas)"""
+    rng = random.Random(seed)
+    points = [
+        (round(-13.16 + rng.uniform(-0.5, 0.5), 4), round(-74.22 + rng.uniform(-0.5, 0.5), 4))
+        for _ in range(locations)
+    ]
+    bodies = []
+    for i in range(count):
+        latitude, longitude = points[i % locations]
+        bodies.append({
+            "latitude": latitude,
+            "longitude": longitude,
+            "buffer_km": 1,
+            "start_date": "2024-01-01",
+            "end_date": "2024-12-31",
+            "indices": ["NDVI", "EVI", "NDWI", "SAVI"],
+        })
+    rng.shuffle(bodies)
+    return bodies
+
+
+def in_process_client():
+    """Cliente de prueba de Flask sobre el servicio con backend fake"""
+    os.environ.setdefault('EE_BACKEND', 'fake')
+    workdir = tempfile.mkdtemp(prefix='agroverse-bench-')
+    os.environ.setdefault('RESULT_CACHE_PATH', os.path.join(workdir, 'results.db'))
+    os.environ.setdefault('TIMESERIES_STORE_PATH', os.path.join(workdir, 'timeseries.db'))
+    os.environ.setdefault('JOB_STORE_PATH', os.path.join(workdir, 'jobs.db'))
+
+    import server
+    client = server.app.test_client()
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        return response.status_code
+
+    def health():
+        return client.get('/health').get_json()
+
+    return post, health
+
+
+def http_client(url, timeout_s):
+    import requests
+    session = requests.Session()
+
+    def post(path, body):
+        return session.post(url + path, json=body, timeout=timeout_s).status_code
+
+    def health():
+        return session.get(url + '/health', timeout=timeout_s).json()
+
+    return post, health
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del servicio de imágenes satelitales")
+    parser.add_argument('--endpoint', default='/process/sentinel2')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--locations', type=int, default=10,
+                        help="Ubicaciones distintas (menos ubicaciones = más hits de caché)")
+    parser.add_argument('--url', default=None, help="Servicio remoto (por defecto, en proceso)")
+    parser.add_argument('--timeout-s', type=float, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    post, health = http_client(args.url, args.timeout_s) if args.url else in_process_client()
+    bodies = build_bodies(args.requests, args.locations, args.seed)
+
+    def timed(body):
+        started = time.perf_counter()
+        try:
+            status = post(args.endpoint, body)
+        except Exception:
+            status = 'error'
+        return status, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(timed, bodies))
+    elapsed_s = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    health_info = health()
+    report = {
+        "endpoint": args.endpoint,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "locations": args.locations,
+        "statuses": statuses,
+        "throughput_rps": round(args.requests / elapsed_s, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies), 1),
+        },
+        "earth_engine_backend": health_info.get("earth_engine_backend"),
+        "result_cache": health_info.get("result_cache"),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+SALIDA COLUMNAR DE SERIES TEMPORALES - AGROVERSE
+Codifica time_series como columnas tipadas en lugar de una lista JSON de
+diccionarios: "date" en días desde 1970-01-01 (int32) y un array float32 por
+índice o banda (NaN = sin dato). El resto del resultado (ubicación,
+composite, metadata) va como JSON dentro del mismo payload.
+
+Formatos (negociados con el header Accept o ?format=):
+- NPZ (application/x-npz): siempre disponible; np.load(..., allow_pickle=False)
+- MessagePack (application/x-msgpack): requiere msgpack; cada columna es
+  {"dtype": "<i4" | "<f4", "data": bytes little-endian} para leerla directo
+  con un TypedArray
+- Arrow IPC stream (application/vnd.apache.arrow.stream): requiere pyarrow;
+  la metadata va en el schema bajo la clave "agroverse"
+"""
+
+import io
+import json
+import logging
+from datetime import date
+
+import numpy as np
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    logging.warning("msgpack no disponible, salida MessagePack deshabilitada")
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logging.warning("pyarrow no disponible, salida Arrow deshabilitada")
+
+EPOCH = date(1970, 1, 1)
+
+# Formato -> media type
+MEDIA_TYPES = {
+    'npz': 'application/x-npz',
+    'msgpack': 'application/x-msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def available_formats():
+    """Formatos columnares que se pueden servir con las dependencias instaladas"""
+    formats = ['npz']
+    if MSGPACK_AVAILABLE:
+        formats.append('msgpack')
+    if PYARROW_AVAILABLE:
+        formats.append('arrow')
+    return formats
+
+
+def negotiate_format(accept_mimetypes, format_param=None):
+    """
+    Formato de respuesta: 'json' o uno de MEDIA_TYPES
+    ?format= tiene prioridad sobre Accept; con Accept */* o ausente, JSON
+    Lanza ValueError si se pide un formato no disponible
+    """
+    if format_param:
+        name = format_param.lower()
+        if name == 'json':
+            return 'json'
+        if name not in MEDIA_TYPES:
+            raise ValueError(f"Formato desconocido: {format_param}")
+    else:
+        # JSON primero para que */* lo prefiera
+        candidates = ['application/json'] + list(MEDIA_TYPES.values())
+        best = accept_mimetypes.best_match(candidates, default='application/json')
+        if best == 'application/json':
+            return 'json'
+        name = next(key for key, value in MEDIA_TYPES.items() if value == best)
+
+    if name not in available_formats():
+        raise ValueError(f"Formato {name} no disponible (falta la dependencia)")
+    return name
+
+
+def epoch_days(dates):
+    """Fechas 'YYYY-MM-DD' a días desde 1970-01-01 (int32)"""
+    return np.fromiter(
+        ((date.fromisoformat(str(value)[:10]) - EPOCH).days for value in dates),
+        dtype=np.int32, count=len(dates)
+    )
+
+
+def time_series_columns(time_series):
+    """
+    Transponer la serie a columnas: "date" int32 y un float32 por propiedad
+    numérica (las ausentes o nulas quedan en NaN), en orden alfabético
+    """
+    names = sorted({
+        key for row in time_series for key, value in row.items()
+        if key != 'date' and (value is None or isinstance(value, (int, float)))
+    })
+    columns = {"date": epoch_days([row['date'] for row in time_series])}
+    for name in names:
+        columns[name] = np.array(
+            [np.nan if row.get(name) is None else row[name] for row in time_series],
+            dtype=np.float32
+        )
+    return columns
+
+
+def _split(result):
+    """Columnas de time_series y el resto del resultado como metadata"""
+    metadata = {key: value for key, value in result.items() if key != 'time_series'}
+    metadata["time_series_encoding"] = {
+        "date": "int32 días desde 1970-01-01",
+        "values": "float32, NaN = sin dato",
+    }
+    return time_series_columns(result.get('time_series', [])), metadata
+
+
+def encode_npz(result):
+    columns, metadata = _split(result)
+    buffer = io.BytesIO()
+    np.savez(buffer, metadata=np.array(json.dumps(metadata)), **columns)
+    return buffer.getvalue()
+
+
+def encode_msgpack(result):
+    columns, metadata = _split(result)
+    encoded = {}
+    for name, values in columns.items():
+        little_endian = values.astype(values.dtype.newbyteorder('<'), copy=False)
+        encoded[name] = {"dtype": little_endian.dtype.str, "data": little_endian.tobytes()}
+    payload = {
+        "length": len(columns["date"]),
+        "columns": encoded,
+        "metadata": metadata,
+    }
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def encode_arrow(result):
+    columns, metadata = _split(result)
+    table = pa.table(
+        {name: pa.array(values) for name, values in columns.items()},
+        metadata={"agroverse": json.dumps(metadata)}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {
+    'npz': encode_npz,
+    'msgpack': encode_msgpack,
+    'arrow': encode_arrow,
+}
+
+
+def encode(result, format_name):
+    """Retorna (bytes, media type) del resultado en el formato columnar pedido"""
+    return ENCODERS[format_name](result), MEDIA_TYPES[format_name]
@@ -0,0 +1,621 @@
+"""
+BACKENDS DE EARTH ENGINE - AGROVERSE
+server.py usa un objeto con la interfaz del módulo `ee` (el subconjunto que
+necesitan los pipelines). EE_BACKEND elige cuál:
+
+- earthengine: el módulo `ee` real. ee.Initialize() ya no corre al importar
+  el servicio, sino la primera vez que se usa (o en el chequeo de salud en
+  segundo plano), así que importar server.py no requiere credenciales.
+- fake: backend local y determinista para pruebas de carga y benchmarks sin
+  credenciales. Genera escenas sintéticas (revisita de 5 días Sentinel-2, 16
+  días Landsat-8) con valores de banda derivados de un hash de colección,
+  región, fecha y banda, y evalúa las mismas funciones de índices del
+  servicio sobre esos valores. Cada getInfo duerme una latencia inyectada
+  (base + por feature retornado), así se mide el overhead propio del
+  servicio, la caché y la concurrencia.
+
+Operaciones soportadas por el backend fake: Geometry.Point/buffer/GeoJSON,
+ImageCollection (filterBounds, filterDate, filter, map, select, median),
+Image (select, rename, addBands, normalizedDifference, expression,
+bitwiseAnd, eq, And, updateMask, multiply, add, subtract, divide, get,
+reduceRegion, reduceRegions), Feature, FeatureCollection (map, flatten,
+geometry), Filter.lt/gt, Reducer.mean, Date.format, Dictionary, Number y
+getInfo.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import statistics
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class EarthEngineBackend:
+    """
+    Proxy del módulo `ee` real con inicialización diferida
+    Cualquier atributo (ee.ImageCollection, ee.Filter, ...) inicializa Earth
+    Engine la primera vez que se accede
+    """
+
+    name = 'earthengine'
+
+    def __init__(self, service_account='', key_file=''):
+        import ee
+        self._ee = ee
+        self._service_account = service_account
+        self._key_file = key_file
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def initialize(self):
+        """ee.Initialize() una sola vez (service account si está configurada)"""
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            if self._service_account and os.path.exists(self._key_file):
+                credentials = self._ee.ServiceAccountCredentials(self._service_account, self._key_file)
+                self._ee.Initialize(credentials)
+                logger.info("✅ Earth Engine inicializado con Service Account")
+            else:
+                # Desarrollo local
+                self._ee.Initialize()
+                logger.info("✅ Earth Engine inicializado (modo local)")
+            self._initialized = True
+
+    def __getattr__(self, name):
+        self.initialize()
+        return getattr(self._ee, name)
+
+    def stats(self):
+        return {"backend": self.name, "initialized": self._initialized}
+
+
+# ---------------------------------------------------------------------------
+# Backend fake
+# ---------------------------------------------------------------------------
+
+# Revisita y bandas sintéticas por colección
+FAKE_COLLECTIONS = {
+    'COPERNICUS/S2_SR': {
+        'revisit_days': 5,
+        'cloud_property': 'CLOUDY_PIXEL_PERCENTAGE',
+        'bands': ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'B8', 'B8A',
+                  'B9', 'B11', 'B12', 'QA60'],
+    },
+    'LANDSAT/LC08/C02/T1_L2': {
+        'revisit_days': 16,
+        'cloud_property': 'CLOUD_COVER',
+        'bands': ['SR_B2', 'SR_B3', 'SR_B4', 'SR_B5', 'ST_B10', 'QA_PIXEL'],
+    },
+}
+DEFAULT_FAKE_COLLECTION = {'revisit_days': 8, 'cloud_property': 'CLOUD_COVER', 'bands': ['B1']}
+
+# Rangos de DN plausibles por banda (reflectancia × 10000)
+FAKE_BAND_RANGES = {
+    'B2': (300, 1200), 'B3': (500, 1500), 'B4': (300, 1500), 'B8': (2000, 4500),
+    'SR_B2': (8000, 11000), 'SR_B3': (9000, 12000), 'SR_B4': (8000, 12000),
+    'SR_B5': (15000, 25000),
+}
+
+
+def _unit(*parts):
+    """Número determinista en [0, 1) a partir de un hash de las partes"""
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def _lift(function, *values):
+    """Aplicar una operación escalar propagando los píxeles enmascarados (None)"""
+    if any(value is None for value in values):
+        return None
+    try:
+        return function(*values)
+    except ZeroDivisionError:
+        return None
+
+
+# Expresiones de Image.expression que soporta el backend fake (las de los
+# índices del servicio), como funciones explícitas: nunca se evalúan strings
+FAKE_EXPRESSIONS = {
+    '2.5 * ((NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1))':
+        lambda v: 2.5 * ((v['NIR'] - v['RED']) / (v['NIR'] + 6 * v['RED'] - 7.5 * v['BLUE'] + 1)),
+    '((NIR - RED) / (NIR + RED + L)) * (1 + L)':
+        lambda v: ((v['NIR'] - v['RED']) / (v['NIR'] + v['RED'] + v['L'])) * (1 + v['L']),
+}
+
+
+def _info(value):
+    """Valor cliente de un objeto fake (o el valor tal cual)"""
+    return value._info() if hasattr(value, '_info') else value
+
+
+def _to_date(value):
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).date()
+    if isinstance(value, FakeDate):
+        return value.date
+    return date.fromisoformat(str(value)[:10])
+
+
+class FakeGeometry:
+    """Geometría representada por una clave estable (para el hash de valores)"""
+
+    def __init__(self, geojson=None, key=None):
+        if key is None:
+            key = repr(geojson)
+        self.key = key
+
+    def buffer(self, distance, *args, **kwargs):
+        return FakeGeometry(key=f"{self.key}+{round(float(distance), 3)}")
+
+    def _info(self):
+        return {"type": "Geometry", "key": self.key}
+
+
+class _GeometryFactory:
+    """ee.Geometry(geojson) y ee.Geometry.Point(coords)"""
+
+    def __call__(self, geojson, *args, **kwargs):
+        return FakeGeometry(geojson)
+
+    @staticmethod
+    def Point(coords, *args, **kwargs):
+        return FakeGeometry({"type": "Point", "coordinates": list(coords)})
+
+
+class FakeFilter:
+    def __init__(self, prop, compare):
+        self.prop = prop
+        self.compare = compare
+
+    def matches(self, properties):
+        value = properties.get(self.prop)
+        return value is not None and self.compare(value)
+
+
+class _FilterFactory:
+    @staticmethod
+    def lt(prop, value):
+        return FakeFilter(prop, lambda x: x < value)
+
+    @staticmethod
+    def gt(prop, value):
+        return FakeFilter(prop, lambda x: x > value)
+
+
+class FakeReducer:
+    def __init__(self, outputs=None):
+        self.outputs = outputs
+
+    def setOutputs(self, outputs):
+        return FakeReducer(list(outputs))
+
+    def rename(self, values):
+        """Nombres de salida: 'mean' para una banda sin setOutputs, como ee"""
+        if self.outputs is not None:
+            return dict(zip(self.outputs, values.values()))
+        if len(values) == 1:
+            return {'mean': next(iter(values.values()))}
+        return dict(values)
+
+
+class _ReducerFactory:
+    @staticmethod
+    def mean():
+        return FakeReducer()
+
+
+class FakeDate:
+    def __init__(self, value):
+        self.date = _to_date(value)
+
+    def format(self, fmt=None):
+        return self.date.isoformat()
+
+
+class FakeDictionary(dict):
+    """Diccionario con set() encadenable y getInfo()"""
+
+    def __init__(self, values=None, backend=None):
+        super().__init__(values or {})
+        self._backend = backend
+
+    def set(self, key, value):
+        updated = FakeDictionary(self, self._backend)
+        updated[key] = value
+        return updated
+
+    def _info(self):
+        return {key: _info(value) for key, value in self.items()}
+
+    def getInfo(self):
+        return self._backend.get_info(self)
+
+
+class FakeNumber:
+    def __init__(self, value, backend):
+        self.value = value
+        self._backend = backend
+
+    def _info(self):
+        return self.value
+
+    def getInfo(self):
+        return self._backend.get_info(self)
+
+
+class FakeImage:
+    """Una escena como un valor medio por banda (None = enmascarado)"""
+
+    def __init__(self, values, properties=None, backend=None):
+        self.values = dict(values)
+        self.properties = dict(properties or {})
+        self._backend = backend
+
+    def _with(self, values):
+        return FakeImage(values, self.properties, self._backend)
+
+    def _map(self, function):
+        return self._with({band: _lift(function, value) for band, value in self.values.items()})
+
+    def _scalar(self):
+        return next(iter(self.values.values()))
+
+    def _operand(self, other):
+        return other._scalar() if isinstance(other, FakeImage) else other
+
+    def get(self, prop):
+        return self.properties.get(prop)
+
+    def select(self, bands, *args):
+        names = [bands] if isinstance(bands, str) else list(bands)
+        return self._with({name: self.values.get(name) for name in names})
+
+    def rename(self, names, *args):
+        names = [names] if isinstance(names, str) else list(names)
+        return self._with(dict(zip(names, self.values.values())))
+
+    def addBands(self, image, *args, **kwargs):
+        return self._with({**self.values, **image.values})
+
+    def normalizedDifference(self, bands):
+        a, b = self.values.get(bands[0]), self.values.get(bands[1])
+        return self._with({'nd': _lift(lambda x, y: (x - y) / (x + y), a, b)})
+
+    def expression(self, expression, mapping):
+        function = FAKE_EXPRESSIONS.get(' '.join(expression.split()))
+        if function is None:
+            raise ValueError(f"Expresión no soportada por el backend fake: {expression}")
+        names = {name: self._operand(value) for name, value in mapping.items()}
+        if any(value is None for value in names.values()):
+            return self._with({'constant': None})
+        return self._with({'constant': _lift(function, names)})
+
+    def bitwiseAnd(self, mask):
+        return self._map(lambda x: int(x) & int(self._operand(mask)))
+
+    def eq(self, value):
+        return self._map(lambda x: 1 if x == self._operand(value) else 0)
+
+    def And(self, other):
+        other_value = self._operand(other)
+        return self._map(lambda x: 1 if (x and other_value) else 0)
+
+    def updateMask(self, mask):
+        if mask._scalar():
+            return self._with(self.values)
+        return self._with({band: None for band in self.values})
+
+    def multiply(self, value):
+        return self._map(lambda x: x * self._operand(value))
+
+    def add(self, value):
+        return self._map(lambda x: x + self._operand(value))
+
+    def subtract(self, value):
+        return self._map(lambda x: x - self._operand(value))
+
+    def divide(self, value):
+        return self._map(lambda x: x / self._operand(value))
+
+    def reduceRegion(self, reducer=None, geometry=None, **kwargs):
+        # reduceRegion conserva los nombres de banda (reduceRegions usa "mean")
+        values = dict(self.values)
+        if reducer is not None and reducer.outputs is not None:
+            values = reducer.rename(values)
+        return FakeDictionary(values, self._backend)
+
+    def reduceRegions(self, collection=None, reducer=None, **kwargs):
+        reducer = reducer or FakeReducer()
+        features = []
+        for feature in collection.features:
+            # Variación determinista por parcela (±5%)
+            jitter = 0.95 + 0.1 * _unit(feature.geometry_key(), self.properties.get('system:time_start'))
+            values = {
+                band: _lift(lambda x: x * jitter, value)
+                for band, value in reducer.rename(self.values).items()
+            }
+            features.append(feature.set_many(values))
+        return FakeFeatureCollection(features, self._backend)
+
+    def _info(self):
+        return {"type": "Image", "bands": list(self.values), "properties": self.properties}
+
+    def getInfo(self):
+        return self._backend.get_info(self)
+
+
+class FakeFeature:
+    def __init__(self, geometry, properties=None, backend=None):
+        self.geometry = geometry
+        if isinstance(properties, FakeDictionary):
+            properties = dict(properties)
+        self.properties = dict(properties or {})
+        self._backend = backend
+
+    def geometry_key(self):
+        return self.geometry.key if isinstance(self.geometry, FakeGeometry) else None
+
+    def set(self, key, value):
+        return self.set_many({key: value})
+
+    def set_many(self, values):
+        return FakeFeature(self.geometry, {**self.properties, **values}, self._backend)
+
+    def get(self, prop):
+        return self.properties.get(prop)
+
+    def _info(self):
+        return {
+            "type": "Feature",
+            "geometry": None,
+            "properties": {key: _info(value) for key, value in self.properties.items()}
+        }
+
+
+class FakeFeatureCollection:
+    def __init__(self, features, backend):
+        self.features = list(features)
+        self._backend = backend
+
+    def map(self, function):
+        return FakeFeatureCollection([function(feature) for feature in self.features], self._backend)
+
+    def flatten(self):
+        features = []
+        for item in self.features:
+            features.extend(item.features if isinstance(item, FakeFeatureCollection) else [item])
+        return FakeFeatureCollection(features, self._backend)
+
+    def geometry(self):
+        return FakeGeometry(key='|'.join(str(f.geometry_key()) for f in self.features))
+
+    def size(self):
+        return FakeNumber(len(self.features), self._backend)
+
+    def _info(self):
+        return {"type": "FeatureCollection", "features": [f._info() for f in self.features]}
+
+    def getInfo(self):
+        return self._backend.get_info(self)
+
+
+class FakeImageCollection:
+    """
+    Colección sintética: las escenas se generan al evaluarla a partir de la
+    colección, la región (filterBounds) y el rango de fechas (filterDate)
+    """
+
+    def __init__(self, collection_id, backend, region=None, start=None, end=None, steps=()):
+        self.collection_id = collection_id
+        self._backend = backend
+        self._region = region
+        self._start = start
+        self._end = end
+        self._steps = tuple(steps)
+
+    def _copy(self, **changes):
+        fields = {
+            'region': self._region, 'start': self._start,
+            'end': self._end, 'steps': self._steps
+        }
+        fields.update(changes)
+        return FakeImageCollection(self.collection_id, self._backend, **fields)
+
+    def filterBounds(self, geometry):
+        return self._copy(region=geometry)
+
+    def filterDate(self, start, end=None):
+        return self._copy(start=_to_date(start), end=_to_date(end) if end else None)
+
+    def filter(self, fake_filter):
+        return self._copy(steps=self._steps + (('filter', fake_filter),))
+
+    def map(self, function):
+        return self._copy(steps=self._steps + (('map', function),))
+
+    def select(self, bands, *args):
+        return self.map(lambda image: image.select(bands))
+
+    def _scenes(self):
+        spec = FAKE_COLLECTIONS.get(self.collection_id, DEFAULT_FAKE_COLLECTION)
+        if self._start is None or self._end is None:
+            return []
+        region_key = self._region.key if isinstance(self._region, FakeGeometry) else None
+        revisit = spec['revisit_days']
+        phase = int(_unit(self._backend.seed, self.collection_id, region_key) * revisit)
+
+        epoch = date(1970, 1, 1)
+        first = (self._start - epoch).days
+        offset = (phase - first) % revisit
+        day = self._start + timedelta(days=offset)
+
+        scenes = []
+        while day < self._end:
+            scenes.append(self._scene(spec, region_key, day))
+            day += timedelta(days=revisit)
+        return scenes
+
+    def _scene(self, spec, region_key, day):
+        seed = (self._backend.seed, self.collection_id, region_key, day.isoformat())
+        # Estacionalidad: máximo de vegetación y temperatura a mitad de año
+        season = math.sin(2 * math.pi * (day.timetuple().tm_yday - 100) / 365.25)
+        values = {}
+        for band in spec['bands']:
+            if band == 'QA60':
+                values[band] = (1 << 10) if _unit(*seed, band) < 0.15 else 0
+            elif band == 'QA_PIXEL':
+                values[band] = 21824
+            elif band == 'ST_B10':
+                lst = 20 + 8 * season + 4 * (_unit(*seed, band) - 0.5)
+                values[band] = (lst + 273.15 - 149.0) / 0.00341802
+            else:
+                low, high = FAKE_BAND_RANGES.get(band, (500, 3000))
+                vigor = 0.5 + 0.3 * season if band in ('B8', 'SR_B5') else 0.5
+                values[band] = low + (high - low) * min(max(vigor + 0.4 * (_unit(*seed, band) - 0.5), 0), 1)
+
+        time_start = int(datetime(day.year, day.month, day.day, 10, 30, tzinfo=timezone.utc).timestamp() * 1000)
+        properties = {
+            'system:time_start': time_start,
+            spec['cloud_property']: round(40 * _unit(*seed, 'clouds'), 2),
+        }
+        return FakeImage(values, properties, self._backend)
+
+    def _evaluate(self):
+        """Escenas tras aplicar filtros y maps en orden"""
+        items = self._scenes()
+        for kind, step in self._steps:
+            if kind == 'filter':
+                items = [item for item in items if step.matches(item.properties)]
+            else:
+                items = [step(item) for item in items]
+        return items
+
+    def median(self):
+        images = self._evaluate()
+        bands = list(images[0].values) if images else []
+        values = {}
+        for band in bands:
+            valid = [image.values[band] for image in images if image.values.get(band) is not None]
+            values[band] = statistics.median(valid) if valid else None
+        return FakeImage(values, {}, self._backend)
+
+    def _as_features(self):
+        return FakeFeatureCollection(self._evaluate(), self._backend)
+
+    def flatten(self):
+        return self._as_features().flatten()
+
+    def size(self):
+        return FakeNumber(len(self._evaluate()), self._backend)
+
+    def _info(self):
+        return self._as_features()._info()
+
+    def getInfo(self):
+        return self._backend.get_info(self)
+
+
+class FakeEarthEngine:
+    """
+    Backend local determinista con la interfaz de `ee` usada por el servicio
+    latency_ms: latencia fija por getInfo; latency_per_feature_ms: extra por
+    cada feature retornado (simula el costo de reducir cada escena)
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency_ms=0.0, latency_per_feature_ms=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_per_feature_ms = latency_per_feature_ms
+        self.seed = seed
+        self.Geometry = _GeometryFactory()
+        self.Filter = _FilterFactory()
+        self.Reducer = _ReducerFactory()
+        self._lock = threading.Lock()
+        self._stats = {"getinfo_calls": 0, "features_returned": 0, "injected_latency_s": 0.0}
+
+    def initialize(self):
+        pass
+
+    def ImageCollection(self, collection_id):
+        return FakeImageCollection(collection_id, self)
+
+    def Image(self, image_id):
+        return FakeImage({}, {'system:id': image_id}, self)
+
+    def Feature(self, geometry, properties=None):
+        return FakeFeature(geometry, properties, self)
+
+    def FeatureCollection(self, features):
+        return FakeFeatureCollection(features, self)
+
+    def Dictionary(self, values=None):
+        return FakeDictionary(values, self)
+
+    def Number(self, value):
+        return FakeNumber(value, self)
+
+    def Date(self, value):
+        return FakeDate(value)
+
+    def get_info(self, obj):
+        """Evaluar un objeto fake e inyectar la latencia configurada"""
+        info = _info(obj)
+        features = _count_features(info)
+        delay_s = (self.latency_ms + self.latency_per_feature_ms * features) / 1000
+        if delay_s > 0:
+            time.sleep(delay_s)
+        with self._lock:
+            self._stats["getinfo_calls"] += 1
+            self._stats["features_returned"] += features
+            self._stats["injected_latency_s"] += delay_s
+        return info
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "backend": self.name,
+            "latency_ms": self.latency_ms,
+            "latency_per_feature_ms": self.latency_per_feature_ms,
+            "injected_latency_s": round(stats["injected_latency_s"], 3),
+        })
+        return stats
+
+
+def _count_features(info):
+    """Features en un resultado de getInfo (anidado en diccionarios)"""
+    if isinstance(info, dict):
+        if info.get("type") == "FeatureCollection":
+            return len(info.get("features", []))
+        return sum(_count_features(value) for value in info.values())
+    return 0
+
+
+def create_backend(name, **options):
+    """
+    Backend según EE_BACKEND
+    earthengine: service_account, key_file
+    fake: latency_ms, latency_per_feature_ms, seed
+    """
+    if name == 'fake':
+        logger.info("🧪 Usando backend fake de Earth Engine (datos sintéticos)")
+        return FakeEarthEngine(
+            latency_ms=options.get('latency_ms', 0.0),
+            latency_per_feature_ms=options.get('latency_per_feature_ms', 0.0),
+            seed=options.get('seed', 0)
+        )
+    if name == 'earthengine':
+        return EarthEngineBackend(
+            service_account=options.get('service_account', ''),
+            key_file=options.get('key_file', '')
+        )
+    raise ValueError(f"EE_BACKEND desconocido: {name} (earthengine o fake)")
@@ -0,0 +1,528 @@
+"""
+TRABAJOS ASÍNCRONOS - AGROVERSE
+Los análisis con rangos de fechas largos bloquean un worker de Flask durante
+decenas de segundos y chocan con el timeout de Cloud Run. Con /jobs el
+request solo encola el trabajo y retorna un ID; un pool acotado de hilos
+ejecuta el trabajo de Earth Engine y el cliente consulta el estado o recibe
+el resultado por callback.
+
+- Estado en SQLite: sobrevive reinicios; los trabajos que quedaron en cola
+  se vuelven a encolar al arrancar (recover). Un trabajo en ejecución tiene
+  dueño (worker_id) y un lease que su worker renueva con heartbeats: solo se
+  re-encola si el lease venció (el worker murió), no si otro worker vivo lo
+  está ejecutando. Tomar un trabajo es un UPDATE condicional, así que aunque
+  dos workers lo encolen se ejecuta una sola vez.
+- Deduplicación: el mismo tipo + parámetros retorna el trabajo existente
+  mientras esté en cola, en ejecución o haya terminado bien hace menos de
+  dedup_ttl_s. El callback_url de un pedido deduplicado se agrega al trabajo
+  (tabla job_callbacks) y también se notifica, o de inmediato si ya terminó.
+- Callbacks solo a URLs https públicas (opcionalmente de una lista de hosts
+  permitidos): nunca a la red interna ni al servidor de metadatos.
+"""
+
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class QueueFullError(Exception):
+    """No hay lugar en la cola de trabajos"""
+
+
+def dedup_key(kind, params):
+    """Hash del tipo de trabajo y sus parámetros canónicos"""
+    canonical = json.dumps({"kind": kind, "params": params}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def validate_callback_url(url, allowed_hosts=()):
+    """
+    Validar un callback_url contra SSRF: https, host en allowed_hosts (o un
+    subdominio) si la lista no está vacía, y todas sus direcciones resueltas
+    públicas (ni privadas, loopback, link-local ni reservadas)
+    Lanza ValueError si no es válido
+    """
+    parts = urlsplit(url) if isinstance(url, str) else None
+    if parts is None or parts.scheme != 'https' or not parts.hostname:
+        raise ValueError("'callback_url' debe ser una URL https")
+    host = parts.hostname.rstrip('.')
+    if allowed_hosts and not any(
+        host == allowed or host.endswith('.' + allowed) for allowed in allowed_hosts
+    ):
+        raise ValueError(f"Host de callback no permitido: {host}")
+
+    try:
+        addresses = {
+            info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)
+        }
+    except socket.gaierror as e:
+        raise ValueError(f"No se pudo resolver el host de callback {host}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"El host de callback {host} resuelve a una dirección no pública ({ip})")
+
+
+class JobStore:
+    """Trabajos y resultados en SQLite"""
+
+    COLUMNS = (
+        "id", "kind", "params", "dedup_key", "status", "result", "error",
+        "callback_url", "callback_status", "created_at", "started_at",
+        "finished_at", "attempts", "worker_id", "heartbeat_at"
+    )
+
+    # Columnas agregadas después de la primera versión de la tabla
+    MIGRATIONS = {
+        "worker_id": "TEXT",
+        "heartbeat_at": "REAL",
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, "
+            "kind TEXT NOT NULL, "
+            "params TEXT NOT NULL, "
+            "dedup_key TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "result BLOB, "
+            "error TEXT, "
+            "callback_url TEXT, "
+            "callback_status TEXT, "
+            "created_at REAL NOT NULL, "
+            "started_at REAL, "
+            "finished_at REAL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "worker_id TEXT, "
+            "heartbeat_at REAL)"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in self.MIGRATIONS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        # Callbacks de pedidos deduplicados (el del creador va en jobs.callback_url)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_callbacks ("
+            "job_id TEXT NOT NULL, "
+            "callback_url TEXT NOT NULL, "
+            "status TEXT, "
+            "created_at REAL NOT NULL, "
+            "PRIMARY KEY (job_id, callback_url))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._conn.commit()
+
+    def _row_to_job(self, row):
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(zlib.decompress(job["result"])) if job["result"] else None
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row)
+
+    def create_or_reuse(self, kind, params, callback_url, dedup_ttl_s):
+        """
+        Crear un trabajo en cola, o retornar el duplicado vigente (y agregarle
+        callback_url si es distinto del suyo). Retorna (trabajo, True si se creó)
+        """
+        key = dedup_key(kind, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs "
+                "WHERE dedup_key = ? AND (status IN (?, ?) OR (status = ? AND finished_at > ?)) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (key, QUEUED, RUNNING, SUCCEEDED, now - dedup_ttl_s)
+            ).fetchone()
+            if row is not None:
+                job = self._row_to_job(row)
+                if callback_url is not None and callback_url != job["callback_url"]:
+                    # En la misma transacción que la lectura del estado: si el
+                    # trabajo sigue activo, este callback se envía al terminar
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO job_callbacks (job_id, callback_url, created_at) "
+                        "VALUES (?, ?, ?)",
+                        (job["id"], callback_url, now)
+                    )
+                    self._conn.commit()
+                return job, False
+
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, params, dedup_key, status, callback_url, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), key, QUEUED, callback_url, now)
+            )
+            self._conn.commit()
+        return self.get(job_id), True
+
+    def claim(self, job_id, worker_id):
+        """
+        Pasar un trabajo en cola a en ejecución a nombre de worker_id
+        Retorna False si ya no estaba en cola (otro worker lo tomó)
+        """
+        now = time.time()
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, worker_id = ?, "
+                "attempts = attempts + 1 WHERE id = ? AND status = ?",
+                (RUNNING, now, now, worker_id, job_id, QUEUED)
+            ).rowcount
+            self._conn.commit()
+        return claimed == 1
+
+    def heartbeat(self, worker_id):
+        """Renovar el lease de los trabajos en ejecución de worker_id"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = ?",
+                (time.time(), worker_id, RUNNING)
+            )
+            self._conn.commit()
+
+    def finish(self, job_id, worker_id, result=None, error=None):
+        """
+        Guardar el resultado si worker_id sigue siendo el dueño del trabajo
+        (si perdió el lease, el trabajo ya fue re-encolado para otro worker)
+        """
+        blob = zlib.compress(json.dumps(result).encode('utf-8')) if error is None else None
+        with self._lock:
+            finished = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (SUCCEEDED if error is None else FAILED, blob, error, time.time(),
+                 job_id, worker_id, RUNNING)
+            ).rowcount
+            self._conn.commit()
+        return finished == 1
+
+    def set_callback_status(self, job_id, status):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET callback_status = ? WHERE id = ?", (status, job_id)
+            )
+            self._conn.commit()
+
+    def take_callbacks(self, job_id):
+        """
+        URLs de los callbacks agregados a un trabajo que todavía no se
+        enviaron; quedan marcados como 'sending' para que no se envíen dos veces
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT callback_url FROM job_callbacks WHERE job_id = ? AND status IS NULL "
+                "ORDER BY created_at",
+                (job_id,)
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE job_callbacks SET status = 'sending' WHERE job_id = ? AND status IS NULL",
+                (job_id,)
+            )
+            self._conn.commit()
+        return [row[0] for row in rows]
+
+    def set_extra_callback_status(self, job_id, callback_url, status):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_callbacks SET status = ? WHERE job_id = ? AND callback_url = ?",
+                (status, job_id, callback_url)
+            )
+            self._conn.commit()
+
+    def queued(self):
+        """IDs de trabajos en cola, del más antiguo al más nuevo"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def requeue_stale(self, lease_s, max_attempts):
+        """
+        Trabajos en ejecución cuyo lease venció (sin heartbeat en lease_s
+        segundos): vuelven a la cola, o pasan a fallidos si ya se intentaron
+        max_attempts veces (p. ej. un trabajo que tumba al worker)
+        Retorna (IDs re-encolados, IDs fallidos)
+        """
+        now = time.time()
+        cutoff = now - lease_s
+        stale_condition = "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, attempts FROM jobs WHERE {stale_condition} ORDER BY created_at",
+                (RUNNING, cutoff)
+            ).fetchall()
+            requeued, failed = [], []
+            for job_id, attempts in rows:
+                # Condicional: otro worker pudo re-encolarlo o renovarlo entre medio
+                if attempts >= max_attempts:
+                    updated = self._conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                        f"WHERE id = ? AND {stale_condition}",
+                        (FAILED, f"Máximo de intentos alcanzado ({attempts}): el worker "
+                         "se detuvo durante la ejecución", now, job_id, RUNNING, cutoff)
+                    ).rowcount
+                    if updated:
+                        failed.append(job_id)
+                else:
+                    updated = self._conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = NULL, worker_id = NULL, "
+                        f"heartbeat_at = NULL WHERE id = ? AND {stale_condition}",
+                        (QUEUED, job_id, RUNNING, cutoff)
+                    ).rowcount
+                    if updated:
+                        requeued.append(job_id)
+            self._conn.commit()
+        return requeued, failed
+
+    def purge(self, older_than_s):
+        """Borrar trabajos terminados hace más de older_than_s segundos"""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, time.time() - older_than_s)
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM job_callbacks WHERE job_id NOT IN (SELECT id FROM jobs)"
+            )
+            self._conn.commit()
+        return deleted
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+
+class JobManager:
+    """
+    Pool acotado de hilos que ejecuta los trabajos del JobStore
+    runners: dict tipo -> función(params) que retorna un resultado JSON
+    """
+
+    def __init__(self, store, runners, max_workers=4, max_pending=100,
+                 dedup_ttl_s=6 * 3600, callback_timeout_s=10, callback_allowed_hosts=(),
+                 lease_s=60, max_attempts=3):
+        self.store = store
+        self.runners = runners
+        self.max_pending = max_pending
+        self.dedup_ttl_s = dedup_ttl_s
+        self.callback_timeout_s = callback_timeout_s
+        self.callback_allowed_hosts = tuple(callback_allowed_hosts)
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        # Dueño de los trabajos que ejecuta este proceso
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name="jobs-heartbeat", daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        """Renovar el lease de los trabajos propios y recuperar los de workers muertos"""
+        while not self._stopped.wait(self.lease_s / 3):
+            try:
+                self.store.heartbeat(self.worker_id)
+                for job_id in self._recover_stale():
+                    self._enqueue(job_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Error renovando leases de trabajos: {e}")
+
+    def stop(self):
+        """Detener el heartbeat (los trabajos en ejecución no se interrumpen)"""
+        self._stopped.set()
+        self._heartbeat_thread.join()
+
+    def submit(self, kind, params, callback_url=None):
+        """
+        Encolar un trabajo (o reutilizar un duplicado)
+        Retorna (trabajo, True si se creó); ValueError si el tipo no existe o
+        el callback_url no es válido, QueueFullError si la cola está llena
+        """
+        if kind not in self.runners:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        if callback_url is not None:
+            validate_callback_url(callback_url, self.callback_allowed_hosts)
+        # El lugar en la cola se reserva en la misma sección crítica que el
+        # chequeo (si no, pedidos concurrentes superan max_pending) y se
+        # libera si el trabajo resulta ser un duplicado
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Cola llena ({self.max_pending} trabajos pendientes)")
+            self._pending += 1
+
+        try:
+            job, created = self.store.create_or_reuse(kind, params, callback_url, self.dedup_ttl_s)
+        except Exception:
+            self._release()
+            raise
+        if created:
+            self._executor.submit(self._run, job["id"])
+        else:
+            self._release()
+            if job["status"] == SUCCEEDED:
+                # Ya terminó: el callback agregado se envía ahora
+                self._executor.submit(self._notify_extra, job)
+        return job, created
+
+    def _enqueue(self, job_id):
+        with self._pending_lock:
+            self._pending += 1
+        self._executor.submit(self._run, job_id)
+
+    def _release(self):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _run(self, job_id):
+        try:
+            job = self.store.get(job_id)
+            if job is None or not self.store.claim(job_id, self.worker_id):
+                # Otro worker ya lo tomó (o terminó)
+                return
+            started = time.perf_counter()
+            try:
+                result = self.runners[job["kind"]](job["params"])
+                finished = self.store.finish(job_id, self.worker_id, result=result)
+                logger.info(
+                    f"Trabajo {job_id} ({job['kind']}) terminado en "
+                    f"{time.perf_counter() - started:.1f}s"
+                )
+            except Exception as e:
+                logger.error(f"Trabajo {job_id} ({job['kind']}) falló: {e}")
+                finished = self.store.finish(job_id, self.worker_id, error=str(e))
+
+            if not finished:
+                logger.warning(f"Trabajo {job_id}: lease perdido, se descarta el resultado")
+            else:
+                self._notify(self.store.get(job_id))
+        finally:
+            self._release()
+
+    def _notify(self, job):
+        """Callbacks de un trabajo terminado: el de su creador y los agregados"""
+        if job["callback_url"]:
+            self.store.set_callback_status(job["id"], self._post_callback(job["callback_url"], job))
+        self._notify_extra(job)
+
+    def _notify_extra(self, job):
+        """Callbacks agregados por pedidos deduplicados que aún no se enviaron"""
+        for callback_url in self.store.take_callbacks(job["id"]):
+            self.store.set_extra_callback_status(
+                job["id"], callback_url, self._post_callback(callback_url, job)
+            )
+
+    def _post_callback(self, callback_url, job):
+        """POST del estado y resultado de un trabajo; retorna el estado del envío"""
+        try:
+            # Se vuelve a validar: el DNS pudo cambiar desde que se encoló
+            validate_callback_url(callback_url, self.callback_allowed_hosts)
+            # Sin redirecciones: una 3xx podría apuntar a la red interna
+            response = requests.post(
+                callback_url, json=self.describe(job, include_result=True),
+                timeout=self.callback_timeout_s, allow_redirects=False
+            )
+            return str(response.status_code)
+        except Exception as e:
+            logger.warning(f"Callback del trabajo {job['id']} falló: {e}")
+            return f"error: {e}"
+
+    def _recover_stale(self):
+        """
+        Re-encolar en el store los trabajos con lease vencido y notificar los
+        que agotaron max_attempts. Retorna los IDs re-encolados
+        """
+        requeued, failed = self.store.requeue_stale(self.lease_s, self.max_attempts)
+        if requeued:
+            logger.info(f"♻️ {len(requeued)} trabajos con lease vencido re-encolados")
+        for job_id in failed:
+            job = self.store.get(job_id)
+            logger.error(f"Trabajo {job_id} ({job['kind']}) falló tras {job['attempts']} intentos")
+            self._executor.submit(self._notify, job)
+        return requeued
+
+    def recover(self):
+        """
+        Al arrancar: re-encolar los trabajos con lease vencido (su worker murió)
+        y encolar los que quedaron en cola. Los trabajos de workers vivos no se
+        tocan; un trabajo que dos workers encolan se ejecuta una sola vez (claim)
+        """
+        requeued = self._recover_stale()
+        job_ids = self.store.queued()
+        for job_id in job_ids:
+            self._enqueue(job_id)
+        if job_ids:
+            logger.info(
+                f"♻️ {len(job_ids)} trabajos encolados al arrancar "
+                f"({len(requeued)} con lease vencido)"
+            )
+        return len(job_ids)
+
+    @staticmethod
+    def describe(job, include_result=False):
+        """Representación pública de un trabajo"""
+        description = {
+            "job_id": job["id"],
+            "type": job["kind"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "attempts": job["attempts"],
+        }
+        if job["error"]:
+            description["error"] = job["error"]
+        if job["callback_url"]:
+            description["callback_status"] = job["callback_status"]
+        if include_result and job["status"] == SUCCEEDED:
+            description["result"] = job["result"]
+        return description
+
+    def stats(self):
+        with self._pending_lock:
+            pending = self._pending
+        return {"pending": pending, "max_pending": self.max_pending, "by_status": self.store.counts()}
@@ -0,0 +1,211 @@
+"""
+COMPOSITE MEDIANO LOCAL POR TILES - AGROVERSE
+Reproduce collection.median() del pipeline Sentinel-2 sobre una pila de
+escenas espejadas localmente, con la máscara de nubes de
+mask_clouds_sentinel2. La pila no se carga nunca completa: cada tile se lee
+de los .npy memory-mapped de todas las escenas, se reduce con nan-median
+(los píxeles enmascarados no votan) y se escribe en el .npy de salida.
+Los tiles se reparten en un pool de procesos.
+
+Como en Earth Engine, los índices (NDVI, EVI, ...) se calculan por escena y
+luego se toma su mediana; no son el índice del composite de bandas.
+
+Uso como CLI (cada escena es un directorio con B2.npy, B3.npy, ..., QA60.npy):
+    python local_composite.py escenas/2024-* --bands B2,B3,B4,B8 \\
+        --indices NDVI,EVI --out-dir composite/ --tile-size 512 --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from local_indices import (
+    INDEX_BANDS, SENTINEL2_SCALE, cloud_mask_sentinel2,
+    sentinel2_chunk_indices, summarize
+)
+
+DEFAULT_TILE_SIZE = 512
+
+
+def tiles(shape, tile_size):
+    """Ventanas (fila0, fila1, col0, col1) que cubren una escena 2-D"""
+    rows, cols = shape
+    return [
+        (r, min(r + tile_size, rows), c, min(c + tile_size, cols))
+        for r in range(0, rows, tile_size)
+        for c in range(0, cols, tile_size)
+    ]
+
+
+def nan_median(stack):
+    """Mediana sobre el eje de escenas ignorando NaN; NaN si todas lo son"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmedian(stack, axis=0)
+
+
+def _scene_tile(scene, bands, indices, window, mask_clouds):
+    """Reflectancia enmascarada e índices de una escena en una ventana"""
+    r0, r1, c0, c1 = window
+    needed = set(bands) | {band for index in indices for band in INDEX_BANDS[index]}
+    raw = {
+        name: np.load(scene[name], mmap_mode='r')[r0:r1, c0:c1]
+        for name in needed
+    }
+
+    values = {}
+    if mask_clouds:
+        qa60 = np.load(scene['QA60'], mmap_mode='r')[r0:r1, c0:c1]
+        clear = cloud_mask_sentinel2(qa60)
+        raw['QA60'] = qa60
+    for name in bands:
+        reflectance = raw[name].astype(np.float32) / np.float32(SENTINEL2_SCALE)
+        if mask_clouds:
+            reflectance[~clear] = np.nan
+        values[name] = reflectance
+    if indices:
+        for index, index_values in sentinel2_chunk_indices(raw, indices, mask_clouds).items():
+            values[index] = index_values.astype(np.float32)
+    return values
+
+
+def composite_tile(scenes, bands, indices, window, out_paths, mask_clouds=True):
+    """
+    Composite mediano de una ventana: lee la ventana de cada escena, toma la
+    nan-median y la escribe directamente en los .npy de salida
+    Se ejecuta en un proceso del pool; retorna la ventana procesada
+    """
+    r0, r1, c0, c1 = window
+    outputs = list(bands) + list(indices)
+    stacks = {
+        name: np.empty((len(scenes), r1 - r0, c1 - c0), dtype=np.float32)
+        for name in outputs
+    }
+    for i, scene in enumerate(scenes):
+        for name, values in _scene_tile(scene, bands, indices, window, mask_clouds).items():
+            stacks[name][i] = values
+
+    for name in outputs:
+        out = np.load(out_paths[name], mmap_mode='r+')
+        out[r0:r1, c0:c1] = nan_median(stacks[name])
+        out.flush()
+        del out
+    return window
+
+
+def scene_shape(scenes, bands):
+    """Forma común de todas las bandas de todas las escenas (sin leerlas)"""
+    shapes = set()
+    for scene in scenes:
+        for name in bands:
+            if name not in scene:
+                raise ValueError(f"Falta la banda {name} en una escena")
+            shapes.add(np.load(scene[name], mmap_mode='r').shape)
+    if len(shapes) != 1:
+        raise ValueError(f"Las escenas tienen formas distintas: {sorted(shapes)}")
+    shape = shapes.pop()
+    if len(shape) != 2:
+        raise ValueError(f"Se esperan bandas 2-D, forma {shape}")
+    return shape
+
+
+def median_composite(scenes, out_dir, bands=('B2', 'B3', 'B4', 'B8'), indices=(),
+                     tile_size=DEFAULT_TILE_SIZE, workers=None, mask_clouds=True):
+    """
+    Composite mediano de una pila de escenas Sentinel-2 (DN crudos)
+    scenes: lista de dicts banda -> ruta .npy
+    Escribe <banda>.npy y <índice>.npy float32 en out_dir y los retorna
+    abiertos en modo lectura (memmap). La memoria por proceso es del orden de
+    escenas × tile_size² × 4 bytes por banda.
+    """
+    if not scenes:
+        raise ValueError("Se requiere al menos una escena")
+    bands = list(bands)
+    indices = [index.upper() for index in indices]
+    unknown = [index for index in indices if index not in INDEX_BANDS]
+    if unknown:
+        raise ValueError(f"Índices no soportados: {unknown}")
+
+    required = set(bands) | {band for index in indices for band in INDEX_BANDS[index]}
+    if mask_clouds:
+        required.add('QA60')
+    shape = scene_shape(scenes, sorted(required))
+
+    os.makedirs(out_dir, exist_ok=True)
+    out_paths = {}
+    for name in bands + indices:
+        out_paths[name] = os.path.join(out_dir, f"{name}.npy")
+        np.lib.format.open_memmap(
+            out_paths[name], mode='w+', dtype=np.float32, shape=shape
+        ).flush()
+
+    windows = tiles(shape, tile_size)
+    if workers == 1 or len(windows) == 1:
+        for window in windows:
+            composite_tile(scenes, bands, indices, window, out_paths, mask_clouds)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(composite_tile, scenes, bands, indices, window, out_paths, mask_clouds)
+                for window in windows
+            ]
+            for future in futures:
+                future.result()
+
+    return {name: np.load(path, mmap_mode='r') for name, path in out_paths.items()}
+
+
+def scenes_from_dirs(directories):
+    """Escenas a partir de directorios con un <banda>.npy por banda"""
+    scenes = []
+    for directory in directories:
+        scene = {
+            os.path.splitext(name)[0]: os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.endswith('.npy')
+        }
+        if not scene:
+            raise ValueError(f"Sin bandas .npy en {directory}")
+        scenes.append(scene)
+    return scenes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Composite mediano por tiles de escenas Sentinel-2 locales"
+    )
+    parser.add_argument('scenes', nargs='+', help="Directorios de escena con <banda>.npy")
+    parser.add_argument('--bands', default='B2,B3,B4,B8')
+    parser.add_argument('--indices', default='', help="Índices por escena, p. ej. NDVI,EVI")
+    parser.add_argument('--out-dir', required=True)
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Procesos del pool (por defecto, uno por CPU)")
+    parser.add_argument('--no-cloud-mask', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        outputs = median_composite(
+            scenes_from_dirs(args.scenes),
+            args.out_dir,
+            bands=[band.strip() for band in args.bands.split(',') if band.strip()],
+            indices=[index.strip() for index in args.indices.split(',') if index.strip()],
+            tile_size=args.tile_size,
+            workers=args.workers,
+            mask_clouds=not args.no_cloud_mask
+        )
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    json.dump(summarize(outputs), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+MOTOR LOCAL DE ÍNDICES ESPECTRALES - AGROVERSE
+Mismos índices que el pipeline de Earth Engine (NDVI, EVI, NDWI, SAVI, máscara
+de nubes QA60 y LST de Landsat-8), calculados con NumPy sobre bandas locales:
+tiles .npy (memory-mapped) o GeoTIFF (rasterio, opcional). Se procesa por
+bloques de filas, así que la memoria queda acotada al tamaño del bloque y no
+al de la escena.
+
+Uso como CLI (escenas espejadas localmente):
+    python local_indices.py sentinel2 --band B2=b2.npy --band B3=b3.npy \\
+        --band B4=b4.npy --band B8=b8.npy --band QA60=qa60.npy \\
+        --indices NDVI,EVI,NDWI,SAVI --out-dir indices/
+    python local_indices.py landsat8 --band ST_B10=st_b10.tif --out-dir lst/
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import rasterio
+    from rasterio.windows import Window
+    RASTERIO_AVAILABLE = True
+except ImportError:
+    RASTERIO_AVAILABLE = False
+    logging.warning("rasterio no disponible, solo se leerán tiles .npy")
+
+# Bits de nubes y cirros de la banda QA60 de Sentinel-2
+CLOUD_BIT = 1 << 10
+CIRRUS_BIT = 1 << 11
+
+# Escala de reflectancia de Sentinel-2 SR (DN / 10000)
+SENTINEL2_SCALE = 10000.0
+
+# Landsat-8 C2 L2: ST_B10 * 0.00341802 + 149.0 (Kelvin)
+LST_MULTIPLY = 0.00341802
+LST_ADD = 149.0
+KELVIN_OFFSET = 273.15
+
+SAVI_L = 0.5
+
+# Bandas que necesita cada índice (nombres de Sentinel-2)
+INDEX_BANDS = {
+    'NDVI': ['B8', 'B4'],
+    'EVI': ['B8', 'B4', 'B2'],
+    'NDWI': ['B3', 'B8'],
+    'SAVI': ['B8', 'B4'],
+}
+
+DEFAULT_CHUNK_ROWS = 512
+
+
+def normalized_difference(a, b):
+    """(a - b) / (a + b), como ee.Image.normalizedDifference; NaN si a + b = 0"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (a - b) / (a + b)
+
+
+def ndvi(nir, red):
+    """NDVI: (B8 - B4) / (B8 + B4)"""
+    return normalized_difference(nir, red)
+
+
+def evi(nir, red, blue):
+    """EVI: 2.5 * (NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 2.5 * ((nir - red) / (nir + 6 * red - 7.5 * blue + 1))
+
+
+def ndwi(green, nir):
+    """NDWI: (B3 - B8) / (B3 + B8)"""
+    return normalized_difference(green, nir)
+
+
+def savi(nir, red, L=SAVI_L):
+    """SAVI: ((NIR - RED) / (NIR + RED + L)) * (1 + L)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ((nir - red) / (nir + red + L)) * (1 + L)
+
+
+def cloud_mask_sentinel2(qa60):
+    """True donde el píxel está libre de nubes y cirros (bits 10 y 11 de QA60)"""
+    qa60 = np.asarray(qa60).astype(np.int64, copy=False)
+    return ((qa60 & CLOUD_BIT) == 0) & ((qa60 & CIRRUS_BIT) == 0)
+
+
+def mask_clouds_sentinel2(bands, qa60):
+    """
+    Equivalente local de mask_clouds_sentinel2: reflectancia (DN / 10000) con
+    NaN en los píxeles con nubes o cirros
+    bands: dict nombre -> array de DN
+    """
+    clear = cloud_mask_sentinel2(qa60)
+    return {
+        name: np.where(clear, np.asarray(values, dtype=np.float64) / SENTINEL2_SCALE, np.nan)
+        for name, values in bands.items()
+    }
+
+
+def lst_celsius(st_b10):
+    """Land Surface Temperature en °C desde ST_B10 de Landsat-8 C2 L2"""
+    return np.asarray(st_b10, dtype=np.float64) * LST_MULTIPLY + LST_ADD - KELVIN_OFFSET
+
+
+def sentinel2_chunk_indices(bands, indices, mask_clouds=True):
+    """
+    Índices de un bloque de bandas Sentinel-2 (DN crudos)
+    Si mask_clouds y hay QA60, aplica la máscara de nubes antes de calcular
+    """
+    needed = sorted({band for index in indices for band in INDEX_BANDS[index]})
+    selected = {band: bands[band] for band in needed}
+    if mask_clouds and 'QA60' in bands:
+        reflectance = mask_clouds_sentinel2(selected, bands['QA60'])
+    else:
+        reflectance = {
+            name: np.asarray(values, dtype=np.float64) / SENTINEL2_SCALE
+            for name, values in selected.items()
+        }
+
+    functions = {
+        'NDVI': lambda r: ndvi(r['B8'], r['B4']),
+        'EVI': lambda r: evi(r['B8'], r['B4'], r['B2']),
+        'NDWI': lambda r: ndwi(r['B3'], r['B8']),
+        'SAVI': lambda r: savi(r['B8'], r['B4']),
+    }
+    return {index: functions[index](reflectance) for index in indices}
+
+
+class GeoTiffBand:
+    """Banda de un GeoTIFF con lectura por ventanas de filas (como un memmap)"""
+
+    def __init__(self, path, band=1):
+        if not RASTERIO_AVAILABLE:
+            raise RuntimeError("rasterio no está instalado; usa tiles .npy")
+        self.path = path
+        self.band = band
+        self._dataset = rasterio.open(path)
+        self.shape = (self._dataset.height, self._dataset.width)
+        self.dtype = np.dtype(self._dataset.dtypes[band - 1])
+
+    def __getitem__(self, rows):
+        if not isinstance(rows, slice) or rows.step not in (None, 1):
+            raise IndexError("Solo se soportan bloques de filas contiguas")
+        start, stop, _ = rows.indices(self.shape[0])
+        window = Window(0, start, self.shape[1], stop - start)
+        return self._dataset.read(self.band, window=window)
+
+    def close(self):
+        self._dataset.close()
+
+
+def load_band(path):
+    """Abrir una banda sin cargarla en memoria: .npy con mmap o GeoTIFF"""
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    if path.lower().endswith(('.tif', '.tiff')):
+        return GeoTiffBand(path)
+    raise ValueError(f"Formato no soportado: {path} (se espera .npy o .tif)")
+
+
+def _allocate(shape, names, out_dir):
+    """Arrays de salida float32: .npy memory-mapped en out_dir, o en memoria"""
+    outputs = {}
+    for name in names:
+        if out_dir:
+            outputs[name] = np.lib.format.open_memmap(
+                os.path.join(out_dir, f"{name}.npy"), mode='w+',
+                dtype=np.float32, shape=shape
+            )
+        else:
+            outputs[name] = np.empty(shape, dtype=np.float32)
+    return outputs
+
+
+def _common_shape(bands):
+    shapes = {tuple(band.shape) for band in bands.values()}
+    if len(shapes) != 1:
+        raise ValueError(f"Las bandas tienen formas distintas: {sorted(shapes)}")
+    shape = shapes.pop()
+    if len(shape) != 2:
+        raise ValueError(f"Se esperan bandas 2-D, forma {shape}")
+    return shape
+
+
+def compute_sentinel2(bands, indices, chunk_rows=DEFAULT_CHUNK_ROWS,
+                      out_dir=None, mask_clouds=True):
+    """
+    Índices Sentinel-2 de una escena completa, por bloques de chunk_rows filas
+    bands: dict nombre -> array 2-D de DN (memmap, GeoTiffBand o ndarray)
+    Retorna dict índice -> array float32 (NaN = nube o sin dato)
+    """
+    unknown = [index for index in indices if index not in INDEX_BANDS]
+    if unknown:
+        raise ValueError(f"Índices no soportados: {unknown}")
+    needed = {band for index in indices for band in INDEX_BANDS[index]}
+    if mask_clouds:
+        needed.add('QA60')
+    missing = sorted(needed - set(bands))
+    if missing:
+        raise ValueError(f"Faltan bandas: {missing}")
+
+    bands = {name: bands[name] for name in needed}
+    shape = _common_shape(bands)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    outputs = _allocate(shape, indices, out_dir)
+
+    for start in range(0, shape[0], chunk_rows):
+        stop = min(start + chunk_rows, shape[0])
+        chunk = {name: band[start:stop] for name, band in bands.items()}
+        for index, values in sentinel2_chunk_indices(chunk, indices, mask_clouds).items():
+            outputs[index][start:stop] = values
+
+    for values in outputs.values():
+        if isinstance(values, np.memmap):
+            values.flush()
+    return outputs
+
+
+def compute_landsat8_lst(st_b10, chunk_rows=DEFAULT_CHUNK_ROWS, out_dir=None, nodata=0):
+    """
+    LST (°C) de una escena Landsat-8 por bloques de filas
+    Los píxeles con valor nodata quedan en NaN
+    """
+    shape = _common_shape({'ST_B10': st_b10})
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    output = _allocate(shape, ['LST'], out_dir)['LST']
+
+    for start in range(0, shape[0], chunk_rows):
+        stop = min(start + chunk_rows, shape[0])
+        raw = np.asarray(st_b10[start:stop])
+        values = lst_celsius(raw)
+        if nodata is not None:
+            values[raw == nodata] = np.nan
+        output[start:stop] = values
+
+    if isinstance(output, np.memmap):
+        output.flush()
+    return {'LST': output}
+
+
+def summarize(outputs, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Media de cada índice ignorando NaN (equivalente a reduceRegion mean),
+    acumulada por bloques para no cargar la escena completa
+    """
+    summary = {}
+    for name, values in outputs.items():
+        total = 0.0
+        count = 0
+        for start in range(0, values.shape[0], chunk_rows):
+            chunk = np.asarray(values[start:start + chunk_rows], dtype=np.float64)
+            valid = ~np.isnan(chunk)
+            total += float(chunk[valid].sum())
+            count += int(valid.sum())
+        summary[name] = {
+            "mean": total / count if count else None,
+            "valid_pixels": count,
+        }
+    return summary
+
+
+def _parse_band_args(values):
+    bands = {}
+    for value in values:
+        name, _, path = value.partition('=')
+        if not name or not path:
+            raise ValueError(f"Banda inválida '{value}', se espera NOMBRE=ruta")
+        bands[name] = load_band(path)
+    return bands
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calcular índices espectrales sobre bandas locales (.npy o GeoTIFF)"
+    )
+    parser.add_argument('satellite', choices=['sentinel2', 'landsat8'])
+    parser.add_argument('--band', action='append', default=[],
+                        help="NOMBRE=ruta (p. ej. B8=b8.npy); repetir por banda")
+    parser.add_argument('--indices', default='NDVI,EVI,NDWI',
+                        help="Índices Sentinel-2 separados por coma")
+    parser.add_argument('--out-dir', default=None,
+                        help="Directorio de salida (<índice>.npy float32)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--no-cloud-mask', action='store_true',
+                        help="No aplicar la máscara QA60")
+    args = parser.parse_args()
+
+    try:
+        bands = _parse_band_args(args.band)
+        if args.satellite == 'sentinel2':
+            indices = [index.strip().upper() for index in args.indices.split(',') if index.strip()]
+            outputs = compute_sentinel2(
+                bands, indices, args.chunk_rows, args.out_dir,
+                mask_clouds=not args.no_cloud_mask
+            )
+        else:
+            if 'ST_B10' not in bands:
+                raise ValueError("Falta la banda ST_B10")
+            outputs = compute_landsat8_lst(bands['ST_B10'], args.chunk_rows, args.out_dir)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    json.dump(summarize(outputs, args.chunk_rows), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+CACHÉ PERSISTENTE DE RESULTADOS SATELITALES - AGROVERSE
+Caché direccionada por contenido en SQLite para los resultados de
+/process/sentinel2 y /process/landsat8. La clave es el hash de la ubicación
+redondeada, buffer_km, rango de fechas, índices y colección.
+
+- Rangos cerrados (end_date anterior a hoy menos el retraso de ingesta de
+  Earth Engine) no expiran nunca: las escenas históricas no cambian.
+- Rangos abiertos expiran tras un TTL, porque pueden llegar escenas nuevas.
+- El tamaño total está acotado; se desalojan las entradas usadas hace más
+  tiempo (LRU por último acceso).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(collection_id, latitude, longitude, buffer_km, start_date, end_date,
+              indices=None, coord_decimals=4, extra=None):
+    """Clave direccionada por contenido (sha256 de los parámetros canónicos)"""
+    payload = {
+        "collection": collection_id,
+        "latitude": round(float(latitude), coord_decimals),
+        "longitude": round(float(longitude), coord_decimals),
+        "buffer_km": float(buffer_km),
+        "start_date": str(start_date),
+        "end_date": str(end_date),
+        "indices": sorted(indices or []),
+        "extra": extra or {},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def is_closed_range(end_date, today=None, ingestion_lag_days=3):
+    """
+    True si el rango de fechas (end_date exclusivo) terminó antes de hoy menos
+    ingestion_lag_days: Earth Engine sigue ingiriendo escenas de los últimos
+    días, así que un rango que termina ayer todavía puede cambiar
+    """
+    today = today or date.today()
+    try:
+        end = date.fromisoformat(str(end_date)[:10])
+    except ValueError:
+        return False
+    return end <= today - timedelta(days=ingestion_lag_days)
+
+
+class ResultCache:
+    """Caché SQLite con tamaño máximo en bytes y contadores de hit rate"""
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, ttl_s=6 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "writes": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, "
+            "value BLOB NOT NULL, "
+            "size_bytes INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_access REAL NOT NULL, "
+            "expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Resultado cacheado o None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                self._stats["expired"] += 1
+                row = None
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self._stats["hits"] += 1
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value, permanent=False):
+        """Guardar un resultado; permanent=True para rangos históricos cerrados"""
+        blob = zlib.compress(json.dumps(value).encode('utf-8'))
+        now = time.time()
+        expires_at = None if permanent else now + self.ttl_s
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(key, value, size_bytes, created_at, last_access, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now, expires_at)
+            )
+            self._stats["writes"] += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Desalojar por LRU hasta quedar bajo el 90% de max_bytes"""
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM results"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute(
+            "SELECT key, size_bytes FROM results ORDER BY last_access ASC"
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self._stats["evictions"] += len(evicted)
+
+    def stats(self):
+        """Contadores y ocupación para /health"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results"
+            ).fetchone()
+            stats = dict(self._stats)
+
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "entries": entries,
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            "ttl_s": self.ttl_s,
+        })
+        return stats
@@ -5,14 +5,23 @@ Cálculo de índices espectrales: NDVI, EVI, NDWI, LST
 Optimizado para Cloud Run
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import ee
 import logging
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
 import json
 
+from columnar import encode as encode_columnar, negotiate_format
+from ee_backend import create_backend
+from result_cache import ResultCache, cache_key, is_closed_range
+from timeseries_store import TimeSeriesStore, series_key
+from jobs import FAILED, SUCCEEDED, JobManager, JobStore, QueueFullError
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,27 +29,99 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-# Inicializar Google Earth Engine
-try:
+# Backend de Earth Engine: "earthengine" (real, se inicializa al primer uso)
+# o "fake" (local y determinista, con latencia inyectada, para benchmarks)
+EE_BACKEND = os.getenv('EE_BACKEND', 'earthengine')
+
+ee = create_backend(
+    EE_BACKEND,
     # En producción, usar service account
-    service_account = os.getenv('GEE_SERVICE_ACCOUNT', '')
-    key_file = os.getenv('GEE_KEY_FILE', '/secrets/gee-key.json')
-    
-    if service_account and os.path.exists(key_file):
-        credentials = ee.ServiceAccountCredentials(service_account, key_file)
-        ee.Initialize(credentials)
-        logger.info("✅ Earth Engine inicializado con Service Account")
-    else:
-        # Desarrollo local
-        ee.Initialize()
-        logger.info("✅ Earth Engine inicializado (modo local)")
-except Exception as e:
-    logger.error(f"❌ Error inicializando Earth Engine: {e}")
+    service_account=os.getenv('GEE_SERVICE_ACCOUNT', ''),
+    key_file=os.getenv('GEE_KEY_FILE', '/secrets/gee-key.json'),
+    latency_ms=float(os.getenv('FAKE_EE_LATENCY_MS', 0)),
+    latency_per_feature_ms=float(os.getenv('FAKE_EE_LATENCY_PER_FEATURE_MS', 0)),
+    seed=int(os.getenv('FAKE_EE_SEED', 0))
+)
 
 # Configuración GCP
 GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID', '')
 GCP_REGION = os.getenv('GCP_REGION', 'us-central1')
 
+# Análisis completo: Sentinel-2 y Landsat-8 en paralelo, con timeout por fuente
+FULL_ANALYSIS_WORKERS = int(os.getenv('FULL_ANALYSIS_WORKERS', 8))
+FULL_ANALYSIS_TIMEOUTS_S = {
+    'sentinel2': float(os.getenv('SENTINEL2_TIMEOUT_S', 120)),
+    'landsat8': float(os.getenv('LANDSAT8_TIMEOUT_S', 120)),
+}
+
+# Modo de consulta a Earth Engine: single (composite + serie temporal en un
+# solo getInfo) o split (un getInfo por resultado)
+EE_ROUNDTRIP_MODE = os.getenv('EE_ROUNDTRIP_MODE', 'single')
+
+# Colecciones de Earth Engine
+SENTINEL2_COLLECTION = 'COPERNICUS/S2_SR'
+LANDSAT8_COLLECTION = 'LANDSAT/LC08/C02/T1_L2'
+
+# Caché persistente de resultados (SQLite)
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', './cache/results.db')
+RESULT_CACHE_MAX_MB = float(os.getenv('RESULT_CACHE_MAX_MB', 512))
+RESULT_CACHE_TTL_S = float(os.getenv('RESULT_CACHE_TTL_S', 6 * 3600))
+RESULT_CACHE_COORD_DECIMALS = int(os.getenv('RESULT_CACHE_COORD_DECIMALS', 4))
+
+result_cache = None
+if RESULT_CACHE_ENABLED:
+    try:
+        result_cache = ResultCache(
+            RESULT_CACHE_PATH,
+            max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+            ttl_s=RESULT_CACHE_TTL_S
+        )
+        logger.info(f"✅ Caché de resultados en {RESULT_CACHE_PATH}")
+    except Exception as e:
+        logger.error(f"❌ Error abriendo caché de resultados: {e}")
+
+# Series temporales incrementales: observaciones por escena en SQLite; solo
+# se consultan a Earth Engine las fechas que aún pueden recibir escenas
+INCREMENTAL_TIMESERIES = os.getenv('INCREMENTAL_TIMESERIES', 'false').lower() == 'true'
+TIMESERIES_STORE_PATH = os.getenv('TIMESERIES_STORE_PATH', './cache/timeseries.db')
+# Días que tarda Earth Engine en publicar una escena: fechas más recientes se
+# vuelven a consultar en la siguiente actualización
+INCREMENTAL_INGESTION_LAG_DAYS = int(os.getenv('INCREMENTAL_INGESTION_LAG_DAYS', 3))
+
+# Escala de reducción adaptativa: con buffers grandes la escala nativa
+# (10 m / 30 m) genera millones de píxeles por reduceRegion. En modo
+# adaptativo la escala se elige para no superar REDUCTION_PIXEL_BUDGET
+# píxeles en la región (múltiplo de la escala nativa). Desactivado por
+# defecto: cambia los valores respecto de la escala nativa, así que cada
+# cliente lo activa con "adaptive_scale" (o el despliegue con ADAPTIVE_SCALE)
+ADAPTIVE_SCALE = os.getenv('ADAPTIVE_SCALE', 'false').lower() == 'true'
+REDUCTION_PIXEL_BUDGET = float(os.getenv('REDUCTION_PIXEL_BUDGET', 1e6))
+REDUCTION_TILE_SCALE = int(os.getenv('REDUCTION_TILE_SCALE', 1))
+
+# Health checks: la conectividad con Earth Engine se verifica en segundo
+# plano cada EE_HEALTH_INTERVAL_S y los probes sirven el último resultado
+EE_HEALTH_INTERVAL_S = float(os.getenv('EE_HEALTH_INTERVAL_S', 60))
+# /health/ready falla si el último chequeo exitoso es más viejo que esto
+EE_HEALTH_MAX_AGE_S = float(os.getenv('EE_HEALTH_MAX_AGE_S', 3 * EE_HEALTH_INTERVAL_S))
+
+# Extracción por lotes de parcelas (reduceRegions sobre una FeatureCollection)
+BATCH_MAX_PARCELS = int(os.getenv('BATCH_MAX_PARCELS', 1000))
+
+timeseries_store = None
+try:
+    timeseries_store = TimeSeriesStore(
+        TIMESERIES_STORE_PATH,
+        ingestion_lag_days=INCREMENTAL_INGESTION_LAG_DAYS
+    )
+except Exception as e:
+    logger.error(f"❌ Error abriendo almacén de series temporales: {e}")
+
+analysis_executor = ThreadPoolExecutor(
+    max_workers=FULL_ANALYSIS_WORKERS,
+    thread_name_prefix="full-analysis"
+)
+
 
 def calculate_ndvi(image):
     """Calcular NDVI (Normalized Difference Vegetation Index)"""
@@ -91,20 +172,252 @@ def mask_clouds_sentinel2(image):
     return image.updateMask(mask).divide(10000)
 
 
+def calculate_lst(image):
+    """Calcular Land Surface Temperature"""
+    # Banda térmica B10
+    thermal = image.select('ST_B10').multiply(0.00341802).add(149.0).subtract(273.15)
+    return image.addBands(thermal.rename('LST'))
+
+
+def sentinel2_collection(region, start_date, end_date, indices):
+    """Colección Sentinel-2 filtrada, con máscara de nubes e índices calculados"""
+    collection = ee.ImageCollection(SENTINEL2_COLLECTION) \
+        .filterBounds(region) \
+        .filterDate(start_date, end_date) \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
+        .map(mask_clouds_sentinel2)
+    
+    if 'NDVI' in indices:
+        collection = collection.map(calculate_ndvi)
+    if 'EVI' in indices:
+        collection = collection.map(calculate_evi)
+    if 'NDWI' in indices:
+        collection = collection.map(calculate_ndwi)
+    if 'SAVI' in indices:
+        collection = collection.map(calculate_savi)
+    return collection
+
+
+def landsat8_collection(region, start_date, end_date):
+    """Colección Landsat-8 filtrada con la banda LST calculada"""
+    return ee.ImageCollection(LANDSAT8_COLLECTION) \
+        .filterBounds(region) \
+        .filterDate(start_date, end_date) \
+        .filter(ee.Filter.lt('CLOUD_COVER', 20)) \
+        .map(calculate_lst)
+
+
+def reduction_settings(buffer_km, native_scale, adaptive=False,
+                       pixel_budget=REDUCTION_PIXEL_BUDGET):
+    """
+    Parámetros de reduceRegion para un buffer circular
+    En modo adaptativo la escala sube (en múltiplos de la escala nativa) hasta
+    que la región tenga como máximo pixel_budget píxeles, y bestEffort queda
+    como red de seguridad; sin él se usa la escala nativa con maxPixels=1e9
+    """
+    if not adaptive:
+        return {"scale": native_scale, "maxPixels": 1e9}
+    
+    area_m2 = math.pi * (float(buffer_km) * 1000) ** 2
+    factor = max(1, math.ceil(math.sqrt(area_m2 / pixel_budget) / native_scale))
+    return {
+        "scale": native_scale * factor,
+        "maxPixels": pixel_budget * 4,
+        "bestEffort": True,
+        "tileScale": REDUCTION_TILE_SCALE
+    }
+
+
+def reduction_metadata(reduction, native_scale):
+    """Escala usada en la reducción para metadata de la respuesta"""
+    return {
+        "scale_m": reduction["scale"],
+        "native_scale_m": native_scale,
+        "adaptive": "bestEffort" in reduction
+    }
+
+
+def time_series_features(collection, region, reduction, bands=None, with_time_start=False):
+    """
+    Serie temporal: un ee.Feature por escena con la media en la región
+    reduction: parámetros de reduceRegion (reduction_settings)
+    with_time_start agrega system:time_start (clave del almacén incremental)
+    """
+    def extract_values(image):
+        date = ee.Date(image.get('system:time_start')).format('YYYY-MM-dd')
+        source = image.select(bands) if bands else image
+        vals = source.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=region,
+            **reduction
+        ).set('date', date)
+        if with_time_start:
+            vals = vals.set('time_start', image.get('system:time_start'))
+        return ee.Feature(None, vals)
+    
+    return collection.map(extract_values)
+
+
+def plan_incremental_series(collection_id, params, indices, build_collection,
+                            region, reduction, bands=None):
+    """
+    Consultas de Earth Engine que faltan para completar la serie guardada
+    build_collection(inicio, fin) arma la colección de un rango de fechas.
+    Retorna (objetos a traer, finish); finish(fetched) guarda las escenas
+    nuevas y retorna (serie temporal fusionada, metadatos incrementales)
+    """
+    key = series_key(
+        collection_id, params['latitude'], params['longitude'],
+        params['buffer_km'], indices, extra={"scale": reduction["scale"]}
+    )
+    start_date = str(params['start_date'])[:10]
+    end_date = str(params['end_date'])[:10]
+    ranges = timeseries_store.plan(key, start_date, end_date)
+    
+    objects = {}
+    for i, (range_start, range_end) in enumerate(ranges):
+        objects[f'time_series_{i}'] = time_series_features(
+            build_collection(range_start, range_end), region, reduction, bands, with_time_start=True
+        )
+    
+    def finish(fetched):
+        observations = []
+        for name in objects:
+            for feature in fetched[name]['features']:
+                properties = dict(feature['properties'])
+                observations.append((properties.pop('time_start'), properties))
+        
+        coverage_start = min([start_date] + [r[0] for r in ranges])
+        new_scenes = timeseries_store.save(key, observations, coverage_start, end_date)
+        series = timeseries_store.observations(key, start_date, end_date)
+        
+        return series, {
+            "new_scenes": new_scenes,
+            "stored_scenes": max(len(series) - new_scenes, 0),
+            "queried_ranges": [[r[0], r[1]] for r in ranges]
+        }
+    
+    return objects, finish
+
+
+SERVICE_STARTED_AT = time.time()
+
+# Último chequeo de Earth Engine (lo escribe el hilo de fondo)
+ee_health_lock = threading.Lock()
+ee_health = {
+    "connected": None,
+    "error": None,
+    "checked_at": None,
+    "latency_ms": None,
+    "last_success_at": None
+}
+
+
+def check_earth_engine():
+    """Un round trip mínimo a Earth Engine; actualiza ee_health"""
+    started = time.perf_counter()
+    try:
+        ee.Number(1).getInfo()
+        connected, error = True, None
+    except Exception as e:
+        connected, error = False, str(e)
+    
+    now = time.time()
+    with ee_health_lock:
+        ee_health.update({
+            "connected": connected,
+            "error": error,
+            "checked_at": now,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+        if connected:
+            ee_health["last_success_at"] = now
+    if not connected:
+        logger.warning(f"Earth Engine no disponible: {error}")
+
+
+def earth_engine_health_loop():
+    """
+    Inicializar Earth Engine fuera del import y chequearlo cada
+    EE_HEALTH_INTERVAL_S
+    """
+    try:
+        ee.initialize()
+    except Exception as e:
+        logger.error(f"❌ Error inicializando Earth Engine: {e}")
+    
+    while True:
+        check_earth_engine()
+        time.sleep(EE_HEALTH_INTERVAL_S)
+
+
+def earth_engine_status():
+    """Resultado cacheado del último chequeo, con su antigüedad"""
+    with ee_health_lock:
+        status = dict(ee_health)
+    now = time.time()
+    checked_at = status.pop("checked_at")
+    last_success_at = status.pop("last_success_at")
+    status["last_check_age_s"] = round(now - checked_at, 1) if checked_at else None
+    status["last_success_age_s"] = round(now - last_success_at, 1) if last_success_at else None
+    status["interval_s"] = EE_HEALTH_INTERVAL_S
+    return status
+
+
+threading.Thread(
+    target=earth_engine_health_loop, name="ee-health", daemon=True
+).start()
+
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness: el proceso responde; no consulta Earth Engine"""
+    return jsonify({
+        "status": "alive",
+        "service": "image-processing",
+        "uptime_s": round(time.time() - SERVICE_STARTED_AT, 1),
+        "earth_engine": earth_engine_status(),
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """
+    Readiness: último chequeo de Earth Engine hecho en segundo plano
+    503 si nunca conectó o el último éxito es más viejo que EE_HEALTH_MAX_AGE_S
+    """
+    status = earth_engine_status()
+    ready = (
+        status["last_success_age_s"] is not None
+        and status["last_success_age_s"] <= EE_HEALTH_MAX_AGE_S
+    )
+    
+    return jsonify({
+        "status": "ready" if ready else "not_ready",
+        "service": "image-processing",
+        "earth_engine": status,
+        "timestamp": datetime.utcnow().isoformat()
+    }), 200 if ready else 503
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check"""
+    """Health check con estadísticas (Earth Engine desde el chequeo cacheado)"""
     try:
-        # Verificar conexión a Earth Engine
-        test_image = ee.Image('COPERNICUS/S2_SR/20200101T000000_20200101T000000_T01AAA')
-        test_image.getInfo()
+        status = earth_engine_status()
+        healthy = status["connected"] is True
         
         return jsonify({
-            "status": "healthy",
+            "status": "healthy" if healthy else "unhealthy",
             "service": "image-processing",
-            "earth_engine": "connected",
+            "earth_engine": status,
+            "earth_engine_backend": ee.stats(),
+            "result_cache": result_cache.stats() if result_cache is not None else None,
+            "timeseries_store": timeseries_store.stats() if timeseries_store is not None else None,
+            "jobs": job_manager.stats() if job_manager is not None else None,
             "timestamp": datetime.utcnow().isoformat()
-        })
+        }), 200 if healthy else 500
     except Exception as e:
         return jsonify({
             "status": "unhealthy",
@@ -113,6 +426,310 @@ def health():
         }), 500
 
 
+def fetch_info(objects, mode):
+    """
+    Traer varios objetos de Earth Engine al cliente
+    mode 'single': un solo ee.Dictionary -> una sola llamada getInfo
+    mode 'split': un getInfo por objeto
+    Retorna (dict con los resultados, número de round trips)
+    """
+    if mode == 'single':
+        return ee.Dictionary(objects).getInfo(), 1
+    return {name: obj.getInfo() for name, obj in objects.items()}, len(objects)
+
+
+def cached_result(collection_id, params, indices, compute, extra=None):
+    """
+    Resultado desde la caché persistente, o calcularlo y guardarlo
+    Los rangos de fechas cerrados se guardan sin expiración
+    extra: otros parámetros que cambian el resultado (p. ej. la escala)
+    """
+    if result_cache is None:
+        return compute()
+    
+    key = cache_key(
+        collection_id,
+        params['latitude'],
+        params['longitude'],
+        params['buffer_km'],
+        params['start_date'],
+        params['end_date'],
+        indices=indices,
+        coord_decimals=RESULT_CACHE_COORD_DECIMALS,
+        extra=extra
+    )
+    
+    cached = result_cache.get(key)
+    if cached is not None:
+        # La clave redondea lat/lon: se responde con la ubicación pedida, y
+        # el timestamp original pasa a cached_at (no hubo llamadas a Earth Engine)
+        metadata = cached['metadata']
+        metadata['cache'] = 'hit'
+        metadata['cached_at'] = metadata.get('timestamp')
+        metadata['timestamp'] = datetime.utcnow().isoformat()
+        metadata['earth_engine_roundtrips'] = 0
+        cached['location'].update(latitude=params['latitude'], longitude=params['longitude'])
+        return cached
+    
+    result = compute()
+    try:
+        result_cache.set(key, result, permanent=is_closed_range(
+            params['end_date'], ingestion_lag_days=INCREMENTAL_INGESTION_LAG_DAYS
+        ))
+    except Exception as e:
+        logger.warning(f"No se pudo guardar en caché: {e}")
+    result['metadata']['cache'] = 'miss'
+    return result
+
+
+def parse_location_params(data):
+    """
+    Extraer y validar los parámetros comunes de ubicación y fechas
+    Lanza ValueError si falta alguno requerido
+    """
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    
+    if not all([latitude, longitude, start_date, end_date]):
+        raise ValueError("Faltan parámetros requeridos")
+    
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "buffer_km": data.get('buffer_km', 1),
+        "start_date": start_date,
+        "end_date": end_date
+    }
+
+
+def run_sentinel2(data):
+    """
+    Pipeline Sentinel-2: índices espectrales (composite mediana + serie temporal)
+    Retorna el diccionario de resultados; ValueError si faltan parámetros
+    """
+    params = parse_location_params(data)
+    indices = data.get('indices', ['NDVI', 'EVI', 'NDWI'])
+    reduction = reduction_settings(
+        params['buffer_km'], 10, data.get('adaptive_scale', ADAPTIVE_SCALE)
+    )
+    
+    return cached_result(
+        SENTINEL2_COLLECTION, params, indices,
+        lambda: compute_sentinel2(
+            params, indices,
+            data.get('roundtrip_mode', EE_ROUNDTRIP_MODE),
+            data.get('incremental', INCREMENTAL_TIMESERIES),
+            reduction
+        ),
+        extra={"reduction": reduction}
+    )
+
+
+def fetch_results(values, series_objects, roundtrip_mode, finish_series=None):
+    """
+    Traer composite y serie temporal (completa o solo los rangos faltantes)
+    Retorna (valores del composite, serie temporal, metadatos incrementales,
+    número de round trips)
+    """
+    fetched, roundtrips = fetch_info(
+        {'composite': values, **series_objects}, roundtrip_mode
+    )
+    
+    if finish_series is not None:
+        time_series, incremental = finish_series(fetched)
+    else:
+        time_series = [f['properties'] for f in fetched['time_series']['features']]
+        incremental = None
+    return fetched['composite'], time_series, incremental, roundtrips
+
+
+def compute_sentinel2(params, indices, roundtrip_mode, incremental=False, reduction=None):
+    """
+    Consultar Earth Engine para el pipeline Sentinel-2
+    reduction: parámetros de reduceRegion (por defecto escala nativa de 10 m)
+    """
+    latitude = params['latitude']
+    longitude = params['longitude']
+    buffer_km = params['buffer_km']
+    start_date = params['start_date']
+    end_date = params['end_date']
+    
+    # Crear punto de interés
+    point = ee.Geometry.Point([longitude, latitude])
+    region = point.buffer(buffer_km * 1000)
+    
+    # Cargar colección Sentinel-2 con índices
+    collection = sentinel2_collection(region, start_date, end_date, indices)
+    
+    # Obtener imagen compuesta (mediana)
+    composite = collection.median()
+    
+    # Extraer valores en el punto
+    reduction = reduction or reduction_settings(buffer_km, 10, adaptive=False)
+    values = composite.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=region,
+        **reduction
+    )
+    
+    # Serie temporal: completa, o solo las escenas que faltan en el almacén
+    finish_series = None
+    if incremental and timeseries_store is not None:
+        series_objects, finish_series = plan_incremental_series(
+            SENTINEL2_COLLECTION, params, indices,
+            lambda s, e: sentinel2_collection(region, s, e, indices),
+            region, reduction
+        )
+    else:
+        series_objects = {'time_series': time_series_features(collection, region, reduction)}
+    
+    # Composite y serie temporal en un solo round trip (modo single)
+    values, time_series, incremental_info, roundtrips = fetch_results(
+        values, series_objects, roundtrip_mode, finish_series
+    )
+    
+    # Organizar resultados
+    metadata = {
+        "satellite": "Sentinel-2",
+        "resolution": "10m",
+        "cloud_threshold": "20%",
+        "reduction": reduction_metadata(reduction, 10),
+        "earth_engine_roundtrips": roundtrips,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    if incremental_info is not None:
+        metadata["incremental"] = incremental_info
+    
+    return {
+        "location": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "buffer_km": buffer_km
+        },
+        "date_range": {
+            "start": start_date,
+            "end": end_date
+        },
+        "composite_values": values,
+        "time_series": time_series,
+        "metadata": metadata
+    }
+
+
+def run_landsat8(data):
+    """
+    Pipeline Landsat-8: temperatura superficial (LST)
+    Retorna el diccionario de resultados; ValueError si faltan parámetros
+    """
+    params = parse_location_params(data)
+    reduction = reduction_settings(
+        params['buffer_km'], 30, data.get('adaptive_scale', ADAPTIVE_SCALE)
+    )
+    
+    return cached_result(
+        LANDSAT8_COLLECTION, params, ['LST'],
+        lambda: compute_landsat8(
+            params,
+            data.get('roundtrip_mode', EE_ROUNDTRIP_MODE),
+            data.get('incremental', INCREMENTAL_TIMESERIES),
+            reduction
+        ),
+        extra={"reduction": reduction}
+    )
+
+
+def compute_landsat8(params, roundtrip_mode, incremental=False, reduction=None):
+    """
+    Consultar Earth Engine para el pipeline Landsat-8
+    reduction: parámetros de reduceRegion (por defecto escala nativa de 30 m)
+    """
+    latitude = params['latitude']
+    longitude = params['longitude']
+    buffer_km = params['buffer_km']
+    start_date = params['start_date']
+    end_date = params['end_date']
+    
+    # Crear punto de interés
+    point = ee.Geometry.Point([longitude, latitude])
+    region = point.buffer(buffer_km * 1000)
+    
+    # Cargar colección Landsat-8 con LST
+    collection = landsat8_collection(region, start_date, end_date)
+    
+    # Imagen compuesta
+    composite = collection.median()
+    
+    # Extraer valores
+    reduction = reduction or reduction_settings(buffer_km, 30, adaptive=False)
+    values = composite.select('LST').reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=region,
+        **reduction
+    )
+    
+    # Serie temporal: completa, o solo las escenas que faltan en el almacén
+    finish_series = None
+    if incremental and timeseries_store is not None:
+        series_objects, finish_series = plan_incremental_series(
+            LANDSAT8_COLLECTION, params, ['LST'],
+            lambda s, e: landsat8_collection(region, s, e),
+            region, reduction, bands=['LST']
+        )
+    else:
+        series_objects = {
+            'time_series': time_series_features(collection, region, reduction, bands=['LST'])
+        }
+    
+    # Composite y serie temporal en un solo round trip (modo single)
+    values, time_series, incremental_info, roundtrips = fetch_results(
+        values, series_objects, roundtrip_mode, finish_series
+    )
+    
+    metadata = {
+        "satellite": "Landsat-8",
+        "resolution": "30m (thermal)",
+        "cloud_threshold": "20%",
+        "reduction": reduction_metadata(reduction, 30),
+        "earth_engine_roundtrips": roundtrips,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    if incremental_info is not None:
+        metadata["incremental"] = incremental_info
+    
+    return {
+        "location": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "buffer_km": buffer_km
+        },
+        "date_range": {
+            "start": start_date,
+            "end": end_date
+        },
+        "lst_celsius": values.get('LST'),
+        "time_series": time_series,
+        "metadata": metadata
+    }
+
+
+def series_response(result, output_format):
+    """Resultado como JSON o en el formato columnar negociado"""
+    if output_format == 'json':
+        response = jsonify({
+            "success": True,
+            "data": result
+        })
+    else:
+        payload, media_type = encode_columnar(result, output_format)
+        response = Response(payload, mimetype=media_type, headers={
+            "X-Time-Series-Length": str(len(result.get('time_series', [])))
+        })
+    response.headers['Vary'] = 'Accept'
+    return response
+
+
 @app.route('/process/sentinel2', methods=['POST'])
 def process_sentinel2():
     """
@@ -125,90 +742,239 @@ def process_sentinel2():
         "buffer_km": 1,
         "start_date": "2024-01-01",
         "end_date": "2024-12-31",
-        "indices": ["NDVI", "EVI", "NDWI", "SAVI"]
+        "indices": ["NDVI", "EVI", "NDWI", "SAVI"],
+        "roundtrip_mode": "single",
+        "incremental": true
     }
+    
+    "roundtrip_mode" es opcional: "single" (default, EE_ROUNDTRIP_MODE) trae
+    composite y serie temporal en una sola llamada getInfo; "split" usa dos.
+    "incremental" es opcional (default INCREMENTAL_TIMESERIES): la serie
+    temporal se completa desde el almacén y solo se consultan escenas nuevas.
+    "adaptive_scale" es opcional (default ADAPTIVE_SCALE): la escala de
+    reducción se ajusta al área del buffer; metadata.reduction indica la usada.
+    
+    Con Accept application/x-npz, application/x-msgpack o
+    application/vnd.apache.arrow.stream (o ?format=npz|msgpack|arrow) la
+    serie temporal se retorna en columnas: "date" int32 (días desde
+    1970-01-01) y un float32 por índice; el resto va como metadata JSON.
     """
     try:
-        data = request.get_json()
+        try:
+            output_format = negotiate_format(request.accept_mimetypes, request.args.get('format'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 406
         
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
-        buffer_km = data.get('buffer_km', 1)
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-        indices = data.get('indices', ['NDVI', 'EVI', 'NDWI'])
+        data = request.get_json()
         
-        if not all([latitude, longitude, start_date, end_date]):
+        try:
+            result = run_sentinel2(data)
+        except ValueError as e:
             return jsonify({
                 "success": False,
-                "error": "Faltan parámetros requeridos"
+                "error": str(e)
             }), 400
         
-        # Crear punto de interés
-        point = ee.Geometry.Point([longitude, latitude])
-        region = point.buffer(buffer_km * 1000)
+        return series_response(result, output_format)
         
-        # Cargar colección Sentinel-2
-        collection = ee.ImageCollection('COPERNICUS/S2_SR') \
-            .filterBounds(region) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
-            .map(mask_clouds_sentinel2)
-        
-        # Calcular índices
-        if 'NDVI' in indices:
-            collection = collection.map(calculate_ndvi)
-        if 'EVI' in indices:
-            collection = collection.map(calculate_evi)
-        if 'NDWI' in indices:
-            collection = collection.map(calculate_ndwi)
-        if 'SAVI' in indices:
-            collection = collection.map(calculate_savi)
-        
-        # Obtener imagen compuesta (mediana)
-        composite = collection.median()
+    except Exception as e:
+        logger.error(f"Error procesando Sentinel-2: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+def parse_parcels(data):
+    """
+    Validar la lista de parcelas de un lote
+    Cada parcela tiene "id" y una geometría: "geometry" (GeoJSON Point o
+    Polygon) o "latitude"/"longitude" con "buffer_km" opcional
+    Lanza ValueError si la lista o alguna parcela es inválida
+    """
+    parcels = data.get('parcels')
+    if not isinstance(parcels, list) or not parcels:
+        raise ValueError("'parcels' debe ser una lista no vacía")
+    if len(parcels) > BATCH_MAX_PARCELS:
+        raise ValueError(f"Máximo {BATCH_MAX_PARCELS} parcelas por lote")
+    
+    default_buffer_km = data.get('buffer_km', 1)
+    parsed = []
+    for index, parcel in enumerate(parcels):
+        if not isinstance(parcel, dict):
+            raise ValueError(f"Parcela {index}: se esperaba un objeto")
+        parcel_id = parcel.get('id', index)
         
-        # Extraer valores en el punto
-        values = composite.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=region,
-            scale=10,
-            maxPixels=1e9
-        ).getInfo()
+        if parcel.get('geometry') is not None:
+            geometry = parcel['geometry']
+            if not isinstance(geometry, dict) or geometry.get('type') not in ('Point', 'Polygon', 'MultiPolygon'):
+                raise ValueError(f"Parcela {parcel_id}: geometría GeoJSON inválida")
+            buffer_km = parcel.get('buffer_km', default_buffer_km if geometry['type'] == 'Point' else 0)
+        elif parcel.get('latitude') is not None and parcel.get('longitude') is not None:
+            geometry = {'type': 'Point', 'coordinates': [parcel['longitude'], parcel['latitude']]}
+            buffer_km = parcel.get('buffer_km', default_buffer_km)
+        else:
+            raise ValueError(f"Parcela {parcel_id}: falta 'geometry' o 'latitude'/'longitude'")
         
-        # Obtener serie temporal
-        def extract_values(image):
+        parsed.append({"id": parcel_id, "geometry": geometry, "buffer_km": buffer_km})
+    return parsed
+
+
+def _coordinate_pairs(coordinates):
+    """Pares [lon, lat] de coordenadas GeoJSON anidadas"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+        return
+    for item in coordinates or []:
+        yield from _coordinate_pairs(item)
+
+
+def parcel_radius_km(parcel):
+    """
+    Radio equivalente (km) de una parcela para elegir la escala de reducción:
+    buffer_km para puntos; para polígonos el círculo de igual área que su
+    bbox, más el buffer
+    """
+    buffer_km = float(parcel['buffer_km'] or 0)
+    pairs = list(_coordinate_pairs(parcel['geometry'].get('coordinates')))
+    if len(pairs) < 2:
+        return buffer_km
+    lons = [float(pair[0]) for pair in pairs]
+    lats = [float(pair[1]) for pair in pairs]
+    height_km = (max(lats) - min(lats)) * 111.32
+    width_km = (max(lons) - min(lons)) * 111.32 * math.cos(math.radians(sum(lats) / len(lats)))
+    return math.sqrt(width_km * height_km / math.pi) + buffer_km
+
+
+def parcels_feature_collection(parcels):
+    """Una ee.FeatureCollection con la geometría y el índice de cada parcela"""
+    features = []
+    for index, parcel in enumerate(parcels):
+        geometry = ee.Geometry(parcel['geometry'])
+        if parcel['buffer_km']:
+            geometry = geometry.buffer(parcel['buffer_km'] * 1000)
+        features.append(ee.Feature(geometry, {'parcel_index': index}))
+    return ee.FeatureCollection(features)
+
+
+def run_sentinel2_batch(data):
+    """
+    Índices Sentinel-2 para muchas parcelas en una sola computación
+    Una colección filtrada compartida por todas las parcelas; composite y
+    serie temporal por parcela con reduceRegions. ValueError si el body es
+    inválido
+    """
+    parcels = parse_parcels(data)
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    if not all([start_date, end_date]):
+        raise ValueError("Faltan parámetros requeridos")
+    indices = data.get('indices', ['NDVI', 'EVI', 'NDWI'])
+    bands = [index for index in indices if index in ('NDVI', 'EVI', 'NDWI', 'SAVI')]
+    if not bands:
+        raise ValueError("Se requiere al menos un índice: NDVI, EVI, NDWI o SAVI")
+    include_series = data.get('time_series', False)
+    
+    features = parcels_feature_collection(parcels)
+    collection = sentinel2_collection(features.geometry(), start_date, end_date, bands) \
+        .select(bands)
+    
+    # Con una sola banda ee.Reducer.mean() nombra la salida "mean"
+    reducer = ee.Reducer.mean() if len(bands) > 1 else ee.Reducer.mean().setOutputs(bands)
+    
+    # Misma escala para todo el lote, elegida por la parcela más grande.
+    # reduceRegions solo acepta scale y tileScale (no maxPixels/bestEffort)
+    reduction = reduction_settings(
+        max(parcel_radius_km(parcel) for parcel in parcels), 10,
+        data.get('adaptive_scale', ADAPTIVE_SCALE)
+    )
+    reduce_regions = {
+        key: reduction[key] for key in ('scale', 'tileScale') if key in reduction
+    }
+    
+    objects = {
+        'composite': collection.median().reduceRegions(
+            collection=features, reducer=reducer, **reduce_regions
+        )
+    }
+    
+    if include_series:
+        def reduce_scene(image):
             date = ee.Date(image.get('system:time_start')).format('YYYY-MM-dd')
-            vals = image.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=region,
-                scale=10,
-                maxPixels=1e9
-            )
-            return ee.Feature(None, vals.set('date', date))
-        
-        time_series = collection.map(extract_values).getInfo()
-        
-        # Organizar resultados
-        result = {
-            "location": {
-                "latitude": latitude,
-                "longitude": longitude,
-                "buffer_km": buffer_km
-            },
-            "date_range": {
-                "start": start_date,
-                "end": end_date
-            },
-            "composite_values": values,
-            "time_series": [f['properties'] for f in time_series['features']],
-            "metadata": {
-                "satellite": "Sentinel-2",
-                "resolution": "10m",
-                "cloud_threshold": "20%",
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            return image.reduceRegions(collection=features, reducer=reducer, **reduce_regions) \
+                .map(lambda feature: feature.set('date', date))
+        objects['time_series'] = collection.map(reduce_scene).flatten()
+    
+    fetched, roundtrips = fetch_info(objects, data.get('roundtrip_mode', EE_ROUNDTRIP_MODE))
+    
+    results = [{"id": parcel['id'], "composite_values": {}} for parcel in parcels]
+    for feature in fetched['composite']['features']:
+        properties = feature['properties']
+        results[properties.pop('parcel_index')]['composite_values'] = properties
+    if include_series:
+        for result in results:
+            result['time_series'] = []
+        for feature in fetched['time_series']['features']:
+            properties = feature['properties']
+            results[properties.pop('parcel_index')]['time_series'].append(properties)
+        for result in results:
+            result['time_series'].sort(key=lambda row: row['date'])
+    
+    return {
+        "parcels": results,
+        "date_range": {
+            "start": start_date,
+            "end": end_date
+        },
+        "metadata": {
+            "satellite": "Sentinel-2",
+            "resolution": "10m",
+            "cloud_threshold": "20%",
+            "reduction": reduction_metadata(reduction, 10),
+            "indices": bands,
+            "parcel_count": len(parcels),
+            "earth_engine_roundtrips": roundtrips,
+            "timestamp": datetime.utcnow().isoformat()
         }
+    }
+
+
+@app.route('/process/sentinel2/batch', methods=['POST'])
+def process_sentinel2_batch():
+    """
+    Índices Sentinel-2 para muchas parcelas de una misma zona en una sola
+    computación de Earth Engine (reduceRegions sobre una FeatureCollection)
+    
+    Body JSON:
+    {
+        "parcels": [
+            {"id": "p1", "latitude": -13.1631, "longitude": -74.2236, "buffer_km": 0.5},
+            {"id": "p2", "geometry": {"type": "Polygon", "coordinates": [[[...]]]}}
+        ],
+        "start_date": "2024-01-01",
+        "end_date": "2024-12-31",
+        "indices": ["NDVI", "EVI", "NDWI", "SAVI"],
+        "time_series": false
+    }
+    
+    "buffer_km" es el default para parcelas puntuales (1 km); los polígonos
+    se usan tal cual. "time_series": true agrega la serie por escena de cada
+    parcela. "adaptive_scale" (default ADAPTIVE_SCALE) elige la escala según
+    la parcela más grande; metadata.reduction indica la usada.
+    """
+    try:
+        data = request.get_json()
+        
+        try:
+            result = run_sentinel2_batch(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         
         return jsonify({
             "success": True,
@@ -216,7 +982,7 @@ def process_sentinel2():
         })
         
     except Exception as e:
-        logger.error(f"Error procesando Sentinel-2: {e}")
+        logger.error(f"Error procesando lote Sentinel-2: {e}")
         return jsonify({
             "success": False,
             "error": str(e)
@@ -234,91 +1000,32 @@ def process_landsat8():
         "longitude": -74.2236,
         "buffer_km": 1,
         "start_date": "2024-01-01",
-        "end_date": "2024-12-31"
+        "end_date": "2024-12-31",
+        "incremental": true
     }
+    
+    Acepta los mismos formatos columnares que /process/sentinel2.
     """
     try:
-        data = request.get_json()
+        try:
+            output_format = negotiate_format(request.accept_mimetypes, request.args.get('format'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 406
         
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
-        buffer_km = data.get('buffer_km', 1)
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
+        data = request.get_json()
         
-        if not all([latitude, longitude, start_date, end_date]):
+        try:
+            result = run_landsat8(data)
+        except ValueError as e:
             return jsonify({
                 "success": False,
-                "error": "Faltan parámetros requeridos"
+                "error": str(e)
             }), 400
         
-        # Crear punto de interés
-        point = ee.Geometry.Point([longitude, latitude])
-        region = point.buffer(buffer_km * 1000)
-        
-        # Cargar colección Landsat-8
-        collection = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2') \
-            .filterBounds(region) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUD_COVER', 20))
-        
-        def calculate_lst(image):
-            """Calcular Land Surface Temperature"""
-            # Banda térmica B10
-            thermal = image.select('ST_B10').multiply(0.00341802).add(149.0).subtract(273.15)
-            return image.addBands(thermal.rename('LST'))
-        
-        # Aplicar cálculo de LST
-        collection = collection.map(calculate_lst)
-        
-        # Imagen compuesta
-        composite = collection.median()
-        
-        # Extraer valores
-        values = composite.select('LST').reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=region,
-            scale=30,
-            maxPixels=1e9
-        ).getInfo()
-        
-        # Serie temporal
-        def extract_lst(image):
-            date = ee.Date(image.get('system:time_start')).format('YYYY-MM-dd')
-            lst_val = image.select('LST').reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=region,
-                scale=30,
-                maxPixels=1e9
-            )
-            return ee.Feature(None, lst_val.set('date', date))
-        
-        time_series = collection.map(extract_lst).getInfo()
-        
-        result = {
-            "location": {
-                "latitude": latitude,
-                "longitude": longitude,
-                "buffer_km": buffer_km
-            },
-            "date_range": {
-                "start": start_date,
-                "end": end_date
-            },
-            "lst_celsius": values.get('LST'),
-            "time_series": [f['properties'] for f in time_series['features']],
-            "metadata": {
-                "satellite": "Landsat-8",
-                "resolution": "30m (thermal)",
-                "cloud_threshold": "20%",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        }
-        
-        return jsonify({
-            "success": True,
-            "data": result
-        })
+        return series_response(result, output_format)
         
     except Exception as e:
         logger.error(f"Error procesando Landsat-8: {e}")
@@ -328,10 +1035,49 @@ def process_landsat8():
         }), 500
 
 
+def run_full_analysis(data, timeouts_s=None):
+    """
+    Ejecutar Sentinel-2 y Landsat-8 en paralelo
+    Cada fuente tiene su propio timeout; si una falla o se excede, el
+    análisis retorna los resultados parciales de la otra junto con el error.
+    Retorna (resultados por fuente, errores por fuente, latencia en ms)
+    """
+    timeouts_s = {**FULL_ANALYSIS_TIMEOUTS_S, **(timeouts_s or {})}
+    
+    sentinel_data = data.copy()
+    sentinel_data['indices'] = ['NDVI', 'EVI', 'NDWI', 'SAVI']
+    
+    submitted = time.perf_counter()
+    futures = {
+        'sentinel2': analysis_executor.submit(run_sentinel2, sentinel_data),
+        'landsat8': analysis_executor.submit(run_landsat8, data),
+    }
+    
+    results = {}
+    errors = {}
+    latency_ms = {}
+    for source, future in futures.items():
+        # El timeout de cada fuente cuenta desde el envío, no desde la espera
+        remaining = timeouts_s[source] - (time.perf_counter() - submitted)
+        try:
+            results[source] = future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning(f"Timeout procesando {source} en análisis completo")
+            errors[source] = f"Timeout después de {timeouts_s[source]}s"
+        except Exception as e:
+            logger.error(f"Error procesando {source} en análisis completo: {e}")
+            errors[source] = str(e)
+        latency_ms[source] = round((time.perf_counter() - submitted) * 1000, 1)
+    
+    return results, errors, latency_ms
+
+
 @app.route('/process/full-analysis', methods=['POST'])
 def full_analysis():
     """
     Análisis completo: Sentinel-2 (NDVI, EVI, NDWI) + Landsat-8 (LST)
+    Ambas fuentes se procesan en paralelo, con timeout por fuente
     
     Body JSON:
     {
@@ -339,43 +1085,237 @@ def full_analysis():
         "longitude": -74.2236,
         "buffer_km": 1,
         "start_date": "2024-01-01",
-        "end_date": "2024-12-31"
+        "end_date": "2024-12-31",
+        "timeouts_s": {"sentinel2": 60, "landsat8": 45}
     }
     """
     try:
         data = request.get_json()
         
-        # Procesar Sentinel-2
-        sentinel_data = data.copy()
-        sentinel_data['indices'] = ['NDVI', 'EVI', 'NDWI', 'SAVI']
+        try:
+            parse_location_params(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        response, status = full_analysis_response(data)
+        return jsonify(response), status
+        
+    except Exception as e:
+        logger.error(f"Error en análisis completo: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+def full_analysis_response(data):
+    """
+    Respuesta de /process/full-analysis y su código HTTP
+    502 si fallan ambas fuentes
+    """
+    results, errors, latency_ms = run_full_analysis(data, data.get('timeouts_s'))
+    
+    if not results:
+        return {
+            "success": False,
+            "errors": errors,
+            "latency_ms": latency_ms
+        }, 502
+    
+    response = {
+        "success": True,
+        "partial": bool(errors),
+        "sentinel2": results.get('sentinel2', {}),
+        "landsat8": results.get('landsat8', {}),
+        "latency_ms": latency_ms,
+        "analysis_type": "full_spectral_thermal"
+    }
+    if errors:
+        response["errors"] = errors
+    return response, 200
+
+
+def run_full_analysis_job(data):
+    """Análisis completo como trabajo asíncrono; falla si fallan ambas fuentes"""
+    parse_location_params(data)
+    response, status = full_analysis_response(data)
+    if status != 200:
+        raise RuntimeError(f"Fallaron todas las fuentes: {json.dumps(response['errors'])}")
+    return response
+
+
+# Trabajos asíncronos: estado en SQLite, pool acotado de hilos
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', './cache/jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 100))
+JOB_DEDUP_TTL_S = float(os.getenv('JOB_DEDUP_TTL_S', 6 * 3600))
+JOB_RETENTION_S = float(os.getenv('JOB_RETENTION_S', 7 * 24 * 3600))
+JOB_CALLBACK_TIMEOUT_S = float(os.getenv('JOB_CALLBACK_TIMEOUT_S', 10))
+# Lease de un trabajo en ejecución: si su worker no lo renueva en este
+# tiempo (heartbeat cada JOB_LEASE_S / 3) se considera muerto y se re-encola
+JOB_LEASE_S = float(os.getenv('JOB_LEASE_S', 60))
+# Intentos máximos de un trabajo cuyo worker muere (luego queda fallido)
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+# Hosts permitidos para callback_url (y sus subdominios); vacío = cualquier
+# host https que resuelva a direcciones públicas
+JOB_CALLBACK_ALLOWED_HOSTS = [
+    host.strip().lower() for host in os.getenv('JOB_CALLBACK_ALLOWED_HOSTS', '').split(',') if host.strip()
+]
+
+JOB_RUNNERS = {
+    'sentinel2': run_sentinel2,
+    'sentinel2-batch': run_sentinel2_batch,
+    'landsat8': run_landsat8,
+    'full-analysis': run_full_analysis_job,
+}
+
+job_manager = None
+try:
+    job_store = JobStore(JOB_STORE_PATH)
+    job_store.purge(JOB_RETENTION_S)
+    job_manager = JobManager(
+        job_store, JOB_RUNNERS,
+        max_workers=JOB_WORKERS,
+        max_pending=JOB_MAX_PENDING,
+        dedup_ttl_s=JOB_DEDUP_TTL_S,
+        callback_timeout_s=JOB_CALLBACK_TIMEOUT_S,
+        callback_allowed_hosts=JOB_CALLBACK_ALLOWED_HOSTS,
+        lease_s=JOB_LEASE_S,
+        max_attempts=JOB_MAX_ATTEMPTS
+    )
+    job_manager.recover()
+except Exception as e:
+    logger.error(f"❌ Error iniciando trabajos asíncronos: {e}")
+
+
+def validate_job_params(kind, params):
+    """Validar los parámetros antes de encolar; ValueError si son inválidos"""
+    if not isinstance(params, dict):
+        raise ValueError("'params' debe ser un objeto")
+    if kind == 'sentinel2-batch':
+        parse_parcels(params)
+        if not all([params.get('start_date'), params.get('end_date')]):
+            raise ValueError("Faltan parámetros requeridos")
+    else:
+        parse_location_params(params)
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Encolar un análisis largo y retornar su ID de inmediato
+    
+    Body JSON:
+    {
+        "type": "full-analysis",
+        "params": {
+            "latitude": -13.1631,
+            "longitude": -74.2236,
+            "buffer_km": 1,
+            "start_date": "2020-01-01",
+            "end_date": "2024-12-31"
+        },
+        "callback_url": "https://example.com/agroverse/callback"
+    }
+    
+    "type": sentinel2, sentinel2-batch, landsat8 o full-analysis; "params" es
+    el body del endpoint síncrono equivalente. El mismo tipo + params
+    retorna el trabajo existente ("deduplicated": true).
+    """
+    if job_manager is None:
+        return jsonify({
+            "success": False,
+            "error": "Trabajos asíncronos no disponibles"
+        }), 503
+    
+    try:
+        data = request.get_json()
+        kind = data.get('type')
+        params = data.get('params')
         
-        with app.test_client() as client:
-            sentinel_response = client.post('/process/sentinel2', 
-                                           json=sentinel_data,
-                                           content_type='application/json')
-            sentinel_result = sentinel_response.get_json()
-            
-            # Procesar Landsat-8
-            landsat_response = client.post('/process/landsat8',
-                                          json=data,
-                                          content_type='application/json')
-            landsat_result = landsat_response.get_json()
+        try:
+            if kind not in JOB_RUNNERS:
+                raise ValueError(f"'type' debe ser uno de: {', '.join(JOB_RUNNERS)}")
+            validate_job_params(kind, params)
+            job, created = job_manager.submit(kind, params, data.get('callback_url'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        except QueueFullError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 429
         
         return jsonify({
             "success": True,
-            "sentinel2": sentinel_result.get('data', {}),
-            "landsat8": landsat_result.get('data', {}),
-            "analysis_type": "full_spectral_thermal"
-        })
+            "deduplicated": not created,
+            "job": JobManager.describe(job),
+            "status_url": f"/jobs/{job['id']}",
+            "result_url": f"/jobs/{job['id']}/result"
+        }), 202
         
     except Exception as e:
-        logger.error(f"Error en análisis completo: {e}")
+        logger.error(f"Error encolando trabajo: {e}")
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Estado de un trabajo (sin el resultado)"""
+    job = job_manager.store.get(job_id) if job_manager is not None else None
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Trabajo no encontrado"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "job": JobManager.describe(job)
+    })
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """
+    Resultado de un trabajo
+    200 con el resultado si terminó bien, 202 si sigue en cola o en
+    ejecución, 500 con el error si falló
+    """
+    job = job_manager.store.get(job_id) if job_manager is not None else None
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Trabajo no encontrado"
+        }), 404
+    
+    if job['status'] == SUCCEEDED:
+        return jsonify({
+            "success": True,
+            "job": JobManager.describe(job),
+            "data": job['result']
+        })
+    if job['status'] == FAILED:
+        return jsonify({
+            "success": False,
+            "job": JobManager.describe(job),
+            "error": job['error']
+        }), 500
+    return jsonify({
+        "success": False,
+        "job": JobManager.describe(job)
+    }), 202
+
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
     host = os.getenv('HOST', '0.0.0.0')
@@ -0,0 +1,235 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobManager, JobStore, QueueFullError
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.db'))
+
+
+def test_same_kind_and_params_is_deduplicated(store, clock):
+    job, created = store.create_or_reuse('sentinel2', {"a": 1}, None, dedup_ttl_s=60)
+    again, created_again = store.create_or_reuse('sentinel2', {"a": 1}, None, dedup_ttl_s=60)
+    other, created_other = store.create_or_reuse('sentinel2', {"a": 2}, None, dedup_ttl_s=60)
+
+    assert (created, created_again, created_other) == (True, False, True)
+    assert again["id"] == job["id"]
+    assert other["id"] != job["id"]
+
+
+def test_finished_job_is_reused_only_within_ttl(store, clock):
+    job, _ = store.create_or_reuse('x', {}, None, dedup_ttl_s=60)
+    assert store.claim(job["id"], 'w1')
+    assert store.finish(job["id"], 'w1', result={"ok": True})
+
+    clock.now += 30
+    assert store.create_or_reuse('x', {}, None, dedup_ttl_s=60)[1] is False
+    clock.now += 60
+    assert store.create_or_reuse('x', {}, None, dedup_ttl_s=60)[1] is True
+
+
+def test_claim_runs_a_job_once(store, clock):
+    job, _ = store.create_or_reuse('x', {}, None, dedup_ttl_s=60)
+    assert store.claim(job["id"], 'w1')
+    assert not store.claim(job["id"], 'w2')
+
+    claimed = store.get(job["id"])
+    assert (claimed["status"], claimed["worker_id"], claimed["attempts"]) == (RUNNING, 'w1', 1)
+
+
+def test_live_lease_is_not_requeued(store, clock):
+    job, _ = store.create_or_reuse('x', {}, None, dedup_ttl_s=60)
+    store.claim(job["id"], 'w1')
+
+    for _ in range(5):
+        clock.now += 20
+        store.heartbeat('w1')
+        assert store.requeue_stale(lease_s=30, max_attempts=3) == ([], [])
+    assert store.get(job["id"])["status"] == RUNNING
+
+
+def test_expired_lease_is_requeued_and_old_worker_cannot_finish(store, clock):
+    job, _ = store.create_or_reuse('x', {}, None, dedup_ttl_s=60)
+    store.claim(job["id"], 'w1')
+
+    clock.now += 31
+    assert store.requeue_stale(lease_s=30, max_attempts=3) == ([job["id"]], [])
+    requeued = store.get(job["id"])
+    assert (requeued["status"], requeued["worker_id"]) == (QUEUED, None)
+    assert store.queued() == [job["id"]]
+
+    assert store.claim(job["id"], 'w2')
+    assert not store.finish(job["id"], 'w1', result={"from": "w1"})
+    assert store.finish(job["id"], 'w2', result={"from": "w2"})
+    finished = store.get(job["id"])
+    assert (finished["status"], finished["result"], finished["attempts"]) == (SUCCEEDED, {"from": "w2"}, 2)
+
+
+def test_job_fails_after_max_attempts(store, clock):
+    job, _ = store.create_or_reuse('x', {}, None, dedup_ttl_s=60)
+    for attempt in range(3):
+        assert store.claim(job["id"], f'w{attempt}')
+        clock.now += 31
+        requeued, failed = store.requeue_stale(lease_s=30, max_attempts=3)
+
+    assert (requeued, failed) == ([], [job["id"]])
+    failed_job = store.get(job["id"])
+    assert failed_job["status"] == FAILED
+    assert "Máximo de intentos" in failed_job["error"]
+
+
+def test_purge_removes_old_finished_jobs(store, clock):
+    job, _ = store.create_or_reuse('x', {}, None, dedup_ttl_s=60)
+    store.claim(job["id"], 'w1')
+    store.finish(job["id"], 'w1', error="boom")
+    pending, _ = store.create_or_reuse('y', {}, None, dedup_ttl_s=60)
+
+    clock.now += 100
+    assert store.purge(older_than_s=50) == 1
+    assert store.get(job["id"]) is None
+    assert store.get(pending["id"]) is not None
+
+
+def test_old_database_is_migrated(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+        "dedup_key TEXT NOT NULL, status TEXT NOT NULL, result BLOB, error TEXT, "
+        "callback_url TEXT, callback_status TEXT, created_at REAL NOT NULL, started_at REAL, "
+        "finished_at REAL, attempts INTEGER NOT NULL DEFAULT 0)"
+    )
+    conn.execute(
+        "INSERT INTO jobs (id, kind, params, dedup_key, status, created_at) "
+        "VALUES ('old', 'x', '{}', 'k', 'running', 0)"
+    )
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path)
+    assert store.get('old')["worker_id"] is None
+    # Sin heartbeat: un trabajo en ejecución de la versión anterior se recupera
+    assert store.requeue_stale(lease_s=30, max_attempts=3) == (['old'], [])
+
+
+@pytest.mark.parametrize('url', [
+    'http://example.com/cb',
+    'https://127.0.0.1/cb',
+    'https://169.254.169.254/latest/meta-data',
+    'https://10.0.0.5/cb',
+    'https://[::1]/cb',
+    'ftp://example.com/cb',
+    None,
+])
+def test_callback_url_rejects_non_public_targets(url):
+    with pytest.raises(ValueError):
+        jobs.validate_callback_url(url)
+
+
+def test_callback_url_allowed_hosts():
+    with pytest.raises(ValueError, match="no permitido"):
+        jobs.validate_callback_url('https://8.8.8.8/cb', allowed_hosts=('example.com',))
+
+
+@pytest.fixture
+def callbacks(monkeypatch):
+    sent = []
+
+    class Response:
+        status_code = 200
+
+    def post(url, json=None, **kwargs):
+        sent.append((url, json["status"]))
+        return Response()
+
+    monkeypatch.setattr(jobs, 'validate_callback_url', lambda url, allowed_hosts=(): None)
+    monkeypatch.setattr(jobs.requests, 'post', post)
+    return sent
+
+
+def wait_until(condition, timeout_s=2):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condición no cumplida a tiempo")
+        time.sleep(0.01)
+
+
+def test_deduplicated_submission_gets_its_own_callback(tmp_path, callbacks):
+    release = threading.Event()
+    manager = JobManager(
+        JobStore(str(tmp_path / 'jobs.db')), {"x": lambda params: release.wait(2) and {"ok": True}},
+        max_workers=1
+    )
+    try:
+        job, created = manager.submit("x", {}, "https://a.example/cb")
+        again, created_again = manager.submit("x", {}, "https://b.example/cb")
+        assert (created, created_again, again["id"]) == (True, False, job["id"])
+
+        release.set()
+        wait_until(lambda: len(callbacks) == 2)
+        assert sorted(callbacks) == [("https://a.example/cb", SUCCEEDED), ("https://b.example/cb", SUCCEEDED)]
+
+        # El trabajo ya terminó: el callback de un pedido nuevo se envía de inmediato
+        manager.submit("x", {}, "https://c.example/cb")
+        wait_until(lambda: len(callbacks) == 3)
+        assert callbacks[-1] == ("https://c.example/cb", SUCCEEDED)
+    finally:
+        manager.stop()
+
+
+def test_concurrent_submits_respect_max_pending(tmp_path, monkeypatch):
+    release = threading.Event()
+    manager = JobManager(
+        JobStore(str(tmp_path / 'jobs.db')), {"x": lambda params: release.wait(2)},
+        max_workers=2, max_pending=5
+    )
+    create = manager.store.create_or_reuse
+
+    def slow_create(*args):
+        time.sleep(0.02)
+        return create(*args)
+
+    monkeypatch.setattr(manager.store, 'create_or_reuse', slow_create)
+    outcomes = []
+
+    def submit(i):
+        try:
+            manager.submit("x", {"i": i})
+            outcomes.append('ok')
+        except QueueFullError:
+            outcomes.append('full')
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert outcomes.count('ok') == 5
+        assert manager.stats()["pending"] == 5
+    finally:
+        release.set()
+        manager.stop()
+    wait_until(lambda: manager.stats()["pending"] == 0)
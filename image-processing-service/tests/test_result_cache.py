@@ -0,0 +1,88 @@
+import os
+from datetime import date
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, cache_key, is_closed_range
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'time', clock)
+    return clock
+
+
+def payload(size=2000):
+    # Bytes aleatorios en hex: zlib no los comprime a casi nada
+    return {"data": os.urandom(size).hex()}
+
+
+def test_key_rounds_coordinates_and_sorts_indices():
+    a = cache_key('S2', -13.16311, -74.22361, 1, '2024-01-01', '2024-02-01', ['NDVI', 'EVI'])
+    b = cache_key('S2', -13.16314, -74.22359, 1, '2024-01-01', '2024-02-01', ['EVI', 'NDVI'])
+    c = cache_key('S2', -13.1640, -74.22361, 1, '2024-01-01', '2024-02-01', ['EVI', 'NDVI'])
+    assert a == b
+    assert a != c
+
+
+def test_closed_range_respects_ingestion_lag():
+    today = date(2026, 10, 18)
+    assert is_closed_range('2026-10-15', today=today, ingestion_lag_days=3)
+    assert not is_closed_range('2026-10-16', today=today, ingestion_lag_days=3)
+    assert not is_closed_range('no-es-fecha', today=today)
+
+
+def test_open_range_expires_after_ttl(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'results.db'), ttl_s=60)
+    cache.set('k', {"v": 1})
+
+    clock.now += 59
+    assert cache.get('k') == {"v": 1}
+    clock.now += 2
+    assert cache.get('k') is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_permanent_entries_never_expire(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'results.db'), ttl_s=60)
+    cache.set('k', {"v": 1}, permanent=True)
+    clock.now += 10 * 365 * 86400
+    assert cache.get('k') == {"v": 1}
+
+
+def test_evicts_least_recently_used_below_max_bytes(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'results.db'), max_bytes=10_000)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, payload())
+        clock.now += 1
+    # 'a' se usa: el menos usado pasa a ser 'b'
+    assert cache.get('a') is not None
+    clock.now += 1
+
+    cache.set('d', payload())
+    cache.set('e', payload())
+
+    stats = cache.stats()
+    assert stats["size_bytes"] <= cache.max_bytes
+    assert stats["evictions"] >= 1
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('e') is not None
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / 'results.db')
+    ResultCache(path).set('k', {"v": [1, 2, 3]}, permanent=True)
+    assert ResultCache(path).get('k') == {"v": [1, 2, 3]}
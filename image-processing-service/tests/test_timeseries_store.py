@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+from timeseries_store import TimeSeriesStore, date_to_millis
+
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+def make_store(tmp_path, lag_days=3):
+    return TimeSeriesStore(str(tmp_path / 'timeseries.db'), ingestion_lag_days=lag_days)
+
+
+def scene(day, ndvi):
+    return (date_to_millis(day), {"date": day, "NDVI": ndvi})
+
+
+def test_plan_new_series_queries_whole_range(tmp_path):
+    store = make_store(tmp_path)
+    assert store.plan('k', '2026-01-01', '2026-02-01') == [('2026-01-01', '2026-02-01')]
+
+
+def test_plan_after_closed_range_queries_nothing(tmp_path):
+    store = make_store(tmp_path)
+    store.save('k', [scene('2026-01-10', 0.5)], '2026-01-01', '2026-02-01')
+    assert store.plan('k', '2026-01-01', '2026-02-01') == []
+
+
+def test_plan_adds_head_range_when_start_moves_back(tmp_path):
+    store = make_store(tmp_path)
+    store.save('k', [], '2026-01-01', '2026-02-01')
+    assert store.plan('k', '2025-12-01', '2026-02-01') == [('2025-12-01', '2026-01-01')]
+
+
+def test_tail_starts_at_checked_through_not_last_scene(tmp_path):
+    store = make_store(tmp_path, lag_days=3)
+    end = days_ago(-1)
+    store.save('k', [scene(days_ago(1), 0.6)], days_ago(30), end)
+
+    assert store.state('k')['checked_through'] == days_ago(3)
+    assert store.plan('k', days_ago(30), end) == [(days_ago(3), end)]
+
+
+def test_late_ingested_scene_is_added(tmp_path):
+    store = make_store(tmp_path, lag_days=3)
+    start, end = days_ago(30), days_ago(-1)
+    store.save('k', [scene(days_ago(1), 0.6)], start, end)
+
+    # Earth Engine publica tarde una escena de hace 2 días: el rango de cola
+    # la incluye y la escena de hace 1 día vuelve a llegar
+    (tail_start, tail_end), = store.plan('k', start, end)
+    assert tail_start <= days_ago(2) < tail_end
+    new_scenes = store.save('k', [scene(days_ago(2), 0.5), scene(days_ago(1), 0.6)], tail_start, end)
+
+    assert new_scenes == 1
+    assert [obs['date'] for obs in store.observations('k', start, end)] == [days_ago(2), days_ago(1)]
+
+
+def test_save_replaces_refetched_scenes(tmp_path):
+    store = make_store(tmp_path)
+    store.save('k', [scene('2026-01-10', 0.5)], '2026-01-01', '2026-02-01')
+    assert store.save('k', [scene('2026-01-10', 0.7)], '2026-01-01', '2026-02-01') == 0
+    assert store.observations('k', '2026-01-01', '2026-02-01') == [{"date": '2026-01-10', "NDVI": 0.7}]
+    assert store.stats() == {"series": 1, "observations": 1}
@@ -0,0 +1,174 @@
+"""
+ALMACÉN INCREMENTAL DE SERIES TEMPORALES - AGROVERSE
+Guarda en SQLite las observaciones por escena (NDVI/EVI/NDWI/SAVI/LST) de
+cada ubicación, indexadas por system:time_start. Con eso, una actualización
+diaria solo consulta a Earth Engine las fechas que todavía pueden recibir
+escenas en lugar de volver a extraer toda la ventana.
+
+Cobertura de cada serie:
+- covered_start: fecha más antigua consultada (la serie es contigua desde ahí)
+- checked_through: fecha hasta la cual ya no pueden llegar escenas nuevas
+  (fecha de consulta menos el retraso de ingesta de Earth Engine)
+- last_time_start: system:time_start de la escena más reciente guardada
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+
+def series_key(collection_id, latitude, longitude, buffer_km, indices,
+               coord_decimals=4, extra=None):
+    """Clave de una serie: ubicación redondeada, buffer, colección e índices"""
+    payload = {
+        "collection": collection_id,
+        "latitude": round(float(latitude), coord_decimals),
+        "longitude": round(float(longitude), coord_decimals),
+        "buffer_km": float(buffer_km),
+        "indices": sorted(indices or []),
+        "extra": extra or {},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def date_to_millis(value):
+    """Fecha 'YYYY-MM-DD' a milisegundos epoch UTC (como system:time_start)"""
+    day = date.fromisoformat(str(value)[:10])
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def millis_to_date(value):
+    """Milisegundos epoch UTC a fecha 'YYYY-MM-DD'"""
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).date().isoformat()
+
+
+class TimeSeriesStore:
+    """Observaciones por escena y cobertura de cada serie en SQLite"""
+
+    def __init__(self, path, ingestion_lag_days=3):
+        self.path = path
+        self.ingestion_lag_days = ingestion_lag_days
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS series ("
+            "series_key TEXT PRIMARY KEY, "
+            "covered_start TEXT NOT NULL, "
+            "checked_through TEXT NOT NULL, "
+            "last_time_start INTEGER, "
+            "updated_at TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            "series_key TEXT NOT NULL, "
+            "time_start INTEGER NOT NULL, "
+            "properties TEXT NOT NULL, "
+            "PRIMARY KEY (series_key, time_start))"
+        )
+        self._conn.commit()
+
+    def state(self, key):
+        """Cobertura de una serie, o None si nunca se consultó"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT covered_start, checked_through, last_time_start "
+                "FROM series WHERE series_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"covered_start": row[0], "checked_through": row[1], "last_time_start": row[2]}
+
+    def plan(self, key, start_date, end_date):
+        """
+        Rangos (inicio, fin) que faltan consultar a Earth Engine para cubrir
+        [start, end). La cola empieza en checked_through y no en la última
+        escena guardada: las escenas que Earth Engine publica con retraso
+        pueden tener fechas anteriores a ella (las repetidas se reemplazan)
+        """
+        start_date = str(start_date)[:10]
+        end_date = str(end_date)[:10]
+        state = self.state(key)
+
+        if state is None:
+            return [(start_date, end_date)]
+
+        ranges = []
+        if start_date < state["covered_start"]:
+            ranges.append((start_date, state["covered_start"]))
+
+        if end_date > state["checked_through"]:
+            ranges.append((max(state["checked_through"], state["covered_start"]), end_date))
+
+        return ranges
+
+    def save(self, key, observations, start_date, end_date):
+        """
+        Guardar observaciones [(time_start, propiedades)] y ampliar la cobertura
+        a [start_date, end_date). Retorna cuántas escenas no estaban guardadas
+        """
+        start_date = str(start_date)[:10]
+        end_date = str(end_date)[:10]
+        checked = min(
+            end_date,
+            (date.today() - timedelta(days=self.ingestion_lag_days)).isoformat()
+        )
+
+        with self._lock:
+            stored = {
+                row[0] for row in self._conn.execute(
+                    "SELECT time_start FROM observations WHERE series_key = ?", (key,)
+                )
+            }
+            new_scenes = len({int(time_start) for time_start, _ in observations} - stored)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO observations (series_key, time_start, properties) "
+                "VALUES (?, ?, ?)",
+                [(key, int(time_start), json.dumps(properties))
+                 for time_start, properties in observations]
+            )
+            row = self._conn.execute(
+                "SELECT covered_start, checked_through FROM series WHERE series_key = ?",
+                (key,)
+            ).fetchone()
+            last_time_start = self._conn.execute(
+                "SELECT MAX(time_start) FROM observations WHERE series_key = ?", (key,)
+            ).fetchone()[0]
+
+            if row is not None:
+                start_date = min(start_date, row[0])
+                checked = max(checked, row[1])
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO series "
+                "(series_key, covered_start, checked_through, last_time_start, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, start_date, checked, last_time_start, datetime.utcnow().isoformat())
+            )
+            self._conn.commit()
+        return new_scenes
+
+    def observations(self, key, start_date, end_date):
+        """Propiedades de las escenas guardadas en [start_date, end_date), en orden"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT properties FROM observations "
+                "WHERE series_key = ? AND time_start >= ? AND time_start < ? "
+                "ORDER BY time_start",
+                (key, date_to_millis(start_date), date_to_millis(end_date))
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            series = self._conn.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+            observations = self._conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+        return {"series": series, "observations": observations}
@@ -0,0 +1,88 @@
+"""
+Crear modelos base (sin entrenar) en MODEL_PATH
+Tienen las mismas dimensiones de entrada que los vectores de features de
+inference.py, así que sirven para probar la ruta de inferencia real y el
+micro-batching antes de tener modelos entrenados con datos reales.
+
+Uso:
+    python create_empty_models.py [directorio]
+"""
+
+import logging
+import os
+import sys
+
+import joblib
+import numpy as np
+
+from inference import feature_count
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def create_frost_model(path):
+    """Red densa Keras con salida sigmoide"""
+    from tensorflow import keras
+
+    model = keras.Sequential([
+        keras.layers.Input(shape=(feature_count('frost'),)),
+        keras.layers.Dense(16, activation='relu'),
+        keras.layers.Dense(1, activation='sigmoid'),
+    ])
+    model.compile(optimizer='adam', loss='binary_crossentropy',
+                  metrics=['accuracy', keras.metrics.AUC()])
+    model.save(path)
+
+
+def create_drought_model(path):
+    """Red PyTorch con salida sigmoide, guardada completa con torch.save"""
+    import torch
+    import torch.nn as nn
+
+    model = nn.Sequential(
+        nn.Linear(feature_count('drought'), 16),
+        nn.ReLU(),
+        nn.Linear(16, 1),
+        nn.Sigmoid(),
+    )
+    model.eval()
+    torch.save(model, path)
+
+
+def create_pest_model(path):
+    """Random Forest ajustado sobre datos sintéticos"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(42)
+    X = rng.random((200, feature_count('pest')), dtype=np.float32)
+    y = (X[:, 0] + X[:, 1] > 1.0).astype(int)
+
+    model = RandomForestClassifier(n_estimators=10, max_depth=4, random_state=42)
+    model.fit(X, y)
+    joblib.dump(model, path)
+
+
+MODEL_BUILDERS = [
+    ('frost_prediction_model.h5', create_frost_model),
+    ('drought_prediction_model.pt', create_drought_model),
+    ('pest_prediction_model.pkl', create_pest_model),
+]
+
+
+def create_models(model_path):
+    """Crear los modelos cuyo framework esté instalado"""
+    os.makedirs(model_path, exist_ok=True)
+
+    for filename, builder in MODEL_BUILDERS:
+        path = os.path.join(model_path, filename)
+        try:
+            builder(path)
+            logger.info(f"✅ {filename} creado")
+        except ImportError as e:
+            logger.warning(f"⚠️ {filename} omitido, framework no disponible: {e}")
+
+
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else os.getenv('MODEL_PATH', './models')
+    create_models(target)
@@ -0,0 +1,108 @@
+"""
+MAPAS DE RIESGO EN GRILLA - AGROVERSE
+Utilidades para /predict/grid: geometría de la grilla a partir de un bounding
+box, lectura de arrays por celda (JSON o NPZ) y codificación binaria del raster
+de salida.
+"""
+
+import io
+import math
+
+import numpy as np
+
+# Códigos uint8 de nivel de riesgo en el raster de salida
+RISK_LEVELS = ["bajo", "medio", "alto", "crítico"]
+
+
+def grid_shape(bbox, resolution):
+    """
+    Filas y columnas de la grilla
+    bbox: [min_lon, min_lat, max_lon, max_lat] en grados
+    """
+    min_lon, min_lat, max_lon, max_lat = [float(v) for v in bbox]
+    if max_lon <= min_lon or max_lat <= min_lat:
+        raise ValueError("bbox inválido: se espera [min_lon, min_lat, max_lon, max_lat]")
+    if resolution <= 0:
+        raise ValueError("La resolución debe ser positiva")
+
+    rows = math.ceil(round((max_lat - min_lat) / resolution, 9))
+    cols = math.ceil(round((max_lon - min_lon) / resolution, 9))
+    return rows, cols
+
+
+def cell_centers(bbox, resolution, shape):
+    """Latitud y longitud del centro de cada celda (fila 0 = borde norte)"""
+    min_lon, _, _, max_lat = [float(v) for v in bbox]
+    rows, cols = shape
+    lats = max_lat - (np.arange(rows) + 0.5) * resolution
+    lons = min_lon + (np.arange(cols) + 0.5) * resolution
+    lon_grid, lat_grid = np.meshgrid(lons, lats)
+    return lat_grid, lon_grid
+
+
+def flatten_cells(cells, shape):
+    """
+    Aplanar los arrays por celda a columnas 1-D
+    Cada valor puede ser un escalar (se replica) o un array con la forma de la
+    grilla (rows, cols) o ya aplanado (rows * cols)
+    """
+    n = shape[0] * shape[1]
+    columns = {}
+    for name, values in cells.items():
+        array = np.asarray(values)
+        if array.ndim == 0:
+            dtype = array.dtype if array.dtype.kind in 'biuf' else object
+            array = np.full(n, array.item(), dtype=dtype)
+        elif array.size == n and array.shape in (shape, (n,)):
+            array = array.reshape(n)
+        else:
+            raise ValueError(
+                f"'{name}' tiene forma {array.shape}, se esperaba {shape} o un escalar"
+            )
+        if array.dtype.kind in 'biuf':
+            array = array.astype(np.float64, copy=False)
+        columns[name] = array
+    return columns
+
+
+def load_npz_cells(stream):
+    """Leer arrays por celda de un archivo NPZ (sin pickle)"""
+    with np.load(stream, allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def risk_codes(levels):
+    """Convertir niveles de riesgo (strings) a códigos uint8"""
+    codes = np.zeros(len(levels), dtype=np.uint8)
+    for code, level in enumerate(RISK_LEVELS):
+        codes[levels == level] = code
+    return codes
+
+
+def encode_grid_npz(predictions, shape, bbox, resolution, compress=False):
+    """
+    Serializar el raster de cada amenaza como NPZ
+    Arrays: <amenaza>_probability (float32), <amenaza>_risk_code (uint8),
+    drought_water_deficit_mm (float32) y metadatos de la grilla
+    """
+    arrays = {
+        "bbox": np.asarray(bbox, dtype=np.float64),
+        "resolution": np.float64(resolution),
+        "risk_levels": np.asarray(RISK_LEVELS),
+    }
+    for hazard, result in predictions.items():
+        arrays[f"{hazard}_probability"] = (
+            result["probability"].astype(np.float32).reshape(shape)
+        )
+        arrays[f"{hazard}_risk_code"] = risk_codes(result["risk_level"]).reshape(shape)
+        if "water_deficit_mm" in result:
+            arrays[f"{hazard}_water_deficit_mm"] = (
+                np.asarray(result["water_deficit_mm"], dtype=np.float32).reshape(shape)
+            )
+
+    buffer = io.BytesIO()
+    if compress:
+        np.savez_compressed(buffer, **arrays)
+    else:
+        np.savez(buffer, **arrays)
+    return buffer.getvalue()
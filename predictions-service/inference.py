@@ -0,0 +1,275 @@
+"""
+INFERENCIA CON MODELOS ENTRENADOS - AGROVERSE
+Construcción de vectores de features y micro-batching dinámico para los
+modelos de heladas (Keras), sequía (PyTorch) y plagas (Scikit-learn)
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from vectorized_baselines import classify_risk
+
+logger = logging.getLogger(__name__)
+
+# Orden de features que espera cada modelo: (nombre, valor por defecto)
+# create_empty_models.py genera modelos base con estas mismas dimensiones
+FROST_FEATURES = [
+    ('temp_min', 10.0),
+    ('temp_max', 20.0),
+    ('humidity', 60.0),
+    ('wind_speed', 5.0),
+    ('cloud_cover', 50.0),
+    ('dew_point', 5.0),
+    ('pressure', 1013.0),
+    ('hours_ahead', 24.0),
+    ('elevation', 0.0),
+    ('latitude', 0.0),
+]
+
+DROUGHT_FEATURES = [
+    ('evapotranspiration', 0.0),
+    ('precipitation_sum', 0.0),
+    ('soil_moisture', 50.0),
+    ('ndwi', 0.0),
+    ('temperature', 20.0),
+    ('solar_radiation', 0.0),
+    ('vapor_pressure_deficit', 0.0),
+]
+
+PEST_FEATURES = [
+    ('temperature', 20.0),
+    ('humidity', 60.0),
+    ('ndvi', 0.5),
+    ('precipitation_sum', 0.0),
+]
+
+# Codificación one-hot del tipo de cultivo para el modelo de plagas
+PEST_CROP_TYPES = ['potato', 'tomato', 'maize', 'quinoa']
+
+FEATURE_SPECS = {
+    'frost': FROST_FEATURES,
+    'drought': DROUGHT_FEATURES,
+    'pest': PEST_FEATURES,
+}
+
+# Umbrales de riesgo (los mismos que las reglas baseline)
+RISK_THRESHOLDS = {
+    'frost': ([0.7, 0.5, 0.3], ["crítico", "alto", "medio"]),
+    'drought': ([0.7, 0.5, 0.3], ["crítico", "alto", "medio"]),
+    'pest': ([0.6, 0.4], ["alto", "medio"]),
+}
+
+
+def feature_count(hazard):
+    """Número de columnas del vector de features de cada modelo"""
+    extra = len(PEST_CROP_TYPES) if hazard == 'pest' else 0
+    return len(FEATURE_SPECS[hazard]) + extra
+
+
+def records_to_raw_columns(records):
+    """Transponer registros a columnas crudas (listas) con todas las claves presentes"""
+    names = set()
+    for record in records:
+        names.update(record.keys())
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+def coerce_model_columns(columns, hazards, n):
+    """
+    Copia de columns con las features de los modelos de hazards como float64
+    Lanza ValueError con el nombre de la columna si no es numérica o no
+    tiene n valores (así el error es un 400 y no falla la inferencia)
+    """
+    coerced = dict(columns)
+    names = {name for hazard in hazards for name, _ in FEATURE_SPECS[hazard]}
+    for name in sorted(names):
+        if columns.get(name) is None:
+            continue
+        try:
+            column = np.asarray(columns[name], dtype=np.float64)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Feature '{name}' no numérico: {e}")
+        if column.shape != (n,):
+            raise ValueError(f"Feature '{name}' debe tener {n} valores")
+        coerced[name] = column
+    return coerced
+
+
+def build_feature_matrix(hazard, columns, n):
+    """
+    Construir la matriz (n, d) float32 de features para un modelo
+    columns: dict nombre -> lista/array; los None/NaN toman el default
+    """
+    matrix = np.empty((n, feature_count(hazard)), dtype=np.float32)
+
+    for j, (name, default) in enumerate(FEATURE_SPECS[hazard]):
+        values = columns.get(name)
+        if values is None:
+            matrix[:, j] = default
+            continue
+        column = np.asarray(values, dtype=np.float64)
+        matrix[:, j] = np.where(np.isnan(column), default, column)
+
+    if hazard == 'pest':
+        crops = np.asarray(columns.get('crop_type', [None] * n), dtype=object)
+        offset = len(FEATURE_SPECS['pest'])
+        for k, crop in enumerate(PEST_CROP_TYPES):
+            matrix[:, offset + k] = crops == crop
+
+    return matrix
+
+
+def build_feature_vector(hazard, features):
+    """Vector de features (1, d) para un único registro"""
+    columns = {name: [value] for name, value in features.items()}
+    return build_feature_matrix(hazard, columns, 1)
+
+
+def _probabilities(output, n):
+    """Normalizar la salida de un modelo a un vector de probabilidades en [0, 1]"""
+    if n == 0:
+        return np.zeros(0)
+    output = np.asarray(output, dtype=np.float64).reshape(n, -1)
+    # Con salida softmax de 2 clases, la última columna es la clase positiva
+    return np.clip(output[:, -1], 0.0, 1.0)
+
+
+def keras_predict(model, X):
+    """Una sola pasada model.predict para todo el batch"""
+    return _probabilities(model.predict(X, verbose=0), len(X))
+
+
+def torch_predict(model, X):
+    """Una sola pasada forward bajo torch.no_grad() para todo el batch"""
+    import torch
+
+    with torch.no_grad():
+        output = model(torch.from_numpy(np.ascontiguousarray(X)))
+    return _probabilities(output.detach().cpu().numpy(), len(X))
+
+
+def sklearn_predict(model, X):
+    """predict_proba (o predict) de Scikit-learn para todo el batch"""
+    if hasattr(model, 'predict_proba'):
+        return _probabilities(model.predict_proba(X), len(X))
+    return _probabilities(model.predict(X), len(X))
+
+
+MODEL_PREDICTORS = {
+    'frost': keras_predict,
+    'drought': torch_predict,
+    'pest': sklearn_predict,
+}
+
+
+def model_results(hazard, probabilities, columns=None):
+    """Resultados columnares con el mismo formato que las reglas baseline"""
+    thresholds, labels = RISK_THRESHOLDS[hazard]
+    result = {
+        "probability": probabilities,
+        "risk_level": classify_risk(probabilities, thresholds, labels, "bajo"),
+        "model_type": "trained_ml_model"
+    }
+    if hazard == 'drought' and columns is not None:
+        result["water_deficit_mm"] = (
+            columns['evapotranspiration'] - columns['precipitation_sum']
+        )
+    return result
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones concurrentes durante unos milisegundos y ejecuta
+    una sola inferencia por batch en un hilo dedicado.
+
+    Cada envío es un bloque (k, d) de filas; el hilo concatena bloques hasta
+    llegar a max_batch_size filas o agotar max_wait_ms desde el primero.
+    Como solo este hilo toca el modelo, tampoco hay llamadas concurrentes a
+    Keras/PyTorch.
+    """
+
+    def __init__(self, name, predict_fn, max_batch_size=64, max_wait_ms=5.0):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = {"batches": 0, "rows": 0, "errors": 0, "max_batch_rows": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"microbatcher-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, X):
+        """Encolar un bloque de filas; retorna un Future con sus probabilidades"""
+        future = Future()
+        self._queue.put((np.atleast_2d(X), future))
+        return future
+
+    def predict(self, X, timeout=None):
+        """Probabilidades para las filas de X (bloquea hasta que el batch corre)"""
+        return self.submit(X).result(timeout=timeout)
+
+    def stop(self):
+        """Detener el hilo de batching"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        """Juntar bloques hasta llenar el batch o agotar la ventana de espera"""
+        pending = [first]
+        rows = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Reencolar la señal de parada para el siguiente ciclo
+                self._queue.put(None)
+                break
+            pending.append(item)
+            rows += len(item[0])
+
+        return pending, rows
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            pending, _ = self._collect(first)
+            pending = [(X, future) for X, future in pending
+                       if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            rows = sum(len(X) for X, _ in pending)
+
+            try:
+                probabilities = self.predict_fn(np.concatenate([X for X, _ in pending]))
+            except Exception as e:
+                logger.error(f"Error en inferencia por lotes ({self.name}): {e}")
+                self.stats["errors"] += 1
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["rows"] += rows
+            self.stats["max_batch_rows"] = max(self.stats["max_batch_rows"], rows)
+
+            start = 0
+            for X, future in pending:
+                future.set_result(probabilities[start:start + len(X)])
+                start += len(X)
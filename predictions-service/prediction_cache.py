@@ -0,0 +1,233 @@
+"""
+CACHÉ ESPACIO-TEMPORAL DE PREDICCIONES - AGROVERSE
+LRU + TTL en proceso, con clave por geohash de la ubicación, fecha /
+hours_ahead y vector de features (exacto, o redondeado si se configura
+decimals: entonces la predicción se calcula con los features redondeados
+para que el valor cacheado dependa solo de la clave). Opcionalmente
+comparte las entradas entre workers a través de un archivo SQLite local.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(latitude, longitude, precision=7):
+    """
+    Codificar lat/lon como geohash
+    Precisión 6 ≈ 1.2 km x 0.6 km, 7 ≈ 150 m x 150 m
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def _rounded(value, decimals=None):
+    """Número normalizado a float (redondeado si decimals no es None)"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value) if decimals is None else round(float(value), decimals)
+    return str(value)
+
+
+def quantize_features(features, feature_names, decimals):
+    """Copia de features con los feature_names numéricos redondeados a decimals"""
+    quantized = dict(features)
+    for name in feature_names:
+        value = features.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            quantized[name] = round(float(value), decimals)
+    return quantized
+
+
+def build_cache_key(namespace, features, feature_names, precision=7, decimals=None):
+    """
+    Clave de caché: namespace + geohash + fecha/hours_ahead + features
+    decimals=None usa los valores exactos; con decimals, el llamador debe
+    predecir con quantize_features para que el resultado coincida con la clave
+    """
+    latitude = features.get('latitude')
+    longitude = features.get('longitude')
+    if latitude is not None and longitude is not None:
+        location = geohash_encode(float(latitude), float(longitude), precision)
+    else:
+        location = None
+
+    payload = {
+        "geohash": location,
+        "date": features.get('date'),
+        "hours_ahead": features.get('hours_ahead'),
+        "features": [_rounded(features.get(name), decimals) for name in feature_names],
+    }
+    digest = hashlib.sha1(
+        json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class SqliteCacheBackend:
+    """
+    Almacén compartido en un archivo SQLite local (modo WAL)
+    Permite que varios workers de gunicorn reutilicen las mismas entradas
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM prediction_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute(
+                    "DELETE FROM prediction_cache WHERE expires_at <= ?", (time.time(),)
+                )
+            self._conn.commit()
+
+
+class PredictionCache:
+    """LRU + TTL en proceso con contadores de hit/miss/eviction"""
+
+    def __init__(self, max_entries=10000, ttl_s=900, shared_backend=None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.shared_backend = shared_backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def get(self, key):
+        """Valor cacheado o None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self.shared_backend is not None:
+            try:
+                value, expires_at = self.shared_backend.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Error leyendo caché compartida: {e}")
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                    self._store(key, value, expires_at)
+                return value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key, value):
+        """Guardar un valor con el TTL configurado"""
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            self._store(key, value, expires_at)
+
+        if self.shared_backend is not None:
+            try:
+                self.shared_backend.set(key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Error escribiendo caché compartida: {e}")
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        """Contadores para /health"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_s"] = self.ttl_s
+        stats["shared_backend"] = (
+            self.shared_backend.path if self.shared_backend is not None else None
+        )
+        return stats
@@ -5,31 +5,59 @@ TensorFlow + PyTorch + Scikit-learn
 Optimizado para Cloud Run + Vertex AI
 """
 
-from flask import Flask, request, jsonify
+import time
+
+# Inicio de la importación del servicio (reporte de arranque en /health)
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import numpy as np
+import importlib
+import io
+import importlib.util
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
 import json
-import joblib
-
-# TensorFlow y Keras
-try:
-    import tensorflow as tf
-    from tensorflow import keras
-    TF_AVAILABLE = True
-except ImportError:
-    TF_AVAILABLE = False
-    logging.warning("TensorFlow no disponible")
 
-# PyTorch
-try:
-    import torch
-    import torch.nn as nn
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
+from vectorized_baselines import (
+    BASELINE_FEATURES,
+    BATCH_PREDICTORS,
+    columns_from_columnar,
+    columns_from_records,
+)
+from inference import (
+    FEATURE_SPECS,
+    MODEL_PREDICTORS,
+    MicroBatcher,
+    build_feature_matrix,
+    build_feature_vector,
+    coerce_model_columns,
+    model_results,
+    records_to_raw_columns,
+)
+from grid import (
+    cell_centers,
+    encode_grid_npz,
+    flatten_cells,
+    grid_shape,
+    load_npz_cells,
+)
+from streaming import DEFAULT_CHUNK_SIZE, iter_csv, iter_ndjson, score_stream
+from water_balance import DEFAULT_WINDOW, WaterBalanceEngine
+from prediction_cache import PredictionCache, SqliteCacheBackend, build_cache_key, quantize_features
+
+# TensorFlow y PyTorch se importan solo cuando hay un modelo que los necesita
+# (find_spec no importa el paquete, solo comprueba que esté instalado)
+TF_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+TORCH_AVAILABLE = importlib.util.find_spec('torch') is not None
+
+if not TF_AVAILABLE:
+    logging.warning("TensorFlow no disponible")
+if not TORCH_AVAILABLE:
     logging.warning("PyTorch no disponible")
 
 # Configurar logging
@@ -44,45 +72,242 @@ GCP_PROJECT_ID = os.getenv('GCP_PROJECT_ID', '')
 GCP_REGION = os.getenv('GCP_REGION', 'us-central1')
 MODEL_PATH = os.getenv('MODEL_PATH', './models')
 
-# Cargar modelos globalmente
+# Micro-batching de inferencia
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 64))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', 5))
+INFERENCE_TIMEOUT_S = float(os.getenv('INFERENCE_TIMEOUT_S', 10))
+
+# Ejecución de /predict/multi: parallel (un hilo por amenaza) o sequential
+MULTI_EXECUTION = os.getenv('MULTI_EXECUTION', 'parallel')
+MULTI_WORKERS = int(os.getenv('MULTI_WORKERS', 12))
+
+# Timeout por amenaza antes de caer a la predicción baseline
+MULTI_TIMEOUTS_MS = {
+    'frost': float(os.getenv('MULTI_TIMEOUT_FROST_MS', 2000)),
+    'drought': float(os.getenv('MULTI_TIMEOUT_DROUGHT_MS', 2000)),
+    'pest': float(os.getenv('MULTI_TIMEOUT_PEST_MS', 2000)),
+}
+
+multi_executor = ThreadPoolExecutor(max_workers=MULTI_WORKERS, thread_name_prefix="multi")
+
+# Motor de balance hídrico por parcela (ventana móvil en días)
+WATER_BALANCE_WINDOW = int(os.getenv('WATER_BALANCE_WINDOW', DEFAULT_WINDOW))
+WATER_BALANCE_MAX_PARCELS = int(os.getenv('WATER_BALANCE_MAX_PARCELS', 100000))
+
+# Tamaño máximo de chunk en /predict/stream
+STREAM_MAX_CHUNK_SIZE = int(os.getenv('STREAM_MAX_CHUNK_SIZE', 10000))
+
+# Límite de celdas por petición de /predict/grid
+GRID_MAX_CELLS = int(os.getenv('GRID_MAX_CELLS', 4_000_000))
+
+# Caché de predicciones por ubicación (geohash) + fecha + features
+PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'true').lower() == 'true'
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', 10000))
+PREDICTION_CACHE_TTL_S = float(os.getenv('PREDICTION_CACHE_TTL_S', 900))
+PREDICTION_CACHE_GEOHASH_PRECISION = int(os.getenv('PREDICTION_CACHE_GEOHASH_PRECISION', 7))
+# Redondeo opcional de los features (vacío = clave exacta). Con redondeo la
+# predicción se calcula con los features redondeados, no con los recibidos
+PREDICTION_CACHE_DECIMALS = (
+    int(os.getenv('PREDICTION_CACHE_DECIMALS')) if os.getenv('PREDICTION_CACHE_DECIMALS') else None
+)
+# Archivo SQLite compartido entre workers (vacío = solo caché en proceso)
+PREDICTION_CACHE_SHARED_PATH = os.getenv('PREDICTION_CACHE_SHARED_PATH', '')
+
+# Carga de modelos: lazy (primer uso), background (warm-up en un hilo al
+# importar) o eager (bloquea la importación hasta cargar todo)
+MODEL_LOADING = os.getenv('MODEL_LOADING', 'background')
+
+# Archivo y framework de cada modelo
+MODEL_FILES = {
+    'frost': ('frost_prediction_model.h5', 'tensorflow'),
+    'drought': ('drought_prediction_model.pt', 'torch'),
+    'pest': ('pest_prediction_model.pkl', 'joblib'),
+}
+
+MODEL_NAMES = {
+    'frost': 'heladas',
+    'drought': 'sequía',
+    'pest': 'plagas',
+}
+
+# Modelos cargados globalmente (None = sin modelo, se usa baseline)
 models = {}
+batchers = {}
+
+# Tiempos de importación de frameworks y carga de modelos (reportados en /health)
+startup_report = {
+    "mode": MODEL_LOADING,
+    "imports_ms": {},
+    "loads_ms": {},
+    "errors": {},
+    "warmup": "pending",
+}
+
+prediction_cache = PredictionCache(
+    max_entries=PREDICTION_CACHE_MAX_ENTRIES,
+    ttl_s=PREDICTION_CACHE_TTL_S,
+    shared_backend=(
+        SqliteCacheBackend(PREDICTION_CACHE_SHARED_PATH)
+        if PREDICTION_CACHE_SHARED_PATH else None
+    )
+)
+
+water_balance = WaterBalanceEngine(
+    window=WATER_BALANCE_WINDOW,
+    max_parcels=WATER_BALANCE_MAX_PARCELS
+)
+
+# Features que afectan a cada amenaza (reglas baseline + modelo entrenado)
+CACHE_FEATURES = {
+    hazard: sorted(set(BASELINE_FEATURES[hazard]) | {name for name, _ in FEATURE_SPECS[hazard]})
+    for hazard in BASELINE_FEATURES
+}
+
+_frameworks = {}
+_model_locks = {hazard: threading.Lock() for hazard in MODEL_FILES}
+_framework_lock = threading.Lock()
+
+
+def model_file(hazard):
+    """Ruta del archivo de modelo de una amenaza"""
+    return os.path.join(MODEL_PATH, MODEL_FILES[hazard][0])
+
+
+def available_model_files():
+    """Amenazas cuyo archivo de modelo existe en MODEL_PATH"""
+    return [hazard for hazard in MODEL_FILES if os.path.exists(model_file(hazard))]
+
+
+def import_framework(name):
+    """Importar un framework bajo demanda, registrando cuánto tardó"""
+    with _framework_lock:
+        if name not in _frameworks:
+            started = time.perf_counter()
+            _frameworks[name] = importlib.import_module(name)
+            startup_report["imports_ms"][name] = round(
+                (time.perf_counter() - started) * 1000, 1
+            )
+            logger.info(f"📦 {name} importado en {startup_report['imports_ms'][name]} ms")
+        return _frameworks[name]
+
+
+def _load_frost(path):
+    tf = import_framework('tensorflow')
+    return tf.keras.models.load_model(path)
+
+
+def _load_drought(path):
+    torch = import_framework('torch')
+    model = torch.load(path, weights_only=False)
+    model.eval()
+    return model
+
+
+def _load_pest(path):
+    return import_framework('joblib').load(path)
+
+
+MODEL_LOADERS = {
+    'frost': _load_frost,
+    'drought': _load_drought,
+    'pest': _load_pest,
+}
+
+
+def load_model(hazard):
+    """
+    Cargar un modelo si su archivo existe (solo entonces se importa su framework)
+    Seguro entre hilos: peticiones concurrentes esperan a la misma carga
+    """
+    with _model_locks[hazard]:
+        if hazard in models:
+            return models[hazard]
+        
+        path = model_file(hazard)
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ Modelo de {MODEL_NAMES[hazard]} no encontrado, usando predicción base")
+            models[hazard] = None
+            return None
+        
+        try:
+            import_framework(MODEL_FILES[hazard][1])
+            started = time.perf_counter()
+            model = MODEL_LOADERS[hazard](path)
+            startup_report["loads_ms"][hazard] = round(
+                (time.perf_counter() - started) * 1000, 1
+            )
+            logger.info(f"✅ Modelo de {MODEL_NAMES[hazard]} cargado")
+        except Exception as e:
+            logger.error(f"Error cargando modelo de {MODEL_NAMES[hazard]}: {e}")
+            startup_report["errors"][hazard] = str(e)
+            model = None
+        
+        # El batcher se crea antes de publicar el modelo: get_model lee models
+        # sin el lock y predict_with_model usa batchers[hazard] de inmediato
+        if model is not None:
+            start_batcher(hazard, model)
+        models[hazard] = model
+        return model
+
+
+def get_model(hazard):
+    """Modelo de una amenaza, cargándolo en el primer uso"""
+    if hazard in models:
+        return models[hazard]
+    return load_model(hazard)
 
 
 def load_models():
-    """Cargar todos los modelos ML al iniciar"""
-    global models
+    """Cargar todos los modelos ML disponibles"""
+    started = time.perf_counter()
+    startup_report["warmup"] = "running"
     
-    try:
-        # Modelo de heladas (Keras)
-        frost_model_path = os.path.join(MODEL_PATH, 'frost_prediction_model.h5')
-        if os.path.exists(frost_model_path) and TF_AVAILABLE:
-            models['frost'] = keras.models.load_model(frost_model_path)
-            logger.info("✅ Modelo de heladas cargado")
-        else:
-            logger.warning("⚠️ Modelo de heladas no encontrado, usando predicción base")
-            models['frost'] = None
-        
-        # Modelo de sequía (PyTorch)
-        drought_model_path = os.path.join(MODEL_PATH, 'drought_prediction_model.pt')
-        if os.path.exists(drought_model_path) and TORCH_AVAILABLE:
-            models['drought'] = torch.load(drought_model_path)
-            models['drought'].eval()
-            logger.info("✅ Modelo de sequía cargado")
-        else:
-            logger.warning("⚠️ Modelo de sequía no encontrado, usando predicción base")
-            models['drought'] = None
-        
-        # Modelo de plagas (Scikit-learn)
-        pest_model_path = os.path.join(MODEL_PATH, 'pest_prediction_model.pkl')
-        if os.path.exists(pest_model_path):
-            models['pest'] = joblib.load(pest_model_path)
-            logger.info("✅ Modelo de plagas cargado")
-        else:
-            logger.warning("⚠️ Modelo de plagas no encontrado, usando predicción base")
-            models['pest'] = None
-            
-    except Exception as e:
-        logger.error(f"Error cargando modelos: {e}")
+    for hazard in MODEL_FILES:
+        load_model(hazard)
+    
+    startup_report["warmup"] = "done"
+    startup_report["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def init_models():
+    """Aplicar la estrategia de carga configurada en MODEL_LOADING"""
+    if MODEL_LOADING == 'eager':
+        load_models()
+    elif MODEL_LOADING == 'background':
+        threading.Thread(target=load_models, name="model-warmup", daemon=True).start()
+    else:
+        startup_report["warmup"] = "lazy"
+
+
+def start_batcher(hazard, model):
+    """Crear el micro-batcher de un modelo cargado"""
+    if hazard in batchers:
+        return
+    batchers[hazard] = MicroBatcher(
+        hazard,
+        lambda X, predict_fn=MODEL_PREDICTORS[hazard]: predict_fn(model, X),
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS
+    )
+
+
+def predict_with_model(hazard, features):
+    """
+    Predicción de un registro con el modelo entrenado vía micro-batcher
+    Retorna el mismo formato que las funciones baseline
+    """
+    X = build_feature_vector(hazard, features)
+    probabilities = batchers[hazard].predict(X, timeout=INFERENCE_TIMEOUT_S)
+    
+    columns = None
+    if hazard == 'drought':
+        columns, _ = columns_from_records([features])
+    result = model_results(hazard, probabilities, columns)
+    
+    return {
+        key: value[0].item() if isinstance(value, np.ndarray) else value
+        for key, value in result.items()
+    }
 
 
 def predict_frost_baseline(features):
@@ -254,6 +479,127 @@ def predict_pest_baseline(features):
     }
 
 
+BASELINE_PREDICTORS = {
+    'frost': predict_frost_baseline,
+    'drought': predict_drought_baseline,
+    'pest': predict_pest_baseline,
+}
+
+
+def elapsed_ms(started):
+    """Milisegundos transcurridos desde started (perf_counter)"""
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def predict_hazard(hazard, features):
+    """
+    Predicción de una amenaza: modelo entrenado si está cargado, si no baseline
+    Pasa por la caché espacio-temporal cuando está habilitada
+    """
+    use_model = get_model(hazard) is not None
+    
+    if PREDICTION_CACHE_ENABLED:
+        if PREDICTION_CACHE_DECIMALS is not None:
+            # El valor cacheado debe depender solo de la clave
+            features = quantize_features(
+                features, CACHE_FEATURES[hazard], PREDICTION_CACHE_DECIMALS
+            )
+        key = build_cache_key(
+            f"{hazard}:{'model' if use_model else 'baseline'}",
+            features,
+            CACHE_FEATURES[hazard],
+            precision=PREDICTION_CACHE_GEOHASH_PRECISION,
+            decimals=PREDICTION_CACHE_DECIMALS
+        )
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+    
+    if use_model:
+        result = predict_with_model(hazard, features)
+    else:
+        result = BASELINE_PREDICTORS[hazard](features)
+    
+    if PREDICTION_CACHE_ENABLED:
+        prediction_cache.set(key, result)
+    return result
+
+
+def baseline_fallback(hazard, features, reason):
+    """Predicción baseline marcada como respaldo"""
+    result = BASELINE_PREDICTORS[hazard](features)
+    result['fallback'] = reason
+    return result
+
+
+def timed_predict_hazard(hazard, features):
+    """
+    predict_hazard con baseline de respaldo ante errores
+    Retorna (predicción, latencia en ms medida dentro del propio hilo)
+    """
+    started = time.perf_counter()
+    try:
+        result = predict_hazard(hazard, features)
+    except Exception as e:
+        logger.error(f"Error en predicción de {MODEL_NAMES[hazard]}: {e}")
+        result = baseline_fallback(hazard, features, 'error')
+    return result, elapsed_ms(started)
+
+
+def parse_timeouts_ms(value):
+    """
+    Timeouts por amenaza del body sobre los defaults (MULTI_TIMEOUT_*_MS)
+    Lanza ValueError si no es un objeto {amenaza: ms} con números positivos
+    """
+    timeouts = dict(MULTI_TIMEOUTS_MS)
+    if value is None:
+        return timeouts
+    if not isinstance(value, dict):
+        raise ValueError("'timeouts_ms' debe ser un objeto {amenaza: ms}")
+    for hazard, timeout in value.items():
+        if hazard not in timeouts:
+            raise ValueError(f"Amenaza desconocida en 'timeouts_ms': {hazard}")
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) \
+                or not np.isfinite(timeout) or timeout <= 0:
+            raise ValueError(f"'timeouts_ms.{hazard}' debe ser un número positivo de ms")
+        timeouts[hazard] = float(timeout)
+    return timeouts
+
+
+def run_multi_hazard(features, execution, timeouts_ms):
+    """
+    Ejecutar heladas, sequía y plagas
+    En modo parallel cada amenaza corre en su propio hilo con su propio
+    timeout; la latencia total sigue a la más lenta en lugar de la suma.
+    Si una amenaza excede su timeout o falla, se usa su baseline.
+    Retorna (predicciones, latencia en ms por amenaza)
+    """
+    predictions = {}
+    latency_ms = {}
+    
+    if execution == 'parallel':
+        submitted = time.perf_counter()
+        futures = {
+            hazard: multi_executor.submit(timed_predict_hazard, hazard, features)
+            for hazard in BASELINE_PREDICTORS
+        }
+        for hazard, future in futures.items():
+            # El timeout de cada amenaza cuenta desde el envío, no desde la espera
+            remaining = timeouts_ms[hazard] / 1000 - (time.perf_counter() - submitted)
+            try:
+                predictions[hazard], latency_ms[hazard] = future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                logger.warning(f"Timeout en predicción de {MODEL_NAMES[hazard]}, usando baseline")
+                future.cancel()
+                predictions[hazard] = baseline_fallback(hazard, features, 'timeout')
+                latency_ms[hazard] = elapsed_ms(submitted)
+    else:
+        for hazard in BASELINE_PREDICTORS:
+            predictions[hazard], latency_ms[hazard] = timed_predict_hazard(hazard, features)
+    
+    return predictions, latency_ms
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check"""
@@ -267,8 +613,16 @@ def health():
         "status": "healthy",
         "service": "predictions",
         "models_loaded": models_status,
+        "micro_batching": {
+            hazard: batcher.stats for hazard, batcher in batchers.items()
+        },
+        "model_files": available_model_files(),
         "tensorflow": TF_AVAILABLE,
         "pytorch": TORCH_AVAILABLE,
+        "frameworks_imported": sorted(_frameworks),
+        "startup": startup_report,
+        "prediction_cache": prediction_cache.stats() if PREDICTION_CACHE_ENABLED else None,
+        "water_balance": water_balance.stats(),
         "timestamp": datetime.utcnow().isoformat()
     })
 
@@ -294,15 +648,8 @@ def predict_frost():
     try:
         data = request.get_json()
         
-        # Usar modelo entrenado si está disponible
-        if models.get('frost') is not None:
-            # Preparar features para el modelo
-            # (Aquí iría la lógica de preparación de datos específica del modelo)
-            result = predict_frost_baseline(data)
-            result['model_type'] = 'trained_ml_model'
-        else:
-            # Usar modelo baseline
-            result = predict_frost_baseline(data)
+        # Modelo entrenado si está disponible, si no baseline (con caché)
+        result = predict_hazard('frost', data)
         
         return jsonify({
             "success": True,
@@ -344,11 +691,7 @@ def predict_drought():
     try:
         data = request.get_json()
         
-        if models.get('drought') is not None and TORCH_AVAILABLE:
-            result = predict_drought_baseline(data)
-            result['model_type'] = 'trained_ml_model'
-        else:
-            result = predict_drought_baseline(data)
+        result = predict_hazard('drought', data)
         
         return jsonify({
             "success": True,
@@ -385,11 +728,7 @@ def predict_pest():
     try:
         data = request.get_json()
         
-        if models.get('pest') is not None:
-            result = predict_pest_baseline(data)
-            result['model_type'] = 'trained_ml_model'
-        else:
-            result = predict_pest_baseline(data)
+        result = predict_hazard('pest', data)
         
         return jsonify({
             "success": True,
@@ -427,16 +766,33 @@ def predict_multi():
         "ndwi": -0.15,
         "crop_type": "potato",
         "latitude": -13.1631,
-        "longitude": -74.2236
+        "longitude": -74.2236,
+        "execution": "parallel",
+        "timeouts_ms": {"frost": 500, "drought": 1500, "pest": 300}
     }
+    
+    "execution" y "timeouts_ms" son opcionales (defaults: MULTI_EXECUTION y
+    MULTI_TIMEOUT_*_MS). metadata.latency_ms reporta la latencia por amenaza.
     """
     try:
         data = request.get_json()
         
-        # Predicciones individuales
-        frost = predict_frost_baseline(data)
-        drought = predict_drought_baseline(data)
-        pest = predict_pest_baseline(data)
+        execution = data.get('execution', MULTI_EXECUTION)
+        try:
+            timeouts_ms = parse_timeouts_ms(data.get('timeouts_ms'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        started = time.perf_counter()
+        predictions, latency_ms = run_multi_hazard(data, execution, timeouts_ms)
+        latency_ms['total'] = elapsed_ms(started)
+        
+        frost = predictions['frost']
+        drought = predictions['drought']
+        pest = predictions['pest']
         
         # Calcular riesgo general
         avg_risk = (frost['probability'] + drought['probability'] + pest['probability']) / 3
@@ -461,6 +817,8 @@ def predict_multi():
             },
             "metadata": {
                 "service": "multi_prediction",
+                "execution": execution,
+                "latency_ms": latency_ms,
                 "timestamp": datetime.utcnow().isoformat(),
                 "location": {
                     "latitude": data.get('latitude'),
@@ -477,10 +835,408 @@ def predict_multi():
         }), 500
 
 
-if __name__ == '__main__':
-    # Cargar modelos al iniciar
-    load_models()
+def loaded_model_hazards(hazards):
+    """Amenazas de la lista que se puntúan con un modelo entrenado"""
+    return [hazard for hazard in hazards if get_model(hazard) is not None]
+
+
+def score_batch(columns, hazards, raw_columns=None):
+    """
+    Puntuar un lote en columnas para cada amenaza
+    Usa el modelo entrenado (un solo forward pass vía micro-batcher) si está
+    cargado; si no, las reglas vectorizadas
+    raw_columns: columnas originales con features extra que solo usan los modelos
+    """
+    n = len(columns['temp_min'])
+    predictions = {}
+    for hazard in hazards:
+        if get_model(hazard) is not None:
+            if n == 0:
+                # Sin filas no hay nada que inferir (el modelo no acepta batches vacíos)
+                predictions[hazard] = model_results(hazard, np.zeros(0), columns)
+                continue
+            X = build_feature_matrix(hazard, raw_columns or columns, n)
+            probabilities = batchers[hazard].predict(X, timeout=INFERENCE_TIMEOUT_S)
+            predictions[hazard] = model_results(hazard, probabilities, columns)
+        else:
+            predictions[hazard] = BATCH_PREDICTORS[hazard](columns)
+    return predictions
+
+
+def batch_to_json(predictions):
+    """Convertir arrays NumPy de cada predicción a listas serializables"""
+    return {
+        hazard: {
+            key: value.tolist() if isinstance(value, np.ndarray) else value
+            for key, value in result.items()
+        }
+        for hazard, result in predictions.items()
+    }
+
+
+def batch_to_records(predictions, n):
+    """Reorganizar predicciones columnares en una lista de registros"""
+    columns = batch_to_json(predictions)
+    records = []
+    for i in range(n):
+        record = {}
+        for hazard, result in columns.items():
+            record[hazard] = {
+                key: value[i] if isinstance(value, list) else value
+                for key, value in result.items()
+            }
+        records.append(record)
+    return records
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Predicción por lotes (vectorizada con NumPy)
     
+    Body JSON (registros):
+    {
+        "hazards": ["frost", "drought", "pest"],
+        "records": [
+            {"temp_min": 3.5, "temp_max": 18.2, "humidity": 55, ...},
+            {"temp_min": -1.0, "temp_max": 20.1, "humidity": 40, ...}
+        ],
+        "output": "columns"
+    }
+    
+    Body JSON (columnar):
+    {
+        "hazards": ["frost"],
+        "columns": {
+            "temp_min": [3.5, -1.0],
+            "temp_max": [18.2, 20.1],
+            "humidity": [55, 40]
+        }
+    }
+    
+    También acepta directamente un array JSON de registros.
+    "output" puede ser "columns" (por defecto) o "records".
+    """
+    try:
+        data = request.get_json()
+        
+        if isinstance(data, list):
+            data = {"records": data}
+        
+        hazards = data.get('hazards', list(BATCH_PREDICTORS))
+        unknown = [hazard for hazard in hazards if hazard not in BATCH_PREDICTORS]
+        if unknown:
+            return jsonify({
+                "success": False,
+                "error": f"Amenazas no soportadas: {unknown}"
+            }), 400
+        
+        try:
+            if 'columns' in data:
+                raw_columns = data['columns']
+                columns, n = columns_from_columnar(raw_columns)
+            elif 'records' in data:
+                raw_columns = records_to_raw_columns(data['records'])
+                columns, n = columns_from_records(data['records'])
+            else:
+                return jsonify({
+                    "success": False,
+                    "error": "Se requiere 'records' o 'columns'"
+                }), 400
+            # Features que solo usan los modelos cargados (las reglas no las validan)
+            raw_columns = coerce_model_columns(raw_columns, loaded_model_hazards(hazards), n)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                "success": False,
+                "error": f"Features inválidos: {e}"
+            }), 400
+        
+        predictions = score_batch(columns, hazards, raw_columns)
+        
+        if data.get('output') == 'records':
+            predictions_json = batch_to_records(predictions, n)
+        else:
+            predictions_json = batch_to_json(predictions)
+        
+        return jsonify({
+            "success": True,
+            "count": n,
+            "predictions": predictions_json,
+            "metadata": {
+                "service": "batch_prediction",
+                "hazards": hazards,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Error en predicción por lotes: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+def parse_hazards(value, default):
+    """Lista de amenazas desde JSON (lista) o query/form (separadas por coma)"""
+    if not value:
+        return list(default)
+    if isinstance(value, str):
+        return [hazard.strip() for hazard in value.split(',') if hazard.strip()]
+    return list(value)
+
+
+@app.route('/predict/grid', methods=['POST'])
+def predict_grid():
+    """
+    Mapa de riesgo regional en grilla (raster binario NPZ)
+    
+    Body JSON:
+    {
+        "bbox": [-74.5, -13.5, -74.0, -13.0],
+        "resolution": 0.01,
+        "hazards": ["frost", "drought"],
+        "cells": {
+            "temp_min": [[1.5, 2.0, ...], ...],
+            "temp_max": [[18.0, 17.5, ...], ...],
+            "humidity": 55
+        }
+    }
+    
+    También acepta multipart/form-data con el archivo "features" (.npz con un
+    array por feature) y los campos "bbox", "resolution" y "hazards", o el NPZ
+    directamente en el body (application/x-npz) con esos parámetros en la URL.
+    
+    Cada feature es un array (filas, columnas) con la fila 0 en el borde norte,
+    o un escalar que se aplica a todas las celdas. La respuesta es un NPZ
+    (application/x-npz) con <amenaza>_probability (float32) y
+    <amenaza>_risk_code (uint8, índices de risk_levels) por amenaza.
+    """
+    try:
+        try:
+            if request.mimetype == 'multipart/form-data':
+                params = request.form
+                if 'features' not in request.files:
+                    return jsonify({
+                        "success": False,
+                        "error": "Falta el archivo 'features' (.npz)"
+                    }), 400
+                cells = load_npz_cells(io.BytesIO(request.files['features'].read()))
+                bbox = json.loads(params.get('bbox', 'null'))
+            elif request.mimetype in ('application/x-npz', 'application/octet-stream'):
+                params = request.args
+                cells = load_npz_cells(io.BytesIO(request.get_data()))
+                bbox = [float(v) for v in params.get('bbox', '').split(',') if v]
+            else:
+                params = request.get_json()
+                cells = params.get('cells', {})
+                bbox = params.get('bbox')
+        except (TypeError, ValueError) as e:
+            # bbox que no es JSON / números, o NPZ ilegible
+            return jsonify({
+                "success": False,
+                "error": f"Parámetros de grilla inválidos: {e}"
+            }), 400
+        
+        hazards = parse_hazards(params.get('hazards'), ['frost', 'drought'])
+        unknown = [hazard for hazard in hazards if hazard not in BATCH_PREDICTORS]
+        if unknown:
+            return jsonify({
+                "success": False,
+                "error": f"Amenazas no soportadas: {unknown}"
+            }), 400
+        
+        if not isinstance(bbox, (list, tuple)) or len(bbox) != 4 or not params.get('resolution'):
+            return jsonify({
+                "success": False,
+                "error": "Se requieren 'bbox' [min_lon, min_lat, max_lon, max_lat] y 'resolution'"
+            }), 400
+        
+        try:
+            resolution = float(params.get('resolution'))
+            shape = grid_shape(bbox, resolution)
+            if shape[0] * shape[1] > GRID_MAX_CELLS:
+                return jsonify({
+                    "success": False,
+                    "error": f"La grilla tiene {shape[0] * shape[1]} celdas (máximo {GRID_MAX_CELLS})"
+                }), 400
+            
+            raw_columns = flatten_cells(cells, shape)
+            # Coordenadas de cada celda para los modelos que las usan
+            if 'latitude' not in raw_columns or 'longitude' not in raw_columns:
+                lat_grid, lon_grid = cell_centers(bbox, resolution, shape)
+                raw_columns.setdefault('latitude', lat_grid.ravel())
+                raw_columns.setdefault('longitude', lon_grid.ravel())
+            columns, n = columns_from_columnar(raw_columns)
+            raw_columns = coerce_model_columns(raw_columns, loaded_model_hazards(hazards), n)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                "success": False,
+                "error": f"Grilla inválida: {e}"
+            }), 400
+        
+        predictions = score_batch(columns, hazards, raw_columns)
+        payload = encode_grid_npz(
+            predictions, shape, bbox, resolution,
+            compress=str(params.get('compress', '')).lower() == 'true'
+        )
+        
+        return Response(payload, mimetype='application/x-npz', headers={
+            "Content-Disposition": "attachment; filename=risk_grid.npz",
+            "X-Grid-Shape": f"{shape[0]},{shape[1]}",
+            "X-Model-Types": ",".join(
+                f"{hazard}:{predictions[hazard]['model_type']}" for hazard in hazards
+            )
+        })
+        
+    except Exception as e:
+        logger.error(f"Error en predicción en grilla: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@app.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    """
+    Scoring en streaming para backfills
+    
+    Body: un registro de features por línea, en NDJSON
+    (Content-Type: application/x-ndjson) o CSV con encabezado (text/csv):
+    
+        {"parcel_id": "A1", "date": "2024-06-01", "temp_min": 1.5, ...}
+        {"parcel_id": "A1", "date": "2024-06-02", "temp_min": -0.5, ...}
+    
+    Parámetros URL: hazards=frost,drought,pest  chunk_size=1000
+    
+    El body se lee línea a línea y se puntúa en chunks de tamaño fijo; la
+    respuesta es NDJSON en streaming (una línea por registro, con "line" y los
+    campos id/parcel_id/date/latitude/longitude de entrada), así la memoria
+    queda acotada al chunk y no al tamaño del body.
+    """
+    hazards = parse_hazards(request.args.get('hazards'), BATCH_PREDICTORS)
+    unknown = [hazard for hazard in hazards if hazard not in BATCH_PREDICTORS]
+    if unknown:
+        return jsonify({
+            "success": False,
+            "error": f"Amenazas no soportadas: {unknown}"
+        }), 400
+    
+    chunk_size = request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+    if not 0 < chunk_size <= STREAM_MAX_CHUNK_SIZE:
+        return jsonify({
+            "success": False,
+            "error": f"chunk_size debe estar entre 1 y {STREAM_MAX_CHUNK_SIZE}"
+        }), 400
+    
+    if request.mimetype == 'text/csv':
+        rows = iter_csv(request.stream)
+    else:
+        rows = iter_ndjson(request.stream)
+    
+    def generate():
+        try:
+            yield from score_stream(rows, hazards, score_batch, chunk_size)
+        except Exception as e:
+            logger.error(f"Error en scoring en streaming: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/features/water-balance', methods=['POST'])
+def water_balance_features():
+    """
+    Balance hídrico acumulado por parcela a partir de series diarias
+    
+    Body JSON:
+    {
+        "parcel_id": "A1",
+        "daily": [
+            {"date": "2024-06-01", "et0": 5.1, "precipitation": 0.0, "soil_moisture": 31},
+            {"date": "2024-06-02", "et0": 5.4, "precipitation": 2.5, "soil_moisture": 30}
+        ],
+        "ndwi": -0.15,
+        "predict": true
+    }
+    
+    El servidor guarda el estado de la ventana móvil de cada parcela: basta
+    con enviar los días nuevos y cada día cuesta O(1). Retorna los acumulados
+    de la ventana (evapotranspiration, precipitation_sum, water_deficit_mm),
+    tendencias y lags de humedad del suelo, y con "predict" la predicción de
+    sequía calculada con esos acumulados.
+    """
+    try:
+        data = request.get_json()
+        
+        parcel_id = data.get('parcel_id')
+        daily = data.get('daily', [])
+        
+        if parcel_id is None:
+            return jsonify({
+                "success": False,
+                "error": "parcel_id es requerido"
+            }), 400
+        
+        try:
+            if daily:
+                features = water_balance.ingest(
+                    parcel_id,
+                    [day.get('et0', 0) for day in daily],
+                    [day.get('precipitation', 0) for day in daily],
+                    [day.get('soil_moisture', 50) for day in daily],
+                    dates=[day.get('date') for day in daily] if all('date' in day for day in daily) else None
+                )
+            else:
+                features = water_balance.features(parcel_id)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                "success": False,
+                "error": f"Serie inválida: {e}"
+            }), 400
+        
+        if not features:
+            return jsonify({
+                "success": False,
+                "error": "La parcela no tiene datos"
+            }), 404
+        
+        response = {
+            "success": True,
+            "parcel_id": parcel_id,
+            "features": features,
+            "metadata": {
+                "service": "water_balance",
+                "window_days": WATER_BALANCE_WINDOW,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        }
+        
+        if data.get('predict'):
+            drought_features = {
+                key: value for key, value in data.items()
+                if key not in ('parcel_id', 'daily', 'predict')
+            }
+            drought_features.update(features)
+            response["prediction"] = predict_hazard('drought', drought_features)
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        logger.error(f"Error en balance hídrico: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+# Arranque: modelos según MODEL_LOADING y tiempo total de importación del servicio
+init_models()
+startup_report["service_import_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+
+
+if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
     host = os.getenv('HOST', '0.0.0.0')
     
@@ -0,0 +1,176 @@
+"""
+INGESTA Y SCORING EN STREAMING - AGROVERSE
+Lee registros de features en NDJSON o CSV línea a línea, los puntúa en chunks
+de tamaño fijo con las predicciones por lotes y emite resultados NDJSON, con
+memoria acotada al tamaño del chunk.
+
+Uso como CLI (backfills):
+    python streaming.py historico.ndjson -o resultados.ndjson --hazards frost,drought
+    cat historico.csv | python streaming.py - --format csv > resultados.ndjson
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+from inference import FEATURE_SPECS, records_to_raw_columns
+from vectorized_baselines import BATCH_PREDICTORS, NUMERIC_DEFAULTS, columns_from_records
+
+# Campos de identificación que se copian a cada resultado
+PASSTHROUGH_FIELDS = ['id', 'parcel_id', 'date', 'latitude', 'longitude']
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Features que las reglas o los modelos convierten a float
+NUMERIC_FIELDS = sorted(
+    set(NUMERIC_DEFAULTS) | {name for spec in FEATURE_SPECS.values() for name, _ in spec}
+)
+
+
+def _text_lines(lines):
+    """Decodificar líneas en bytes (request.stream, archivos binarios) a str"""
+    for line in lines:
+        yield line.decode('utf-8') if isinstance(line, bytes) else line
+
+
+def iter_ndjson(lines):
+    """
+    Registros de un stream NDJSON
+    Retorna (número de línea, registro, error); las líneas vacías se ignoran
+    """
+    for line_no, line in enumerate(_text_lines(lines), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"JSON inválido: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Cada línea debe ser un objeto JSON"
+            continue
+        yield line_no, record, None
+
+
+def _csv_value(value):
+    """Convertir celdas CSV numéricas a float; vacías a None"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def iter_csv(lines):
+    """Registros de un stream CSV con encabezado (mismo formato que iter_ndjson)"""
+    reader = csv.DictReader(_text_lines(lines))
+    for record in reader:
+        yield reader.line_num, {key: _csv_value(value) for key, value in record.items()}, None
+
+
+def record_error(record):
+    """Mensaje de error si un feature numérico del registro no es convertible a float"""
+    for name in NUMERIC_FIELDS:
+        value = record.get(name)
+        if value is None:
+            continue
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            return f"Feature '{name}' no numérico: {value!r}"
+    return None
+
+
+def iter_chunks(iterable, size):
+    """Agrupar un iterable en listas de como máximo size elementos"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_stream(rows, hazards, score_chunk, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Puntuar registros en chunks y generar líneas NDJSON
+    rows: iterable de (número de línea, registro, error)
+    score_chunk: función (columns, hazards, raw_columns) -> predicciones columnares
+    """
+    for chunk in iter_chunks(rows, chunk_size):
+        lines = [None] * len(chunk)
+        valid = []
+
+        for position, (line_no, record, error) in enumerate(chunk):
+            if error is None:
+                # Un valor inválido descarta solo su línea, no el chunk
+                error = record_error(record)
+            if error is None:
+                valid.append((position, line_no, record))
+            else:
+                lines[position] = json.dumps({"line": line_no, "error": error}, ensure_ascii=False)
+
+        if valid:
+            records = [record for _, _, record in valid]
+            columns, _ = columns_from_records(records)
+            predictions = score_chunk(columns, hazards, records_to_raw_columns(records))
+
+            for i, (position, line_no, record) in enumerate(valid):
+                result = {"line": line_no}
+                for field in PASSTHROUGH_FIELDS:
+                    if field in record:
+                        result[field] = record[field]
+                for hazard, prediction in predictions.items():
+                    result[hazard] = {
+                        key: value[i].item() if hasattr(value, 'shape') else value
+                        for key, value in prediction.items()
+                    }
+                lines[position] = json.dumps(result, ensure_ascii=False)
+
+        yield "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Puntuar registros históricos NDJSON/CSV en streaming"
+    )
+    parser.add_argument('input', help="Archivo de entrada ('-' para stdin)")
+    parser.add_argument('-o', '--output', default='-', help="Archivo NDJSON de salida ('-' para stdout)")
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default=None,
+                        help="Formato de entrada (por defecto según la extensión)")
+    parser.add_argument('--hazards', default='frost,drought,pest')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    hazards = [hazard.strip() for hazard in args.hazards.split(',') if hazard.strip()]
+    unknown = [hazard for hazard in hazards if hazard not in BATCH_PREDICTORS]
+    if unknown or not hazards:
+        parser.error(f"--hazards debe ser una lista de: {', '.join(BATCH_PREDICTORS)}")
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size debe ser mayor que 0")
+
+    # Importar el servicio solo en modo CLI (carga de modelos según MODEL_LOADING)
+    from server import score_batch
+
+    input_format = args.format or ('csv' if args.input.endswith('.csv') else 'ndjson')
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', newline='')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+
+    try:
+        rows = iter_csv(source) if input_format == 'csv' else iter_ndjson(source)
+        for block in score_stream(rows, hazards, score_batch, args.chunk_size):
+            target.write(block)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+if __name__ == '__main__':
+    main()
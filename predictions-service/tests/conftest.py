@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los módulos del servicio son planos: se importan desde el directorio del servicio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Sin carga de modelos en segundo plano al importar server.py
+os.environ.setdefault('MODEL_LOADING', 'lazy')
@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+import pytest
+
+from server import BASELINE_PREDICTORS
+from vectorized_baselines import (
+    BATCH_PREDICTORS,
+    NUMERIC_DEFAULTS,
+    columns_from_columnar,
+    columns_from_records,
+)
+
+# Valores en los umbrales de las reglas y a ambos lados
+EDGE_VALUES = [
+    -5, -0.3, -0.1, -0.01, 0, 0.2, 0.3, 0.5, 0.7, 1.99, 2, 4.99, 5, 10,
+    14.99, 15, 15.01, 20, 25, 29.99, 30, 40, 50, 59.99, 60, 70, 80, 100,
+]
+CROPS = ['potato', 'tomato', 'maize', 'quinoa']
+
+
+def random_records(count, seed=0, missing=True):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        record = {}
+        for name in NUMERIC_DEFAULTS:
+            if missing and rng.random() < 0.15:
+                continue
+            record[name] = rng.choice(EDGE_VALUES) if rng.random() < 0.7 else rng.uniform(-10, 100)
+        if not missing or rng.random() < 0.8:
+            record['crop_type'] = rng.choice(CROPS)
+        records.append(record)
+    return records
+
+
+@pytest.mark.parametrize('hazard', sorted(BATCH_PREDICTORS))
+def test_batch_rules_match_scalar_rules(hazard):
+    records = random_records(3000, seed=0)
+    columns, n = columns_from_records(records)
+    batch = BATCH_PREDICTORS[hazard](columns)
+
+    assert n == len(records)
+    for i, record in enumerate(records):
+        scalar = BASELINE_PREDICTORS[hazard](record)
+        # Mismo orden de sumas: idénticos bit a bit, no solo aproximados
+        assert batch['probability'][i] == scalar['probability'], record
+        assert batch['risk_level'][i] == scalar['risk_level'], record
+
+
+@pytest.mark.parametrize('hazard', sorted(BATCH_PREDICTORS))
+def test_columnar_input_matches_records(hazard):
+    records = random_records(500, seed=1, missing=False)
+    from_records, _ = columns_from_records(records)
+    from_columnar, n = columns_from_columnar({
+        name: [record[name] for record in records] for name in records[0]
+    })
+
+    assert n == len(records)
+    expected = BATCH_PREDICTORS[hazard](from_records)
+    result = BATCH_PREDICTORS[hazard](from_columnar)
+    np.testing.assert_array_equal(result['probability'], expected['probability'])
+    np.testing.assert_array_equal(result['risk_level'], expected['risk_level'])
+
+
+@pytest.mark.parametrize('hazard', sorted(BATCH_PREDICTORS))
+def test_empty_batch(hazard):
+    columns, n = columns_from_records([])
+    result = BATCH_PREDICTORS[hazard](columns)
+    assert n == 0
+    assert len(result['probability']) == 0
+    assert len(result['risk_level']) == 0
+
+
+def test_non_numeric_column_names_the_feature():
+    with pytest.raises(ValueError, match="'humidity'"):
+        columns_from_records([{'humidity': 'alta'}])
+    with pytest.raises(ValueError, match="misma longitud"):
+        columns_from_columnar({'temp_min': [1, 2], 'humidity': [50]})
@@ -0,0 +1,226 @@
+"""
+REGLAS BASELINE VECTORIZADAS - AGROVERSE
+Versiones NumPy de predict_frost_baseline, predict_drought_baseline y
+predict_pest_baseline para puntuar lotes completos en una sola pasada.
+
+Cada regla suma sus incrementos en el mismo orden que la versión escalar,
+así que las probabilidades y niveles de riesgo son idénticos bit a bit.
+"""
+
+import numpy as np
+
+# Valores por defecto de cada feature (los mismos que usan los .get() escalares)
+NUMERIC_DEFAULTS = {
+    # Heladas
+    'temp_min': 999,
+    'temp_max': 999,
+    'humidity': 0,
+    'wind_speed': 999,
+    'cloud_cover': 100,
+    # Sequía
+    'evapotranspiration': 0,
+    'precipitation_sum': 0,
+    'soil_moisture': 50,
+    'ndwi': 0,
+    # Plagas
+    'temperature': 0,
+    'ndvi': 0,
+}
+
+# Features que usa cada regla baseline
+BASELINE_FEATURES = {
+    'frost': ['temp_min', 'temp_max', 'humidity', 'wind_speed', 'cloud_cover'],
+    'drought': ['evapotranspiration', 'precipitation_sum', 'soil_moisture', 'ndwi'],
+    'pest': ['temperature', 'humidity', 'ndvi', 'crop_type'],
+}
+
+CROP_TYPE_DEFAULT = 'unknown'
+SUSCEPTIBLE_CROPS = ['potato', 'tomato']
+
+
+def _numeric_column(values, default, name):
+    """
+    Convertir una lista a float64, reemplazando None/NaN por el default
+    ValueError con el nombre de la columna si algún valor no es numérico
+    """
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Feature '{name}' no numérico: {e}")
+    missing = np.isnan(column)
+    if missing.any():
+        column = np.where(missing, default, column)
+    return column
+
+
+def columns_from_records(records):
+    """
+    Transponer una lista de registros (dicts) a columnas NumPy
+    Los campos ausentes toman el mismo default que las reglas escalares
+    """
+    columns = {}
+    for name, default in NUMERIC_DEFAULTS.items():
+        columns[name] = _numeric_column(
+            [record.get(name, default) for record in records], default, name
+        )
+    columns['crop_type'] = np.array(
+        [record.get('crop_type') or CROP_TYPE_DEFAULT for record in records],
+        dtype=object
+    )
+    return columns, len(records)
+
+
+def columns_from_columnar(data):
+    """
+    Normalizar JSON columnar {"temp_min": [...], "humidity": [...]} a arrays
+    Todas las columnas presentes deben tener la misma longitud
+    """
+    lengths = {len(values) for values in data.values()}
+    if len(lengths) > 1:
+        raise ValueError("Todas las columnas deben tener la misma longitud")
+    n = lengths.pop() if lengths else 0
+
+    columns = {}
+    for name, default in NUMERIC_DEFAULTS.items():
+        if name in data:
+            columns[name] = _numeric_column(data[name], default, name)
+        else:
+            columns[name] = np.full(n, default, dtype=np.float64)
+
+    if 'crop_type' in data:
+        crops = [crop or CROP_TYPE_DEFAULT for crop in data['crop_type']]
+    else:
+        crops = [CROP_TYPE_DEFAULT] * n
+    columns['crop_type'] = np.array(crops, dtype=object)
+    return columns, n
+
+
+def classify_risk(scores, thresholds, labels, default_label):
+    """Clasificar scores en niveles de riesgo (umbrales en orden descendente)"""
+    conditions = [scores >= threshold for threshold in thresholds]
+    return np.select(conditions, labels, default=default_label)
+
+
+def predict_frost_baseline_batch(columns):
+    """
+    Versión vectorizada de predict_frost_baseline
+    Retorna arrays de probabilidad y nivel de riesgo
+    """
+    temp_min = columns['temp_min']
+    temp_max = columns['temp_max']
+
+    risk_score = np.zeros(len(temp_min), dtype=np.float64)
+
+    # Temperatura mínima crítica
+    risk_score += np.select(
+        [temp_min < 0, temp_min < 2, temp_min < 5],
+        [0.5, 0.3, 0.15],
+        default=0.0
+    )
+
+    # Diferencia térmica grande (radiación nocturna)
+    risk_score += np.where(temp_max - temp_min > 15, 0.15, 0.0)
+
+    # Baja humedad, viento bajo y cielo despejado
+    risk_score += np.where(columns['humidity'] < 60, 0.1, 0.0)
+    risk_score += np.where(columns['wind_speed'] < 5, 0.1, 0.0)
+    risk_score += np.where(columns['cloud_cover'] < 30, 0.15, 0.0)
+
+    risk_score = np.minimum(risk_score, 1.0)
+
+    return {
+        "probability": risk_score,
+        "risk_level": classify_risk(
+            risk_score, [0.7, 0.5, 0.3], ["crítico", "alto", "medio"], "bajo"
+        ),
+        "model_type": "baseline_rules"
+    }
+
+
+def predict_drought_baseline_batch(columns):
+    """Versión vectorizada de predict_drought_baseline"""
+    precipitation = columns['precipitation_sum']
+    soil_moisture = columns['soil_moisture']
+    ndwi = columns['ndwi']
+
+    deficit = columns['evapotranspiration'] - precipitation
+
+    risk_score = np.zeros(len(deficit), dtype=np.float64)
+
+    # Déficit hídrico
+    risk_score += np.select(
+        [deficit > 100, deficit > 50, deficit > 20],
+        [0.4, 0.25, 0.15],
+        default=0.0
+    )
+
+    # Humedad del suelo baja
+    risk_score += np.select(
+        [soil_moisture < 20, soil_moisture < 35, soil_moisture < 50],
+        [0.3, 0.2, 0.1],
+        default=0.0
+    )
+
+    # NDWI bajo indica estrés hídrico
+    risk_score += np.select([ndwi < -0.3, ndwi < 0], [0.2, 0.1], default=0.0)
+
+    # Sin precipitación reciente
+    risk_score += np.where(precipitation < 5, 0.1, 0.0)
+
+    risk_score = np.minimum(risk_score, 1.0)
+
+    return {
+        "probability": risk_score,
+        "risk_level": classify_risk(
+            risk_score, [0.7, 0.5, 0.3], ["crítico", "alto", "medio"], "bajo"
+        ),
+        "water_deficit_mm": deficit,
+        "model_type": "baseline_water_balance"
+    }
+
+
+def predict_pest_baseline_batch(columns):
+    """Versión vectorizada de predict_pest_baseline"""
+    temperature = columns['temperature']
+    humidity = columns['humidity']
+    ndvi = columns['ndvi']
+
+    risk_score = np.zeros(len(temperature), dtype=np.float64)
+
+    # Temperatura óptima para la mayoría de plagas: 20-30°C
+    risk_score += np.select(
+        [(temperature >= 20) & (temperature <= 30),
+         (temperature >= 15) & (temperature <= 35)],
+        [0.3, 0.15],
+        default=0.0
+    )
+
+    # Humedad alta favorece hongos y algunas plagas
+    risk_score += np.select(
+        [humidity > 80, humidity > 70, humidity > 60],
+        [0.3, 0.2, 0.1],
+        default=0.0
+    )
+
+    # NDVI moderado indica vegetación susceptible
+    risk_score += np.where((ndvi >= 0.3) & (ndvi <= 0.7), 0.2, 0.0)
+
+    # Factores específicos por cultivo (simplificado)
+    risk_score += np.where(np.isin(columns['crop_type'], SUSCEPTIBLE_CROPS), 0.1, 0.0)
+
+    risk_score = np.minimum(risk_score, 1.0)
+
+    return {
+        "probability": risk_score,
+        "risk_level": classify_risk(
+            risk_score, [0.6, 0.4], ["alto", "medio"], "bajo"
+        ),
+        "model_type": "baseline_environmental"
+    }
+
+
+BATCH_PREDICTORS = {
+    'frost': predict_frost_baseline_batch,
+    'drought': predict_drought_baseline_batch,
+    'pest': predict_pest_baseline_batch,
+}
@@ -0,0 +1,287 @@
+"""
+MOTOR DE FEATURES DE BALANCE HÍDRICO - AGROVERSE
+Ventanas móviles sobre series diarias de ET0, precipitación y humedad del
+suelo por parcela. Mantiene sumas acumuladas en un buffer circular, así que
+cada día nuevo cuesta O(1) en lugar de volver a sumar la ventana completa.
+
+Los features "evapotranspiration" y "precipitation_sum" son los acumulados de
+la ventana (30 días por defecto) que espera predict_drought_baseline.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+DEFAULT_WINDOW = 30
+SHORT_WINDOW = 7
+LAGS = (1, 7)
+
+# Cada cuántas actualizaciones se recalculan las sumas desde el buffer para
+# evitar la deriva numérica de las restas sucesivas
+RESYNC_EVERY = 1000
+
+
+def _slope(n, s, t):
+    """
+    Pendiente de la regresión lineal de y sobre x = 0..n-1
+    s = Σ y, t = Σ x·y
+    """
+    if n < 2:
+        return 0.0
+    sx = n * (n - 1) / 2
+    sxx = (n - 1) * n * (2 * n - 1) / 6
+    return (n * t - sx * s) / (n * sxx - sx * sx)
+
+
+def _parse_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class ParcelWaterBalance:
+    """
+    Estado de la ventana móvil de una parcela
+
+    Buffers circulares de ET0, precipitación y humedad del suelo más sumas
+    acumuladas: Σ déficit diario y Σ x·déficit (para la tendencia), Σ y
+    Σ x·humedad, y la suma de los últimos SHORT_WINDOW días.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        if window <= max(LAGS) or window < SHORT_WINDOW:
+            raise ValueError(f"La ventana debe ser mayor que {max(LAGS)} días")
+        self.window = window
+        self.et0 = np.zeros(window)
+        self.precipitation = np.zeros(window)
+        self.soil_moisture = np.zeros(window)
+        self.count = 0
+        self.head = 0  # Posición donde se escribirá el siguiente día
+        self.last_date = None
+        self.updates = 0
+        self._reset_sums()
+
+    def _reset_sums(self):
+        self.et0_sum = 0.0
+        self.precipitation_sum = 0.0
+        self.deficit_xsum = 0.0
+        self.soil_sum = 0.0
+        self.soil_xsum = 0.0
+        self.short_deficit_sum = 0.0
+
+    def _value(self, buffer, age):
+        """Valor de hace `age` días (0 = el más reciente)"""
+        return buffer[(self.head - 1 - age) % self.window]
+
+    def _resync(self):
+        """Recalcular las sumas acumuladas desde los buffers"""
+        order = (self.head - self.count + np.arange(self.count)) % self.window
+        et0 = self.et0[order]
+        precipitation = self.precipitation[order]
+        soil = self.soil_moisture[order]
+        deficit = et0 - precipitation
+        x = np.arange(self.count)
+
+        self.et0_sum = float(et0.sum())
+        self.precipitation_sum = float(precipitation.sum())
+        self.deficit_xsum = float((x * deficit).sum())
+        self.soil_sum = float(soil.sum())
+        self.soil_xsum = float((x * soil).sum())
+        self.short_deficit_sum = float(deficit[-SHORT_WINDOW:].sum())
+
+    def push(self, et0, precipitation, soil_moisture):
+        """Agregar un día a la ventana en O(1)"""
+        deficit = et0 - precipitation
+        deficit_sum = self.et0_sum - self.precipitation_sum
+
+        if self.count == self.window:
+            # Sale el día más antiguo: desplazar los índices x una posición
+            old_deficit = self.et0[self.head] - self.precipitation[self.head]
+            old_soil = self.soil_moisture[self.head]
+            self.deficit_xsum += -(deficit_sum - old_deficit) + (self.window - 1) * deficit
+            self.soil_xsum += -(self.soil_sum - old_soil) + (self.window - 1) * soil_moisture
+            self.et0_sum += et0 - self.et0[self.head]
+            self.precipitation_sum += precipitation - self.precipitation[self.head]
+            self.soil_sum += soil_moisture - old_soil
+        else:
+            self.deficit_xsum += self.count * deficit
+            self.soil_xsum += self.count * soil_moisture
+            self.et0_sum += et0
+            self.precipitation_sum += precipitation
+            self.soil_sum += soil_moisture
+            self.count += 1
+
+        if self.count > SHORT_WINDOW:
+            self.short_deficit_sum -= (
+                self._value(self.et0, SHORT_WINDOW - 1)
+                - self._value(self.precipitation, SHORT_WINDOW - 1)
+            )
+        self.short_deficit_sum += deficit
+
+        self.et0[self.head] = et0
+        self.precipitation[self.head] = precipitation
+        self.soil_moisture[self.head] = soil_moisture
+        self.head = (self.head + 1) % self.window
+
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self._resync()
+
+    def update(self, day, et0, precipitation, soil_moisture):
+        """
+        Agregar la observación de un día
+        Los días faltantes entre la última fecha y `day` se rellenan con la
+        última ET0 y humedad conocidas y precipitación 0 (supuesto conservador)
+        """
+        day = _parse_date(day)
+        if day is not None and self.last_date is not None:
+            gap = (day - self.last_date).days
+            if gap <= 0:
+                raise ValueError(
+                    f"Fecha {day.isoformat()} no es posterior a {self.last_date.isoformat()}"
+                )
+            for _ in range(min(gap - 1, self.window)):
+                self.push(self._value(self.et0, 0), 0.0, self._value(self.soil_moisture, 0))
+
+        self.push(float(et0), float(precipitation), float(soil_moisture))
+        if day is not None:
+            self.last_date = day
+        elif self.last_date is not None:
+            self.last_date += timedelta(days=1)
+
+    def features(self):
+        """Features actuales de la ventana"""
+        if self.count == 0:
+            return {}
+        deficit_sum = self.et0_sum - self.precipitation_sum
+        features = {
+            "evapotranspiration": self.et0_sum,
+            "precipitation_sum": self.precipitation_sum,
+            "water_deficit_mm": deficit_sum,
+            f"water_deficit_{SHORT_WINDOW}d_mm": self.short_deficit_sum,
+            "deficit_trend_mm_per_day": _slope(self.count, deficit_sum, self.deficit_xsum),
+            "soil_moisture": float(self._value(self.soil_moisture, 0)),
+            "soil_moisture_mean": self.soil_sum / self.count,
+            "soil_moisture_trend_per_day": _slope(self.count, self.soil_sum, self.soil_xsum),
+            "window_days": self.count,
+            "last_date": self.last_date.isoformat() if self.last_date else None,
+        }
+        for lag in LAGS:
+            features[f"soil_moisture_lag_{lag}"] = (
+                float(self._value(self.soil_moisture, lag)) if self.count > lag else None
+            )
+        return features
+
+
+def rolling_water_balance(et0, precipitation, soil_moisture, window=DEFAULT_WINDOW):
+    """
+    Features de ventana móvil para cada día de una serie completa (backfills)
+    Vectorizado con sumas acumuladas; los primeros window-1 días usan una
+    ventana parcial. Retorna un dict de arrays de la misma longitud que la serie.
+    """
+    et0 = np.asarray(et0, dtype=np.float64)
+    precipitation = np.asarray(precipitation, dtype=np.float64)
+    soil_moisture = np.asarray(soil_moisture, dtype=np.float64)
+    deficit = et0 - precipitation
+    n = len(deficit)
+    idx = np.arange(n)
+
+    def rolling_sum(values, size):
+        cumsum = np.concatenate([[0.0], np.cumsum(values)])
+        start = np.maximum(idx + 1 - size, 0)
+        return cumsum[idx + 1] - cumsum[start]
+
+    def rolling_slope(values):
+        # Σ x·y con x relativo al inicio de cada ventana: Σ i·y_i - inicio·Σ y_i
+        start = np.maximum(idx + 1 - window, 0)
+        count = idx + 1 - start
+        s = rolling_sum(values, window)
+        weighted = np.concatenate([[0.0], np.cumsum(idx * values)])
+        t = weighted[idx + 1] - weighted[start] - start * s
+        sx = count * (count - 1) / 2
+        sxx = (count - 1) * count * (2 * count - 1) / 6
+        denominator = count * sxx - sx * sx
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (count * t - sx * s) / denominator
+        return np.where(count >= 2, slope, 0.0), count
+
+    deficit_trend, count = rolling_slope(deficit)
+    soil_trend, _ = rolling_slope(soil_moisture)
+    et0_sum = rolling_sum(et0, window)
+    precipitation_sum = rolling_sum(precipitation, window)
+
+    features = {
+        "evapotranspiration": et0_sum,
+        "precipitation_sum": precipitation_sum,
+        "water_deficit_mm": et0_sum - precipitation_sum,
+        f"water_deficit_{SHORT_WINDOW}d_mm": rolling_sum(deficit, SHORT_WINDOW),
+        "deficit_trend_mm_per_day": deficit_trend,
+        "soil_moisture": soil_moisture,
+        "soil_moisture_mean": rolling_sum(soil_moisture, window) / count,
+        "soil_moisture_trend_per_day": soil_trend,
+        "window_days": count,
+    }
+    for lag in LAGS:
+        lagged = np.full(n, np.nan)
+        lagged[lag:] = soil_moisture[:-lag]
+        features[f"soil_moisture_lag_{lag}"] = lagged
+    return features
+
+
+class WaterBalanceEngine:
+    """
+    Estado por parcela con LRU acotado a max_parcels
+    Seguro entre hilos (un lock global; cada actualización es O(1))
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, max_parcels=100000):
+        self.window = window
+        self.max_parcels = max_parcels
+        self._parcels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, parcel_id, state):
+        self._parcels[parcel_id] = state
+        self._parcels.move_to_end(parcel_id)
+        while len(self._parcels) > self.max_parcels:
+            self._parcels.popitem(last=False)
+
+    def ingest(self, parcel_id, et0, precipitation, soil_moisture, dates=None):
+        """
+        Agregar una serie de días a una parcela y retornar sus features
+        Si la serie es más larga que la ventana, solo sus últimos `window`
+        días afectan al resultado, así que el estado se reconstruye con ellos.
+        La serie se aplica sobre una copia del estado que reemplaza al actual
+        solo si todos los días son válidos: un error no deja la parcela a medias
+        """
+        n = len(et0)
+        if not (len(precipitation) == len(soil_moisture) == n) or (dates and len(dates) != n):
+            raise ValueError("Las series deben tener la misma longitud")
+
+        start = max(n - self.window, 0)
+        with self._lock:
+            current = self._parcels.get(parcel_id)
+            if current is None or start > 0:
+                state = ParcelWaterBalance(self.window)
+            else:
+                state = copy.deepcopy(current)
+            for i in range(start, n):
+                state.update(
+                    dates[i] if dates else None,
+                    et0[i], precipitation[i], soil_moisture[i]
+                )
+            self._store(parcel_id, state)
+            return state.features()
+
+    def features(self, parcel_id):
+        """Features actuales de una parcela (None si no existe)"""
+        with self._lock:
+            state = self._parcels.get(parcel_id)
+            return state.features() if state is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {"parcels": len(self._parcels), "window_days": self.window}